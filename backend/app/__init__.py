@@ -1,9 +1,14 @@
 """
 Travel Planner API Package
 """
-from .api import create_app
-
 __version__ = "1.0.0"
 __author__ = "Travel Planner Team"
 
-__all__ = ["create_app"]
\ No newline at end of file
+__all__ = ["create_app"]
+
+def __getattr__(name: str):
+    # Importing the package (e.g. for app.config) does not build the web app's import graph
+    if name == "create_app":
+        from .api import create_app
+        return create_app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,19 +1,103 @@
 """
 FastAPI application factory and configuration
 """
+import asyncio
+from contextlib import asynccontextmanager
+from dataclasses import asdict
 from datetime import datetime
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, Optional
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 
-from .models.request import TravelPlanRequest
+from .config import get_settings
+from .models.request import STREAM_MODES, ReplanRequest, TravelPlanRequest
 from .models.travel import TravelRequest
-from .services.travel_planner import stream_travel_plan
+from .services.ai_client import ModelClientPool
+from .services.batch import BatchCheckpoints, BatchError, BatchRunner, batch_id_for, parse_batch
+from .services.destination_knowledge import DestinationKnowledgeCache
+from .services.jobs import JobStore
+from .services.metrics import get_metrics
+from .services.plan_cache import PlanCache
+from .services.scheduler import PRIORITY_BATCH, PRIORITY_INTERACTIVE, PlanScheduler, SchedulerFull
+from .services.stream_encoding import MEDIA_SSE, encode_stream, negotiate_format, stream_line
+from .services.warmup import WarmUp
+
+async def _wait_for_disconnect(http_request: Request, interval: float) -> None:
+    while not await http_request.is_disconnected():
+        await asyncio.sleep(interval)
+
+async def _prefixed(line: str, stream: AsyncIterator[str]) -> AsyncIterator[str]:
+    yield line
+    async for item in stream:
+        yield item
+
+async def until_disconnected(http_request: Request, stream: AsyncIterator[str], endpoint: str) -> AsyncIterator[str]:
+    """Stop consuming ``stream`` as soon as the client disconnects, even while no line is due.
+
+    The pending read is cancelled, which releases the plan (see ``PlanCache`` for the
+    reconnect grace period and ``cancellable_stream`` for how the team is stopped).
+    """
+    iterator = stream.__aiter__()
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(http_request, get_settings().disconnect_poll_interval))
+    next_line = None
+    finished = False
+    try:
+        while True:
+            next_line = asyncio.ensure_future(iterator.__anext__())
+            await asyncio.wait({next_line, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if not next_line.done():
+                next_line.cancel()
+                await asyncio.wait({next_line})
+                return
+            try:
+                line = next_line.result()
+            except StopAsyncIteration:
+                finished = True
+                return
+            yield line
+    finally:
+        disconnected.cancel()
+        # Also when the server cancelled us first (it noticed the disconnect itself)
+        if next_line is not None and not next_line.done():
+            next_line.cancel()
+        if not finished:
+            get_metrics().client_disconnects.labels(endpoint).inc()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create process-wide resources on startup and release them on shutdown."""
+    scheduler = PlanScheduler()
+    model_clients = ModelClientPool(response_hooks=[scheduler.observe_response, get_metrics().observe_response])
+    # The agent stack and model clients load in the background, so the server listens at once
+    warmup = WarmUp(model_clients, enabled=get_settings().server_warmup)
+    warmup.start()
+    app.state.scheduler = scheduler
+    app.state.model_clients = model_clients
+    app.state.warmup = warmup
+    app.state.plan_cache = PlanCache()
+    app.state.destinations = DestinationKnowledgeCache()
+    app.state.jobs = JobStore()
+    await app.state.jobs.start()
+    app.state.batches = BatchCheckpoints()
+    app.state.batches.prune()
+    try:
+        yield
+    finally:
+        # Uvicorn has already let in-flight streams finish; give detached jobs the same drain period
+        await app.state.jobs.drain(get_settings().server_drain_timeout)
+        await app.state.jobs.close()
+        app.state.batches.close()
+        await app.state.plan_cache.close()
+        app.state.destinations.close()
+        await warmup.close()
+        await model_clients.close()
+        scheduler.close()
 
 def create_app() -> FastAPI:
     """Create and configure the FastAPI application"""
     
-    app = FastAPI(title="Travel Planner API", version="1.0.0")
+    app = FastAPI(title="Travel Planner API", version="1.0.0", lifespan=lifespan)
     
     # Add CORS middleware
     app.add_middleware(
@@ -28,43 +112,273 @@ def create_app() -> FastAPI:
         allow_headers=["*"],
     )
     
-    @app.post("/generate-travel-plan")
-    async def generate_travel_plan(request: TravelPlanRequest):
-        """Generate a travel plan with streaming updates."""
+    def to_travel_request(request: TravelPlanRequest) -> TravelRequest:
+        """Validate the request options and convert it to the internal dataclass."""
+        if request.stream_mode.lower().strip() not in STREAM_MODES:
+            raise HTTPException(status_code=400, detail=f"stream_mode must be one of {', '.join(STREAM_MODES)}")
         
+        return TravelRequest(
+            destination_city=request.destination_city,
+            destination_country=request.destination_country,
+            depart_date=request.depart_date,
+            return_date=request.return_date,
+            priority=request.priority,
+            budget_level=request.budget_level,
+            departure_airport=request.departure_airport,
+            destination_airport=request.destination_airport,
+            additional_preferences=request.additional_preferences
+        )
+
+    def check_capacity() -> None:
+        """Backpressure: reject up front when a plan would not even fit in the wait queue."""
         try:
-            # Convert Pydantic model to internal dataclass
-            travel_request = TravelRequest(
-                destination_city=request.destination_city,
-                destination_country=request.destination_country,
-                depart_date=request.depart_date,
-                return_date=request.return_date,
-                priority=request.priority,
-                budget_level=request.budget_level,
-                departure_airport=request.departure_airport,
-                destination_airport=request.destination_airport,
-                additional_preferences=request.additional_preferences
+            app.state.scheduler.check_capacity()
+        except SchedulerFull as full:
+            raise HTTPException(
+                status_code=429,
+                detail=str(full),
+                headers={"Retry-After": str(int(full.retry_after + 0.999))}
             )
-            
-            return StreamingResponse(
-                stream_travel_plan(travel_request),
-                media_type="application/x-ndjson",
-                headers={
-                    "Cache-Control": "no-cache",
-                    "Connection": "keep-alive",
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
-                    "Access-Control-Allow-Headers": "*",
-                }
+
+    def plan_stream(travel_request: TravelRequest, stream_mode: str, priority: int):
+        """Admit a plan and return its NDJSON stream (cached, shared or newly scheduled)."""
+        scheduler = app.state.scheduler
+        # Batch items are already bounded by their batch's parallelism
+        if priority != PRIORITY_BATCH and not app.state.plan_cache.has(travel_request, stream_mode):
+            check_capacity()
+        
+        # Loaded by the warm-up (or by the first plan when it is disabled or still running)
+        from .services.travel_planner import stream_travel_plan
+
+        model_client = app.state.model_clients.router
+        return app.state.plan_cache.stream(
+            travel_request,
+            lambda: scheduler.stream(
+                lambda: stream_travel_plan(travel_request, model_client, stream_mode, app.state.destinations),
+                priority=priority
+            ),
+            variant=stream_mode
+        )
+
+    def replan_stream(request: ReplanRequest):
+        """Diff a re-plan against its previous plan and return its NDJSON stream.
+
+        Only the affected sections are redone; a change that reshapes the whole itinerary
+        is planned from scratch (through the plan cache), with the day edits as preferences.
+        """
+        from .services.replanning import ReplanError, prepare_replan, with_day_edits
+        from .services.travel_planner import stream_replan
+
+        travel_request = to_travel_request(request.request)
+        stream_mode = request.request.stream_mode.lower().strip()
+        previous_request = to_travel_request(request.previous_request) if request.previous_request else None
+        if request.job_id:
+            result = app.state.jobs.result(request.job_id)
+            if result is None:
+                raise HTTPException(status_code=404, detail="No completed plan for this job")
+            previous_fields, previous_document = result
+            if previous_request is None and previous_fields:
+                previous_request = TravelRequest(**previous_fields)
+        elif request.previous_plan:
+            previous_document = request.previous_plan
+        else:
+            raise HTTPException(status_code=400, detail="Give the job_id of a completed plan, or previous_plan")
+        if previous_request is None:
+            raise HTTPException(status_code=400, detail="previous_request is required to re-plan this plan")
+
+        try:
+            replan = prepare_replan(previous_document, previous_request, travel_request, request.day_edits)
+        except ReplanError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        metrics = get_metrics()
+        if replan.scope.full:
+            metrics.replans.labels("full").inc()
+            stream = plan_stream(with_day_edits(travel_request, replan.day_edits), stream_mode, PRIORITY_INTERACTIVE)
+            return _prefixed(stream_line("progress", f"♻️ Planning from scratch: {replan.scope.full_reason}"), stream)
+        if replan.scope.unchanged:
+            metrics.replans.labels("unchanged").inc()
+            return stream_replan(travel_request, replan, stream_mode=stream_mode)
+
+        metrics.replans.labels("incremental").inc()
+        check_capacity()
+        model_client = app.state.model_clients.router
+        return app.state.scheduler.stream(
+            lambda: stream_replan(travel_request, replan, model_client, stream_mode),
+            priority=PRIORITY_INTERACTIVE
+        )
+
+    def stream_response(http_request: Request, stream, endpoint: str) -> StreamingResponse:
+        """Send an NDJSON line stream as NDJSON or SSE, compressed per event when the client accepts it."""
+        stream_format = negotiate_format(
+            http_request.headers.get("accept"), http_request.headers.get("accept-encoding")
+        )
+        metrics = get_metrics()
+        body = metrics.count_wire_bytes(
+            encode_stream(metrics.instrument_stream(stream, endpoint), stream_format),
+            endpoint,
+            "sse" if stream_format.media_type == MEDIA_SSE else "ndjson",
+            stream_format.content_encoding
+        )
+        return StreamingResponse(
+            body,
+            media_type=stream_format.media_type,
+            headers={
+                "Cache-Control": "no-cache",
+                "Connection": "keep-alive",
+                "X-Accel-Buffering": "no",
+                "Access-Control-Allow-Origin": "*",
+                "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+                "Access-Control-Allow-Headers": "*",
+                **stream_format.headers,
+            }
+        )
+
+    @app.post("/generate-travel-plan")
+    async def generate_travel_plan(request: TravelPlanRequest, http_request: Request):
+        """Generate a travel plan with streaming updates (NDJSON, or SSE for ``Accept: text/event-stream``)."""
+        
+        travel_request = to_travel_request(request)
+        stream_mode = request.stream_mode.lower().strip()
+        stream = plan_stream(travel_request, stream_mode, PRIORITY_INTERACTIVE)
+        
+        try:
+            return stream_response(
+                http_request, until_disconnected(http_request, stream, "generate-travel-plan"), "generate-travel-plan"
             )
-            
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error processing request: {str(e)}")
 
+    @app.post("/replan")
+    async def replan_travel_plan(request: ReplanRequest, http_request: Request):
+        """Re-plan a previous plan after its trip changed, streaming like /generate-travel-plan.
+
+        The previous plan is a completed job (``job_id``) or its markdown with the request
+        it was made for. Changed dates, budget or airports and ``day_edits`` only redo the
+        sections they affect.
+        """
+        stream = replan_stream(request)
+        return stream_response(http_request, until_disconnected(http_request, stream, "replan"), "replan")
+
+    @app.post("/batch")
+    async def generate_batch(http_request: Request, parallelism: Optional[int] = None, batch_id: Optional[str] = None):
+        """Generate a JSONL batch of travel plan requests, streaming a JSONL record as each plan finishes.
+
+        Plans run ``parallelism`` at a time behind interactive requests. Completed items are
+        checkpointed under ``batch_id`` (by default a hash of the input), so rerunning the
+        same batch resumes it.
+        """
+        settings = get_settings()
+        body = (await http_request.body()).decode("utf-8")
+        try:
+            items = parse_batch(body, settings.batch_max_items)
+        except BatchError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        runner = BatchRunner(
+            batch_id or batch_id_for(body),
+            items,
+            lambda travel_request: plan_stream(travel_request, "full", PRIORITY_BATCH),
+            app.state.batches,
+            app.state.destinations,
+            parallelism=min(max(1, parallelism or settings.batch_parallelism), settings.batch_max_parallelism),
+            progress_interval=settings.batch_progress_interval,
+        )
+        return stream_response(http_request, until_disconnected(http_request, runner.run(), "batch"), "batch")
+
+    @app.get("/batch/{batch_id}")
+    async def batch_status(batch_id: str):
+        """Checkpointed item counts of a batch by status."""
+        await app.state.batches.flush()
+        counts = app.state.batches.summary(batch_id)
+        if not counts:
+            raise HTTPException(status_code=404, detail="Batch not found")
+        return {"batch_id": batch_id, "items": sum(counts.values()), "by_status": counts}
+
+    @app.post("/jobs", status_code=202)
+    async def create_job(request: TravelPlanRequest):
+        """Start generating a travel plan in the background and return its job id."""
+        
+        travel_request = to_travel_request(request)
+        stream_mode = request.stream_mode.lower().strip()
+        stream = plan_stream(travel_request, stream_mode, PRIORITY_INTERACTIVE)
+        job = app.state.jobs.create(lambda: stream, asdict(travel_request))
+        return {**asdict(job), "events_url": f"/jobs/{job.job_id}/events"}
+
+    @app.get("/jobs/stats")
+    async def job_stats():
+        """Background job counts by status."""
+        return app.state.jobs.snapshot()
+
+    @app.get("/jobs/{job_id}")
+    async def get_job(job_id: str):
+        """Current status of a background job."""
+        job = app.state.jobs.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return asdict(job)
+
+    @app.get("/jobs/{job_id}/events")
+    async def job_events(job_id: str, http_request: Request, after: int = -1):
+        """Stream a job's events after sequence number ``after``, following it until it finishes.
+
+        SSE clients reconnecting with ``Last-Event-ID`` resume after that event.
+        """
+        if app.state.jobs.get(job_id) is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        last_event_id = http_request.headers.get("last-event-id", "")
+        if last_event_id.isdigit():
+            after = max(after, int(last_event_id))
+        return stream_response(http_request, app.state.jobs.events(job_id, after), "job-events")
+
     @app.get("/health")
     async def health_check():
-        """Health check endpoint."""
-        return {"status": "healthy", "timestamp": datetime.now().isoformat()}
+        """Liveness: the process is up and serving, whether or not the warm-up has finished."""
+        return {"status": "healthy", "ready": app.state.warmup.ready, "timestamp": datetime.now().isoformat()}
+
+    @app.get("/health/ready")
+    async def readiness_check():
+        """Readiness: 503 until the agent stack is loaded and the model clients are built."""
+        ready = app.state.warmup.ready
+        return JSONResponse(
+            {"ready": ready, "warmup": app.state.warmup.snapshot(), "timestamp": datetime.now().isoformat()},
+            status_code=200 if ready else 503
+        )
+
+    @app.get("/metrics")
+    async def metrics():
+        """Pipeline metrics in the Prometheus text exposition format."""
+        metrics = get_metrics()
+        scheduler = app.state.scheduler.snapshot()
+        metrics.scheduler_active.set(scheduler["active"])
+        metrics.scheduler_queued.set(scheduler["queued"])
+        for event, value in app.state.plan_cache.snapshot().items():
+            metrics.cache_events.labels(event).set(value)
+        for event, value in app.state.destinations.stats.items():
+            metrics.destination_cache_events.labels(event).set(value)
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+    @app.get("/cache/stats")
+    async def cache_stats():
+        """Plan cache hit/miss/eviction counters."""
+        return app.state.plan_cache.snapshot()
+
+    @app.get("/destinations/stats")
+    async def destination_stats():
+        """Destination knowledge cache counters, hit rate and itinerary tokens with and without knowledge."""
+        return app.state.destinations.snapshot()
+
+    @app.get("/models/stats")
+    async def model_stats():
+        """Per-deployment load and per-agent model call latency and tokens."""
+        model_clients = app.state.model_clients
+        # Stats alone should not load the model stack
+        return model_clients.router.snapshot() if model_clients.started else {"routes": {}, "agents": {}}
+
+    @app.get("/scheduler/stats")
+    async def scheduler_stats():
+        """Plan scheduler queue, slot and rate-limit state."""
+        return app.state.scheduler.snapshot()
 
     @app.get("/")
     async def root():
@@ -74,7 +388,20 @@ def create_app() -> FastAPI:
             "version": "1.0.0",
             "endpoints": {
                 "generate_plan": "/generate-travel-plan (POST)",
-                "health": "/health (GET)"
+                "replan": "/replan (POST)",
+                "batch": "/batch?parallelism=N&batch_id=ID (POST, JSONL)",
+                "batch_status": "/batch/{batch_id} (GET)",
+                "create_job": "/jobs (POST)",
+                "job_status": "/jobs/{job_id} (GET)",
+                "job_events": "/jobs/{job_id}/events?after=N (GET)",
+                "job_stats": "/jobs/stats (GET)",
+                "metrics": "/metrics (GET)",
+                "cache_stats": "/cache/stats (GET)",
+                "destination_stats": "/destinations/stats (GET)",
+                "model_stats": "/models/stats (GET)",
+                "scheduler_stats": "/scheduler/stats (GET)",
+                "health": "/health (GET)",
+                "readiness": "/health/ready (GET)"
             }
         }
     
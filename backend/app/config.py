@@ -0,0 +1,240 @@
+"""
+Application settings loaded from environment variables
+"""
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+
+def _env_bool(name: str, default: bool) -> bool:
+    """Read a boolean flag from the environment."""
+    value = os.environ.get(name)
+    if value is None or not value.strip():
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+def _env_int(name: str, default: int) -> int:
+    """Read an integer setting from the environment."""
+    value = os.environ.get(name)
+    return int(value) if value and value.strip() else default
+
+def _env_float(name: str, default: float) -> float:
+    """Read a float setting from the environment."""
+    value = os.environ.get(name)
+    return float(value) if value and value.strip() else default
+
+def _env_str(name: str, default: Optional[str]) -> Optional[str]:
+    """Read an optional string setting from the environment."""
+    value = os.environ.get(name)
+    return value.strip() if value and value.strip() else default
+
+@dataclass(frozen=True)
+class Settings:
+    """Runtime configuration for the planning pipeline."""
+    # Use the LLM FlightsAgent/AccommodationAgent instead of the code-side renderers
+    llm_booking_agents: bool = False
+    # Use the LLM ImagesAgent instead of the local Google Images linker
+    llm_images_agent: bool = False
+    # Always run the LLM CriticAgent instead of only when the rule-based validation fails
+    llm_critic_agent: bool = False
+    # "dag" runs independent stages concurrently; "sequential" uses the round-robin team
+    orchestration_mode: str = "dag"
+    # Seconds between full-document snapshots in delta streaming mode (0 disables)
+    stream_snapshot_interval: float = 30.0
+    # Delta mode: streamed tokens are merged into one patch per window of seconds, or per this many characters
+    stream_delta_window: float = 0.1
+    stream_delta_max_chars: int = 1024
+
+    # "latest_document" shows each LLM stage only its task and the latest document; "full" keeps the history
+    context_policy: str = "latest_document"
+    # In DAG mode, also limit section-owning LLM stages to the sections they need
+    context_sections: bool = True
+    # Per-plan token cap across all agents, counted with tiktoken (0 = unlimited)
+    plan_token_cap: int = 0
+
+    # Emit OpenTelemetry spans per plan and agent turn (needs an SDK/exporter configured to be useful)
+    tracing_enabled: bool = False
+
+    # Long trips: write the itinerary as a skeleton plus concurrent blocks of days (0 disables)
+    chunked_itinerary_min_days: int = 10
+    chunked_itinerary_days_per_chunk: int = 4
+    chunked_itinerary_max_parallel: int = 4
+
+    # "azure" or "fake" (offline recorded/synthetic responses for load tests and benchmarks)
+    model_client: str = "azure"
+    fake_model_profile: str = "instant"  # instant, fast, azure or slow
+    fake_model_recording: Optional[str] = None  # JSON file mapping agent names to responses
+
+    # Shared HTTP connection pool used by the model clients
+    model_http2: bool = True
+    model_max_connections: int = 100
+    model_max_keepalive_connections: int = 20
+    model_keepalive_expiry: float = 60.0
+    model_request_timeout: float = 300.0
+
+    # Per-agent model routing: extra deployments as JSON ({"mini": {"deployment": "gpt-4o-mini",
+    # "model": "gpt-4o-mini", "max_concurrency": 8}}; "default" is the AZURE_* one) and the agents
+    # routed to them ("ImagesAgent=mini,CriticAgent=mini"); unrouted agents use "default"
+    model_deployments: Optional[str] = None
+    model_routes: Optional[str] = None
+
+    # Straggler control per model call: timeout per attempt (0 = none; "Agent=seconds" pairs override
+    # it per stage), retries with full jitter on timeouts and transient errors, and hedging: a second
+    # request to another deployment ("Agent=deployment") once a call outlasts the agent's p95 latency
+    model_call_timeout: float = 0.0
+    model_stage_timeouts: Optional[str] = None
+    model_retries: int = 2
+    model_retry_base_delay: float = 0.5
+    model_retry_max_delay: float = 8.0
+    model_hedge_routes: Optional[str] = None
+    model_hedge_min_samples: int = 20
+    # Whole-plan deadline in seconds (0 = none): the plan stops and the latest valid document is sent as final
+    plan_deadline: float = 0.0
+
+    # Plan scheduler: concurrency limit, tokens-per-minute budget (0 = unlimited) and wait queue
+    scheduler_max_concurrent_plans: int = 4
+    scheduler_max_queue: int = 32
+    scheduler_tokens_per_minute: int = 0
+    scheduler_estimated_tokens_per_plan: int = 20000
+    scheduler_estimated_plan_seconds: float = 60.0
+    scheduler_max_backoff: float = 60.0
+    # Share of the plan slots batch plans may hold at once; they never count against the wait queue
+    scheduler_batch_share: float = 0.5
+
+    # Client disconnects: how often streams check for them, and how long a plan nobody follows
+    # keeps running so a reconnecting client (re-sending the same request) can pick it up
+    disconnect_poll_interval: float = 1.0
+    plan_reconnect_grace: float = 15.0
+
+    # Completed plan cache (in-memory LRU, optional SQLite tier)
+    plan_cache_enabled: bool = True
+    plan_cache_ttl: float = 6 * 60 * 60
+    plan_cache_max_entries: int = 256
+    plan_cache_db_path: Optional[str] = None
+    plan_cache_max_disk_entries: int = 10000
+
+    # Destination knowledge (base locations, landmarks, airport, tips) reused by plans for the same
+    # city, country and priority; in memory with an optional SQLite tier that prewarm.py fills
+    destination_cache_enabled: bool = True
+    destination_cache_ttl: float = 30 * 24 * 60 * 60
+    destination_cache_max_entries: int = 1024
+    destination_cache_db_path: Optional[str] = None
+    destination_cache_max_disk_entries: int = 10000
+
+    # Serving (main.py): worker processes and how long SIGTERM lets in-flight streams and jobs finish
+    server_host: str = "0.0.0.0"
+    server_port: int = 8000
+    server_workers: int = 1
+    server_drain_timeout: float = 30.0
+    # Import the agent stack, build the model clients and open their connections in the background
+    # at startup (/health/ready reports when done); otherwise the first plan pays for it
+    server_warmup: bool = True
+    # SQLite file (WAL) shared by worker processes: plan cache tier, job logs and rate-limit budget
+    shared_store_path: Optional[str] = None
+
+    # Background jobs: in-memory event ring per job, optional SQLite event log, retention and compaction
+    jobs_db_path: Optional[str] = None
+    jobs_ring_size: int = 2048
+    jobs_retention: float = 24 * 60 * 60
+    jobs_compact_after: float = 60 * 60
+    jobs_compaction_interval: float = 5 * 60
+
+    # Batch generation: plans run at the same time per batch (a request may ask for up to the max),
+    # items per batch, seconds between progress lines, and the SQLite checkpoints a rerun resumes from
+    batch_parallelism: int = 2
+    batch_max_parallelism: int = 8
+    batch_max_items: int = 1000
+    batch_progress_interval: float = 10.0
+    batch_db_path: Optional[str] = None
+    batch_retention: float = 7 * 24 * 60 * 60
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        """Build settings from the current environment."""
+        return cls(
+            llm_booking_agents=_env_bool("TRAVEL_PLANNER_LLM_BOOKING_AGENTS", cls.llm_booking_agents),
+            llm_images_agent=_env_bool("TRAVEL_PLANNER_LLM_IMAGES_AGENT", cls.llm_images_agent),
+            llm_critic_agent=_env_bool("TRAVEL_PLANNER_LLM_CRITIC_AGENT", cls.llm_critic_agent),
+            orchestration_mode=_env_str("ORCHESTRATION_MODE", cls.orchestration_mode).lower(),
+            stream_snapshot_interval=_env_float("STREAM_SNAPSHOT_INTERVAL", cls.stream_snapshot_interval),
+            stream_delta_window=_env_float("STREAM_DELTA_WINDOW", cls.stream_delta_window),
+            stream_delta_max_chars=_env_int("STREAM_DELTA_MAX_CHARS", cls.stream_delta_max_chars),
+            context_policy=_env_str("CONTEXT_POLICY", cls.context_policy).lower(),
+            context_sections=_env_bool("CONTEXT_SECTIONS", cls.context_sections),
+            plan_token_cap=_env_int("PLAN_TOKEN_CAP", cls.plan_token_cap),
+            tracing_enabled=_env_bool("TRACING_ENABLED", cls.tracing_enabled),
+            chunked_itinerary_min_days=_env_int("CHUNKED_ITINERARY_MIN_DAYS", cls.chunked_itinerary_min_days),
+            chunked_itinerary_days_per_chunk=_env_int(
+                "CHUNKED_ITINERARY_DAYS_PER_CHUNK", cls.chunked_itinerary_days_per_chunk
+            ),
+            chunked_itinerary_max_parallel=_env_int("CHUNKED_ITINERARY_MAX_PARALLEL", cls.chunked_itinerary_max_parallel),
+            model_client=_env_str("MODEL_CLIENT", cls.model_client).lower(),
+            fake_model_profile=_env_str("FAKE_MODEL_PROFILE", cls.fake_model_profile).lower(),
+            fake_model_recording=_env_str("FAKE_MODEL_RECORDING", cls.fake_model_recording),
+            model_http2=_env_bool("MODEL_HTTP2", cls.model_http2),
+            model_max_connections=_env_int("MODEL_MAX_CONNECTIONS", cls.model_max_connections),
+            model_max_keepalive_connections=_env_int(
+                "MODEL_MAX_KEEPALIVE_CONNECTIONS", cls.model_max_keepalive_connections
+            ),
+            model_keepalive_expiry=_env_float("MODEL_KEEPALIVE_EXPIRY", cls.model_keepalive_expiry),
+            model_request_timeout=_env_float("MODEL_REQUEST_TIMEOUT", cls.model_request_timeout),
+            model_deployments=_env_str("MODEL_DEPLOYMENTS", cls.model_deployments),
+            model_routes=_env_str("MODEL_ROUTES", cls.model_routes),
+            model_call_timeout=_env_float("MODEL_CALL_TIMEOUT", cls.model_call_timeout),
+            model_stage_timeouts=_env_str("MODEL_STAGE_TIMEOUTS", cls.model_stage_timeouts),
+            model_retries=_env_int("MODEL_RETRIES", cls.model_retries),
+            model_retry_base_delay=_env_float("MODEL_RETRY_BASE_DELAY", cls.model_retry_base_delay),
+            model_retry_max_delay=_env_float("MODEL_RETRY_MAX_DELAY", cls.model_retry_max_delay),
+            model_hedge_routes=_env_str("MODEL_HEDGE_ROUTES", cls.model_hedge_routes),
+            model_hedge_min_samples=_env_int("MODEL_HEDGE_MIN_SAMPLES", cls.model_hedge_min_samples),
+            plan_deadline=_env_float("PLAN_DEADLINE", cls.plan_deadline),
+            scheduler_max_concurrent_plans=_env_int(
+                "SCHEDULER_MAX_CONCURRENT_PLANS", cls.scheduler_max_concurrent_plans
+            ),
+            scheduler_max_queue=_env_int("SCHEDULER_MAX_QUEUE", cls.scheduler_max_queue),
+            scheduler_tokens_per_minute=_env_int("SCHEDULER_TOKENS_PER_MINUTE", cls.scheduler_tokens_per_minute),
+            scheduler_estimated_tokens_per_plan=_env_int(
+                "SCHEDULER_ESTIMATED_TOKENS_PER_PLAN", cls.scheduler_estimated_tokens_per_plan
+            ),
+            scheduler_estimated_plan_seconds=_env_float(
+                "SCHEDULER_ESTIMATED_PLAN_SECONDS", cls.scheduler_estimated_plan_seconds
+            ),
+            scheduler_max_backoff=_env_float("SCHEDULER_MAX_BACKOFF", cls.scheduler_max_backoff),
+            scheduler_batch_share=_env_float("SCHEDULER_BATCH_SHARE", cls.scheduler_batch_share),
+            disconnect_poll_interval=_env_float("DISCONNECT_POLL_INTERVAL", cls.disconnect_poll_interval),
+            plan_reconnect_grace=_env_float("PLAN_RECONNECT_GRACE", cls.plan_reconnect_grace),
+            plan_cache_enabled=_env_bool("PLAN_CACHE_ENABLED", cls.plan_cache_enabled),
+            plan_cache_ttl=_env_float("PLAN_CACHE_TTL", cls.plan_cache_ttl),
+            plan_cache_max_entries=_env_int("PLAN_CACHE_MAX_ENTRIES", cls.plan_cache_max_entries),
+            plan_cache_db_path=_env_str("PLAN_CACHE_DB_PATH", cls.plan_cache_db_path),
+            plan_cache_max_disk_entries=_env_int("PLAN_CACHE_MAX_DISK_ENTRIES", cls.plan_cache_max_disk_entries),
+            destination_cache_enabled=_env_bool("DESTINATION_CACHE_ENABLED", cls.destination_cache_enabled),
+            destination_cache_ttl=_env_float("DESTINATION_CACHE_TTL", cls.destination_cache_ttl),
+            destination_cache_max_entries=_env_int("DESTINATION_CACHE_MAX_ENTRIES", cls.destination_cache_max_entries),
+            destination_cache_db_path=_env_str("DESTINATION_CACHE_DB_PATH", cls.destination_cache_db_path),
+            destination_cache_max_disk_entries=_env_int(
+                "DESTINATION_CACHE_MAX_DISK_ENTRIES", cls.destination_cache_max_disk_entries
+            ),
+            server_host=_env_str("SERVER_HOST", cls.server_host),
+            server_port=_env_int("SERVER_PORT", cls.server_port),
+            server_workers=_env_int("SERVER_WORKERS", cls.server_workers),
+            server_drain_timeout=_env_float("SERVER_DRAIN_TIMEOUT", cls.server_drain_timeout),
+            server_warmup=_env_bool("SERVER_WARMUP", cls.server_warmup),
+            shared_store_path=_env_str("SHARED_STORE_PATH", cls.shared_store_path),
+            jobs_db_path=_env_str("JOBS_DB_PATH", cls.jobs_db_path),
+            jobs_ring_size=_env_int("JOBS_RING_SIZE", cls.jobs_ring_size),
+            jobs_retention=_env_float("JOBS_RETENTION", cls.jobs_retention),
+            jobs_compact_after=_env_float("JOBS_COMPACT_AFTER", cls.jobs_compact_after),
+            jobs_compaction_interval=_env_float("JOBS_COMPACTION_INTERVAL", cls.jobs_compaction_interval),
+            batch_parallelism=_env_int("BATCH_PARALLELISM", cls.batch_parallelism),
+            batch_max_parallelism=_env_int("BATCH_MAX_PARALLELISM", cls.batch_max_parallelism),
+            batch_max_items=_env_int("BATCH_MAX_ITEMS", cls.batch_max_items),
+            batch_progress_interval=_env_float("BATCH_PROGRESS_INTERVAL", cls.batch_progress_interval),
+            batch_db_path=_env_str("BATCH_DB_PATH", cls.batch_db_path),
+            batch_retention=_env_float("BATCH_RETENTION", cls.batch_retention),
+        )
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Return the process-wide settings, loaded once."""
+    return Settings.from_env()
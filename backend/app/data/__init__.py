@@ -0,0 +1,3 @@
+"""
+Bundled data tables
+"""
@@ -0,0 +1,200 @@
+"""
+Regenerate the bundled airport tables read by app.utils.airports
+
+The airports come from the ``airportsdata`` package (MIT, OurAirports/ICAO based) and the
+country names from ``pycountry``; neither is needed at runtime. Airports without an IATA
+code, heliports, seaplane bases, military fields and closed airports are left out.
+
+Each airport gets a rank (lower is more primary): the curated hubs below in order of
+passenger traffic, then "International" airports, then the rest. Its city keys are the
+dataset's city plus its parts ("Stockholm / Nykoping"), the metropolitan area it
+belongs to and the English names in ``CITY_ALIASES``.
+
+Tables (tab-separated, sorted by their first column):
+    airports.tsv        iata, kind (A airport, M metropolitan area), rank, country, city, name
+    airport_cities.tsv  normalized city name -> codes, most primary first
+    airport_words.tsv   normalized airport name word -> codes, most primary first
+    countries.tsv       ISO 3166 code -> country names and aliases
+
+Usage:
+    pip install airportsdata pycountry
+    python -m app.data.build_airports
+"""
+import csv
+import re
+from pathlib import Path
+
+from ..utils.airports import NAME_STOPWORDS, normalize_place
+
+DATA_DIR = Path(__file__).resolve().parent
+
+# Busiest passenger airports first; decides which airport is primary for a city
+HUBS = """
+ATL DXB DFW LHR HND DEN IST LAX ORD DEL CDG JFK CAN AMS PVG SIN FRA MAD BOM ICN SFO BCN LAS MCO BKK SEA PEK
+CLT CTU MIA SZX EWR PHX MEX FCO KUL DOH JED LGW CGK IAH BOS MUC SYD YYZ MSP DTW PKX HKG SAW NRT GRU CPH DUB
+KIX MNL ZRH VIE LIS FLL ORY OSL ARN BOG MEL BER TPE PMI AYT PHL SLC RUH BLR HYD MAA CCU CUN ATH BRU MXP LGA
+DCA IAD SAN BWI TPA AUH YVR GMP CJU WAW PRG HEL BUD SVO DME LED CAI JNB CPT ADD NBO LOS CMN SGN HAN DPS HKT
+AKL BNE PER SCL LIM EZE GIG BSB PTY SJO MDE STN LTN MAN EDI AGP ALC PMO NAP VCE FLR BGY LIN CIA NCE LYS MRS
+GVA BSL HAM DUS STR CGN TXL OPO FAO KEF TLV AMM BAH MCT KWI RAK IKA ISB KHI LHE DAC CMB MLE KTM RGN KTI SAI
+VTE BWN CEB CRK KHH TSA OKA CTS FUK NGO ITM SHA XIY KMG CKG HGH WUH TAO TNA XMN HAK SYX MFM HNL OGG ANC YUL
+YYC YOW AUS BNA MSY RDU SJC OAK PDX STL MCI SMF SNA HOU DAL MDW GDL MTY SJD PVR HAV SJU PUJ MBJ NAS UIO GYE
+ASU MVD AEP SDU CNF POA SSA REC FOR VCP CGH
+""".split()
+
+# Airports that no longer have passenger flights
+CLOSED = {"TXL", "ISL", "THF", "SXF"}
+
+# English or everyday city names the dataset spells differently
+CITY_ALIASES = {
+    "DPS": ["Denpasar", "Bali"],
+    "FCO": ["Rome"], "CIA": ["Rome"],
+    "VCE": ["Venice"], "TSF": ["Venice"],
+    "FLR": ["Florence"],
+    "NAP": ["Naples"],
+    "MXP": ["Milan"], "LIN": ["Milan"], "BGY": ["Milan"],
+    "DEL": ["Delhi"],
+    "KIX": ["Kyoto"], "ITM": ["Kyoto"],
+    "UKB": ["Kobe"],
+    "TSA": ["Taipei"], "TPE": ["Taipei"],
+    "YVR": ["Vancouver"], "YYZ": ["Toronto"], "YUL": ["Montreal"],
+    "EZE": ["Buenos Aires"],
+    "EWR": ["New York"],
+    "LED": ["Saint Petersburg"],
+    "DWC": ["Dubai"],
+    "SZB": ["Kuala Lumpur"],
+    "BVA": ["Paris"],
+    "CRL": ["Charleroi"],
+    "TRF": ["Oslo"],
+    "FRA": ["Frankfurt"],
+    "RAK": ["Marrakesh"],
+    "PRG": ["Praha"],
+    "LIS": ["Lisboa"],
+    "OPO": ["Porto"],
+    "CUN": ["Cancún"],
+    "HKT": ["Phuket"],
+    "SAI": ["Siem Reap"],
+    "KTI": ["Phnom Penh"],
+    "XIY": ["Xi'an"],
+    "MFM": ["Macau"],
+    "CEB": ["Cebu"],
+    "CRK": ["Clark"],
+    "PTY": ["Panama City"],
+    "MDE": ["Medellin"],
+    "MLE": ["Male"],
+    "KHH": ["Kaohsiung"],
+    "CJU": ["Jeju"],
+    "PMI": ["Palma", "Mallorca"],
+    "BSL": ["Basel"],
+    "BLR": ["Bengaluru"],
+    "SGN": ["Saigon"],
+    "OKA": ["Okinawa"],
+    "PUJ": ["Punta Cana"],
+    "SJD": ["Los Cabos"],
+    "OGG": ["Maui"],
+}
+
+# Country names people use besides the ISO ones
+COUNTRY_ALIASES = {
+    "US": ["USA", "United States of America", "America"],
+    "GB": ["UK", "Great Britain", "Britain", "England", "Scotland", "Wales", "Northern Ireland"],
+    "RU": ["Russia"],
+    "TR": ["Turkey"],
+    "CZ": ["Czech Republic"],
+    "KR": ["Korea"],
+    "AE": ["UAE"],
+    "NL": ["Holland"],
+    "CD": ["DR Congo", "Democratic Republic of the Congo"],
+    "CI": ["Ivory Coast"],
+    "BN": ["Brunei"],
+    "VA": ["Vatican", "Vatican City"],
+    "CV": ["Cape Verde"],
+    "SZ": ["Swaziland"],
+    "MM": ["Burma"],
+    "PS": ["Palestine"],
+}
+
+_EXCLUDED_NAMES = re.compile(
+    r"heliport|seaplane|air base|air force|\bAFB\b|\bRAF\b|naval|army|military|airstrip|\bclosed\b", re.I
+)
+
+def _city_parts(city: str):
+    parts = [city]
+    for separator in (",", "/", " - "):
+        parts += [part.strip() for value in list(parts) for part in value.split(separator)]
+    seen = []
+    for part in parts:
+        if part and part.lower() not in (value.lower() for value in seen):
+            seen.append(part)
+    return seen
+
+def _write_table(name: str, header: str, rows) -> None:
+    """Write tab-separated rows sorted by their first column, the order AirportIndex binary-searches."""
+    with open(DATA_DIR / name, "w", encoding="utf-8", newline="\n") as output:
+        output.write(f"# {header} (generated by build_airports.py)\n")
+        for row in sorted(rows):
+            output.write("\t".join(str(value) for value in row) + "\n")
+
+def _ranked_codes(places) -> list:
+    """Place key -> its airports' codes, most primary first."""
+    return [(key, " ".join(code for _, code in sorted(entries))) for key, entries in places.items()]
+
+def main() -> None:
+    import airportsdata
+    import pycountry
+
+    package = Path(airportsdata.__file__).resolve().parent
+    metro_cities = {}
+    with open(package / "iata_macs.csv", encoding="utf-8") as metro_file:
+        metros = list(csv.DictReader(metro_file))
+    for metro in metros:
+        metro_cities.setdefault(metro["Airport Code"], []).append(metro["City Name"])
+
+    hub_rank = {code: rank for rank, code in enumerate(HUBS)}
+    rows = []
+    cities_index, words_index = {}, {}
+    for airport in airportsdata.load("IATA").values():
+        code = airport["iata"]
+        if not re.fullmatch(r"[A-Z]{3}", code or "") or code in CLOSED or _EXCLUDED_NAMES.search(airport["name"]):
+            continue
+        if code in hub_rank:
+            rank = hub_rank[code]
+        elif "international" in airport["name"].lower():
+            rank = 1000
+        else:
+            rank = 2000
+        cities = _city_parts(airport["city"] or airport["subd"] or "")
+        for city in metro_cities.get(code, []) + CITY_ALIASES.get(code, []):
+            if city.lower() not in (value.lower() for value in cities):
+                cities.append(city)
+        rows.append((code, "A", rank, airport["country"], cities[0] if cities else "", airport["name"]))
+        for city in cities:
+            key = normalize_place(city)
+            if key and (rank, code) not in cities_index.setdefault(key, []):
+                cities_index[key].append((rank, code))
+        for word in set(normalize_place(airport["name"]).split()) - NAME_STOPWORDS:
+            words_index.setdefault(word, []).append((rank, code))
+
+    # Metropolitan area codes (LON, NYC, TYO ...) resolve as codes but are never a city's airport
+    codes = {row[0] for row in rows}
+    for code, metro in {metro["City Code"]: metro for metro in metros}.items():
+        if code not in codes:
+            rows.append((code, "M", 3000, metro["Country"], metro["City Name"], f"{metro['City Name']} (all airports)"))
+
+    _write_table("airports.tsv", "iata\tkind\trank\tcountry\tcity\tname", rows)
+    _write_table("airport_cities.tsv", "city\tiata codes, most primary first", _ranked_codes(cities_index))
+    _write_table("airport_words.tsv", "airport name word\tiata codes, most primary first", _ranked_codes(words_index))
+
+    countries = []
+    for country in pycountry.countries:
+        names = [getattr(country, "common_name", None) or country.name, country.name,
+                 getattr(country, "official_name", None)] + COUNTRY_ALIASES.get(country.alpha_2, [])
+        unique = []
+        for name in names:
+            if name and name not in unique:
+                unique.append(name)
+        countries.append((country.alpha_2, "|".join(unique)))
+    _write_table("countries.tsv", "code\tnames", countries)
+    print(f"{len(rows)} airports, {len(cities_index)} city names")
+
+if __name__ == "__main__":
+    main()
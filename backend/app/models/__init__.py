@@ -1,11 +1,15 @@
 """
 Data models package
 """
-from .request import TravelPlanRequest, StreamMessage
+from .request import TravelPlanRequest, ReplanRequest, StreamMessage, STREAM_MODE_FULL, STREAM_MODE_DELTA, STREAM_MODES
 from .travel import TravelRequest
 
 __all__ = [
     "TravelPlanRequest",
+    "ReplanRequest",
     "StreamMessage", 
+    "STREAM_MODE_FULL",
+    "STREAM_MODE_DELTA",
+    "STREAM_MODES",
     "TravelRequest"
 ]
\ No newline at end of file
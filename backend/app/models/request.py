@@ -1,9 +1,13 @@
 """
 Pydantic models for API requests and responses
 """
-from typing import Optional
+from typing import Dict, Optional
 from pydantic import BaseModel
 
+STREAM_MODE_FULL = "full"
+STREAM_MODE_DELTA = "delta"
+STREAM_MODES = (STREAM_MODE_FULL, STREAM_MODE_DELTA)
+
 class TravelPlanRequest(BaseModel):
     """API request model for travel plan generation"""
     destination_city: str
@@ -15,11 +19,25 @@ class TravelPlanRequest(BaseModel):
     departure_airport: Optional[str] = None
     destination_airport: Optional[str] = None
     additional_preferences: Optional[str] = None
+    stream_mode: str = STREAM_MODE_FULL  # full/delta
+
+class ReplanRequest(BaseModel):
+    """API request model for re-planning a previous plan after the trip details changed"""
+    request: TravelPlanRequest  # the changed trip
+    job_id: Optional[str] = None  # a completed job whose plan to start from...
+    previous_plan: Optional[str] = None  # ...or the previous plan's markdown
+    previous_request: Optional[TravelPlanRequest] = None  # the trip previous_plan was made for
+    day_edits: Dict[int, str] = {}  # day number -> what to change about that day
 
 class StreamMessage(BaseModel):
     """Streaming response message model"""
-    type: str  # "progress", "markdown_update", "final", "error"
+    type: str  # "progress", "queued", "markdown_update", "delta", "usage", "final", "error"
     agent: Optional[str] = None
     content: str
     timestamp: str
-    character_count: Optional[int] = None
\ No newline at end of file
+    character_count: Optional[int] = None  # document length in UTF-16 code units (JavaScript string length)
+    offset: Optional[int] = None  # delta: start of the replaced span, in UTF-16 code units
+    length: Optional[int] = None  # delta: number of UTF-16 code units replaced
+    sequence: Optional[int] = None  # job event streams: offset to resume after
+    usage: Optional[Dict] = None  # usage: token counts for an agent or the whole plan
+    outcome: Optional[str] = None  # final: "completed", or why the plan ended early ("partial", "deadline", "token_cap")
\ No newline at end of file
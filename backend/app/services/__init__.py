@@ -1,24 +1,37 @@
 """
 Business logic services package
+
+The agent and model stack (autogen, OpenAI) is imported on first use of these names,
+so importing a service module does not load it.
 """
-from .ai_client import create_model_client
-from .agents import (
-    create_itinerary_agent,
-    create_images_agent,
-    create_flights_agent,
-    create_accommodation_agent,
-    create_critic_agent,
-    create_sequential_travel_team
-)
-from .travel_planner import stream_travel_plan
+from importlib import import_module
+
+_EXPORTS = {
+    "create_model_client": ".ai_client",
+    "create_model_router": ".ai_client",
+    "create_itinerary_agent": ".agents",
+    "create_images_agent": ".agents",
+    "create_flights_agent": ".agents",
+    "create_accommodation_agent": ".agents",
+    "create_critic_agent": ".agents",
+    "create_itinerary_stage": ".agents",
+    "create_images_stage": ".agents",
+    "create_booking_agents": ".agents",
+    "create_sequential_travel_team": ".agents",
+    "create_dag_travel_team": ".agents",
+    "create_travel_team": ".agents",
+    "stream_travel_plan": ".travel_planner",
+}
+
+__all__ = list(_EXPORTS)
+
+def __getattr__(name: str):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(module, __name__), name)
+    globals()[name] = value
+    return value
 
-__all__ = [
-    "create_model_client",
-    "create_itinerary_agent",
-    "create_images_agent", 
-    "create_flights_agent",
-    "create_accommodation_agent",
-    "create_critic_agent",
-    "create_sequential_travel_team",
-    "stream_travel_plan"
-]
\ No newline at end of file
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,244 +1,201 @@
 """
 AI agent definitions and configurations
 """
+from typing import Optional, Sequence
+
 from autogen_agentchat.agents import AssistantAgent
 from autogen_agentchat.teams import RoundRobinGroupChat
 from autogen_agentchat.conditions import MaxMessageTermination, TextMentionTermination
 
+from ..config import get_settings
 from ..models.travel import TravelRequest
-
-def create_itinerary_agent(model_client, travel_request: TravelRequest):
-    """Create the itinerary planning agent"""
+from ..utils.booking_links import ACCOMMODATION_PLACEHOLDER, FLIGHTS_PLACEHOLDER, resolve_flight_route
+from ..utils.image_links import ITINERARY_HEADING
+from ..utils.prompt_generation import trip_duration_days
+from .agent_templates import (
+    ACCOMMODATION_TEMPLATE,
+    CRITIC_TEMPLATE,
+    FLIGHTS_TEMPLATE,
+    IMAGES_TEMPLATE,
+    ITINERARY_TEMPLATE,
+    TIPS_TEMPLATE,
+    AgentTemplate,
+    accommodation_details,
+    flight_details,
+    knowledge_details,
+    trip_details
+)
+from .chunked_itinerary import ChunkedItineraryAgent
+from .destination_knowledge import DestinationKnowledge
+from .local_agents import (
+    ValidatingCriticAgent,
+    create_local_accommodation_agent,
+    create_local_flights_agent,
+    create_local_images_agent,
+    create_local_replan_agent
+)
+from .model_context import LatestDocumentContext
+from .model_routing import route_client
+from .orchestration import Stage, StageGraphRunner
+from .replanning import DayEditAgent, Replan
+from .token_accounting import TokenLedger
+
+def _assistant(template: AgentTemplate, model_client, details: Optional[str] = None, **kwargs) -> AssistantAgent:
     return AssistantAgent(
-        name="ItineraryAgent",
-        description="Creates personalized travel document based on user preferences.",
-        system_message=f"""You are the lead itinerary planner. You START the travel planning document.
-
-TRIP DETAILS:
-- Destination: {travel_request.destination_city}, {travel_request.destination_country}
-- Priority Focus: {travel_request.priority}
-- Budget Level: {travel_request.budget_level}
-
-Your job is to create a comprehensive travel plan document in proper markdown format tailored to these preferences.
-
-IMPORTANT FORMATTING RULES:
-1. Start with a clear markdown document structure
-2. Use proper markdown headers (# ## ###)
-3. Include placeholder text that other agents can easily find and replace
-4. Make sure your output is a complete, well-formatted markdown document
-5. Tailor activities to the user's priority focus ({travel_request.priority})
-
-Use this EXACT structure:
-```markdown
-# 🌟 {travel_request.destination_city}, {travel_request.destination_country} Travel Plan
-
-## 📋 Trip Overview
-- **Duration:** [X] days
-- **Dates:** {travel_request.depart_date} to {travel_request.return_date}
-- **Budget:** {travel_request.budget_level}
-- **Focus:** {travel_request.priority}
-
-## 🗺️ Recommended Base Locations
-[List strategic cities/areas to stay with brief explanations]
-
-## 📅 Day-by-Day Itinerary
-
-### Day 1: [Theme/Focus]
-**Morning (9:00-12:00)**
-- [Activity with specific location and details]
-
-**Afternoon (12:00-17:00)** 
-- [Activity with specific location and details]
-
-**Evening (17:00-21:00)**
-- [Activity with specific location and details]
-
-[Continue for each day...]
-
-<!-- FLIGHTS_PLACEHOLDER -->
-
-<!-- ACCOMMODATION_PLACEHOLDER -->
-
-## 💡 Travel Tips & Practical Information
-[Include local tips, booking advice, cultural notes]
-```
-
-After creating the document, end with: "ITINERARY_COMPLETE - Ready for ImagesAgent".""",
+        name=template.name,
+        description=template.description,
+        system_message=template.system_message(details),
         model_client=model_client,
+        **kwargs,
     )
 
-def create_images_agent(model_client):
-    """Create the images enhancement agent"""
-    return AssistantAgent(
-        name="ImagesAgent",
-        description="Adds Google image search links to notable locations in the Day-by-Day Itinerary section.",
-        system_message="""You are the images specialist. You will receive a complete travel document with a detailed itinerary.
-
-Your job is to:
-1. Take the ENTIRE existing travel document
-2. Identify notable locations, attractions, temples, landmarks, restaurants, and places mentioned in the "## 📅 Day-by-Day Itinerary" section ONLY
-3. Generate Google Images search URLs for these locations using this format:
-   - Clean the location name (remove special characters, replace spaces with +)
-   - Create URL: https://www.google.com/search?q=[LOCATION_NAME_ENCODED]&tbm=isch
-   - Example: "Tokyo Tower" becomes "https://www.google.com/search?q=Tokyo+Tower&tbm=isch"
-4. Replace location names with markdown links: [Location Name](Google Images URL)
-5. Return the COMPLETE updated document with enhanced itinerary links
-
-GOOGLE IMAGES URL GENERATION RULES:
-- Replace spaces with + signs
-- Replace commas with %2C
-- Keep alphanumeric characters and common punctuation
-- Format: https://www.google.com/search?q=[encoded_location]&tbm=isch
-
-CRITICAL RULES:
-- ONLY modify the "## 📅 Day-by-Day Itinerary" section
-- Keep everything else exactly the same
-- Format should be: [Location Name](Google Images URL)
-- Only add links to specific places, attractions, landmarks, temples, restaurants, etc.
-- Don't add links to generic words like "train", "hotel", "lunch"
-
-After updating, end with: "IMAGES_COMPLETE - Ready for FlightsAgent".""",
-        model_client=model_client,
+def create_itinerary_agent(
+    model_client,
+    travel_request: TravelRequest,
+    model_client_stream: bool = False,
+    model_context=None,
+    knowledge: Optional[DestinationKnowledge] = None,
+):
+    """Create the itinerary planning agent"""
+    details = trip_details(travel_request)
+    if knowledge:
+        details = f"{details}\n\n{knowledge_details(knowledge)}"
+    return _assistant(
+        ITINERARY_TEMPLATE,
+        model_client,
+        details,
+        model_client_stream=model_client_stream,
+        model_context=model_context,
     )
 
-def create_flights_agent(model_client, travel_request: TravelRequest):
-    """Create the flights booking agent"""
-    return AssistantAgent(
-        name="FlightsAgent", 
-        description="Adds flight booking information using user's travel details.",
-        system_message=f"""You are the flight specialist. You will receive a complete travel document with a flights placeholder.
-
-USER'S FLIGHT DETAILS:
-- Departure Airport: {travel_request.departure_airport or 'Not specified - please infer appropriate airport'}
-- Destination Airport: {travel_request.destination_airport or 'Not specified - please infer appropriate airport for the destination'}
-- Depart Date: {travel_request.depart_date}
-- Return Date: {travel_request.return_date}
-
-AIRPORT INFERENCE GUIDE:
-- For major cities, use the main international airport
-- Tokyo: NRT (Narita) or HND (Haneda)
-- London: LHR (Heathrow), LGW (Gatwick), or STN (Stansted)
-- Paris: CDG (Charles de Gaulle)
-- New York: JFK or LGA
-- Use common sense for other destinations
-
-FLIGHT URL GENERATION:
-Once you determine the appropriate airports, generate these booking URLs:
-
-1. KAYAK URL FORMAT:
-   https://www.kayak.co.uk/flights/[FROM]-[TO]/[YYYY-MM-DD]/[YYYY-MM-DD]?sort=bestflight_a
-
-2. SKYSCANNER URL FORMAT:
-   https://www.skyscanner.net/transport/flights/[from_lower]/[to_lower]/[YYMMDD]/[YYMMDD]/
-
-CRITICAL: You must preserve ALL existing content including all Google Images links added by ImagesAgent.
-
-Only replace the <!-- FLIGHTS_PLACEHOLDER --> section with:
-
-```markdown
-## ✈️ Flight Information
-
-**Route:** [FROM] → [TO]  
-**Dates:** [DEPART_DATE] to [RETURN_DATE]
-
-### Booking Links:
-- 🔗 **[Kayak - Compare Prices]([KAYAK_URL])**
-- 🔗 **[Skyscanner - Flexible Dates]([SKYSCANNER_URL])**
-```
+def create_images_agent(model_client, model_context=None):
+    """Create the images enhancement agent"""
+    return _assistant(IMAGES_TEMPLATE, model_client, model_context=model_context)
 
-After updating, end with: "FLIGHTS_COMPLETE - Ready for AccommodationAgent".""",
-        model_client=model_client,
-    )
+def create_flights_agent(model_client, travel_request: TravelRequest, model_context=None):
+    """Create the flights booking agent"""
+    return _assistant(FLIGHTS_TEMPLATE, model_client, flight_details(travel_request), model_context=model_context)
 
-def create_accommodation_agent(model_client, travel_request: TravelRequest):
+def create_accommodation_agent(model_client, travel_request: TravelRequest, model_context=None):
     """Create the accommodation booking agent"""
-    return AssistantAgent(
-        name="AccommodationAgent",
-        description="Adds accommodation information using user's travel details.",
-        system_message=f"""You are the accommodation specialist. You will receive a complete travel document with an accommodation placeholder.
-
-USER'S ACCOMMODATION DETAILS:
-- Destination: {travel_request.destination_city}, {travel_request.destination_country}
-- Check-in: {travel_request.depart_date}
-- Check-out: {travel_request.return_date}
-
-AIRBNB URL GENERATION:
-For each recommended base location, generate Airbnb search URLs using this format:
-https://www.airbnb.co.uk/s/[FORMATTED_DESTINATION]/homes?checkin=[YYYY-MM-DD]&checkout=[YYYY-MM-DD]&adults=2
-
-DESTINATION FORMATTING RULES:
-- Replace commas with "--"
-- Replace spaces with "-"
-
-CRITICAL INSTRUCTIONS:
-1. You MUST output the COMPLETE travel document 
-2. You MUST preserve ALL existing content including:
-   - The complete Day-by-Day Itinerary
-   - All Google Images links added by ImagesAgent
-   - The Flight Information section added by FlightsAgent
-   - All other sections and content
-3. ONLY replace the "<!-- ACCOMMODATION_PLACEHOLDER -->" with the accommodation section
-4. DO NOT truncate, shorten, or omit any existing content
-
-
-Your job is to:
-1. Take the ENTIRE existing travel document
-2. Identify each recommended base location from the "🗺️ Recommended Base Locations" section
-3. Generate Airbnb URLs for each location
-4. Replace "<!-- ACCOMMODATION_PLACEHOLDER -->" with:
-
-```markdown
-## 🏠 Accommodation Options
-
-### Recommended Areas:
-
-#### [Location 1 Name]
-- 🔗 **[Browse Airbnb Properties]([AIRBNB_URL_1])**
-
-[Continue for each base location...]
-
-### Booking Tips:
-- Book early for better rates and availability
-- Consider proximity to public transportation
-- Read recent reviews for the most accurate information
-- Look for properties with flexible cancellation policies
-```
-
-After completing, end with: "ACCOMMODATION_COMPLETE - Ready for CriticAgent".""",
-        model_client=model_client,
+    return _assistant(
+        ACCOMMODATION_TEMPLATE, model_client, accommodation_details(travel_request), model_context=model_context
     )
 
-def create_critic_agent(model_client):
+def create_tips_agent(model_client, travel_request: TravelRequest, model_context=None):
+    """Create the travel tips agent used when a re-plan changes the budget"""
+    return _assistant(TIPS_TEMPLATE, model_client, trip_details(travel_request), model_context=model_context)
+
+def create_critic_agent(model_client, model_context=None):
     """Create the quality control and final review agent"""
-    return AssistantAgent(
-        name="CriticAgent",
-        description="Reviews the complete travel document and outputs the final markdown.",
-        system_message="""You are the quality control critic and final document processor.
-
-Your job is to:
-1. Review the complete travel document for quality and completeness
-2. Ensure no placeholders remain (<!-- PLACEHOLDER --> tags)
-3. Check that the document follows proper markdown formatting
-4. PRESERVE all Google Images links added by ImagesAgent
-5. PRESERVE all booking links added by FlightsAgent and AccommodationAgent
-6. Only make formatting improvements, not content removals
-
-If the document is complete, respond with:
-DOCUMENT_READY
-
-[Insert the complete final markdown document here with ALL links preserved]""",
-        model_client=model_client,
+    return _assistant(CRITIC_TEMPLATE, model_client, model_context=model_context)
+
+def _metered(model_client, ledger: Optional[TokenLedger], agent: str):
+    """Route an agent to its deployment and charge its model calls to the plan's token ledger, when there is one."""
+    model_client = route_client(model_client, agent)
+    return ledger.meter(model_client, agent) if ledger is not None else model_client
+
+def _document_context(sections: Optional[Sequence[str]] = None):
+    """Model context for an LLM stage under the configured context policy (None = full history)."""
+    if get_settings().context_policy != "latest_document":
+        return None
+    return LatestDocumentContext(sections if get_settings().context_sections else None)
+
+def create_itinerary_stage(
+    model_client,
+    travel_request: TravelRequest,
+    stream_tokens: bool = False,
+    ledger: Optional[TokenLedger] = None,
+    knowledge: Optional[DestinationKnowledge] = None,
+):
+    """Create the itinerary stage, writing long trips in concurrent blocks of days.
+
+    The chunked stage cannot stream a single draft, so long trips are not token-streamed.
+    ``knowledge`` about the destination from earlier plans is added to the prompt.
+    """
+    settings = get_settings()
+    days = trip_duration_days(travel_request)
+    model_client = _metered(model_client, ledger, "ItineraryAgent")
+    if settings.chunked_itinerary_min_days and days >= settings.chunked_itinerary_min_days:
+        return ChunkedItineraryAgent(
+            model_client,
+            travel_request,
+            days=days,
+            days_per_chunk=settings.chunked_itinerary_days_per_chunk,
+            max_parallel=settings.chunked_itinerary_max_parallel,
+            knowledge=knowledge,
+        )
+    return create_itinerary_agent(
+        model_client,
+        travel_request,
+        model_client_stream=stream_tokens,
+        model_context=_document_context(),
+        knowledge=knowledge,
     )
 
-def create_sequential_travel_team(model_client, travel_request: TravelRequest):
+def create_images_stage(model_client, ledger: Optional[TokenLedger] = None, sections: Optional[Sequence[str]] = None):
+    """Create the images stage, using the local linker unless the LLM agent is opted into.
+
+    ``sections`` limits the document the LLM agent sees (only safe where its output is
+    merged by section).
+    """
+    if get_settings().llm_images_agent:
+        return create_images_agent(_metered(model_client, ledger, "ImagesAgent"), _document_context(sections))
+    return create_local_images_agent()
+
+def create_booking_agents(
+    model_client, travel_request: TravelRequest, ledger: Optional[TokenLedger] = None, trim_sections: bool = False
+):
+    """Create the flights and accommodation stages, preferring the code-side renderers.
+
+    The LLM agents are only used when opted into via settings, or for flights when
+    the airports cannot be resolved without the model's help. With ``trim_sections``
+    the LLM agents only see the sections they need.
+    """
+    flights_context = _document_context(() if trim_sections else None)
+    flights_client = _metered(model_client, ledger, "FlightsAgent")
+    if get_settings().llm_booking_agents:
+        return (
+            create_flights_agent(flights_client, travel_request, flights_context),
+            create_accommodation_agent(
+                _metered(model_client, ledger, "AccommodationAgent"),
+                travel_request,
+                _document_context(("Recommended Base Locations",) if trim_sections else None),
+            ),
+        )
+
+    route = resolve_flight_route(travel_request)
+    if route is None:
+        flights_agent = create_flights_agent(flights_client, travel_request, flights_context)
+    else:
+        flights_agent = create_local_flights_agent(travel_request, route)
+
+    return flights_agent, create_local_accommodation_agent(travel_request)
+
+def create_critic_stage(model_client, travel_request: TravelRequest, ledger: Optional[TokenLedger] = None):
+    """Create the critic stage: rule-based validation, with the LLM critic only when it fails.
+
+    The LLM critic reviews every document when opted into via settings.
+    """
+    critic = create_critic_agent(_metered(model_client, ledger, "CriticAgent"), _document_context())
+    if get_settings().llm_critic_agent:
+        return critic
+    return ValidatingCriticAgent(critic, trip_duration_days(travel_request))
+
+def create_sequential_travel_team(
+    model_client,
+    travel_request: TravelRequest,
+    stream_tokens: bool = False,
+    ledger: Optional[TokenLedger] = None,
+    knowledge: Optional[DestinationKnowledge] = None,
+):
     """Create a sequential team that builds a single cohesive markdown document."""
     
     # Create all agents
-    itinerary_agent = create_itinerary_agent(model_client, travel_request)
-    images_agent = create_images_agent(model_client)
-    flights_agent = create_flights_agent(model_client, travel_request)
-    accommodation_agent = create_accommodation_agent(model_client, travel_request)
-    critic_agent = create_critic_agent(model_client)
+    itinerary_agent = create_itinerary_stage(model_client, travel_request, stream_tokens, ledger, knowledge)
+    images_agent = create_images_stage(model_client, ledger)
+    flights_agent, accommodation_agent = create_booking_agents(model_client, travel_request, ledger)
+    critic_agent = create_critic_stage(model_client, travel_request, ledger)
     
     # Combined termination conditions
     max_msg_termination = MaxMessageTermination(max_messages=25)
@@ -251,4 +208,108 @@ def create_sequential_travel_team(model_client, travel_request: TravelRequest):
         termination_condition=combined_termination,
     )
     
-    return team
\ No newline at end of file
+    return team
+
+def create_dag_travel_team(
+    model_client,
+    travel_request: TravelRequest,
+    stream_tokens: bool = False,
+    ledger: Optional[TokenLedger] = None,
+    knowledge: Optional[DestinationKnowledge] = None,
+):
+    """Create a stage graph where images, flights and accommodation run concurrently.
+
+    Each branch only depends on the itinerary and owns one section of the document;
+    the critic reviews the merged result against the branches' documents.
+    """
+    itinerary_agent = create_itinerary_stage(model_client, travel_request, stream_tokens, ledger, knowledge)
+    images_agent = create_images_stage(model_client, ledger, sections=(ITINERARY_HEADING,))
+    flights_agent, accommodation_agent = create_booking_agents(model_client, travel_request, ledger, trim_sections=True)
+    critic_agent = create_critic_stage(model_client, travel_request, ledger)
+    
+    itinerary = itinerary_agent.name
+    stages = [
+        Stage(itinerary_agent),
+        Stage(images_agent, inputs=(itinerary,), section=ITINERARY_HEADING),
+        Stage(flights_agent, inputs=(itinerary,), section="Flight Information", placeholder=FLIGHTS_PLACEHOLDER),
+        Stage(
+            accommodation_agent,
+            inputs=(itinerary,),
+            section="Accommodation Options",
+            placeholder=ACCOMMODATION_PLACEHOLDER,
+        ),
+        Stage(
+            critic_agent,
+            inputs=(images_agent.name, flights_agent.name, accommodation_agent.name),
+            history=True,
+        ),
+    ]
+    
+    return StageGraphRunner(stages)
+
+def create_replan_team(
+    model_client,
+    travel_request: TravelRequest,
+    replan: Replan,
+    ledger: Optional[TokenLedger] = None,
+):
+    """Create a stage graph that only redoes what a changed request invalidates in a previous plan.
+
+    The first stage hands on the previous document with the affected sections cleared;
+    the stages that redo them (edited days, flights, accommodation, tips) run concurrently
+    and the critic validates the merge, as in a new plan.
+    """
+    scope = replan.scope
+    seed = create_local_replan_agent()
+    stages = [Stage(seed)]
+    if scope.days:
+        day_agent = DayEditAgent(
+            _metered(model_client, ledger, "DayEditAgent"), travel_request, replan.day_edits, replan.previous_days
+        )
+        stages.append(Stage(day_agent, inputs=(seed.name,), section=ITINERARY_HEADING))
+    if scope.flights or scope.accommodation:
+        flights_agent, accommodation_agent = create_booking_agents(
+            model_client, travel_request, ledger, trim_sections=True
+        )
+        if scope.flights:
+            stages.append(Stage(
+                flights_agent, inputs=(seed.name,), section="Flight Information", placeholder=FLIGHTS_PLACEHOLDER
+            ))
+        if scope.accommodation:
+            stages.append(Stage(
+                accommodation_agent,
+                inputs=(seed.name,),
+                section="Accommodation Options",
+                placeholder=ACCOMMODATION_PLACEHOLDER,
+            ))
+    if scope.tips:
+        tips_agent = create_tips_agent(
+            _metered(model_client, ledger, "TipsAgent"),
+            travel_request,
+            _document_context(("Trip Overview", "Travel Tips")),
+        )
+        stages.append(Stage(tips_agent, inputs=(seed.name,), section="Travel Tips"))
+    
+    critic_agent = create_critic_stage(model_client, travel_request, ledger)
+    branches = tuple(stage.name for stage in stages[1:]) or (seed.name,)
+    stages.append(Stage(critic_agent, inputs=branches, history=True))
+    
+    return StageGraphRunner(stages)
+
+def create_travel_team(
+    model_client,
+    travel_request: TravelRequest,
+    stream_tokens: bool = False,
+    ledger: Optional[TokenLedger] = None,
+    knowledge: Optional[DestinationKnowledge] = None,
+):
+    """Create the team for the configured orchestration mode.
+
+    ``model_client`` is a model client, or a ``ModelRouter`` that gives each agent its deployment's client;
+    ``stream_tokens`` makes the itinerary agent stream its draft token by token;
+    ``ledger`` meters every LLM agent's tokens against the plan's cap;
+    ``knowledge`` is what earlier plans learned about the destination.
+    """
+    if get_settings().orchestration_mode == "sequential":
+        return create_sequential_travel_team(model_client, travel_request, stream_tokens, ledger, knowledge)
+    return create_dag_travel_team(model_client, travel_request, stream_tokens, ledger, knowledge)
@@ -1,15 +1,177 @@
 """
 AI model client configuration and management
 """
+import asyncio
+import logging
 import os
-from autogen_ext.models.openai import AzureOpenAIChatCompletionClient
+from typing import TYPE_CHECKING, Awaitable, Callable, List, Optional
 
-def create_model_client():
-    """Create and return the Azure OpenAI model client."""
+from ..config import Settings, get_settings
+
+# The model stack (autogen, openai, httpx) takes over a second to import, so it is loaded
+# when the first client is built - by the startup warm-up, or else the first plan
+if TYPE_CHECKING:
+    import httpx
+
+    from .model_routing import ModelDeployment, ModelRouter
+
+logger = logging.getLogger(__name__)
+
+# Same as model_routing.DEFAULT_ROUTE
+DEFAULT_CLIENT = "default"
+
+ResponseHook = Callable[["httpx.Response"], Awaitable[None]]
+
+def create_http_client(
+    settings: Optional[Settings] = None, response_hooks: Optional[List[ResponseHook]] = None
+) -> "httpx.AsyncClient":
+    """Create the pooled HTTP client shared by all model clients."""
+    import httpx
+
+    settings = settings or get_settings()
+    return httpx.AsyncClient(
+        event_hooks={"response": list(response_hooks or [])},
+        http2=settings.model_http2,
+        limits=httpx.Limits(
+            max_connections=settings.model_max_connections,
+            max_keepalive_connections=settings.model_max_keepalive_connections,
+            keepalive_expiry=settings.model_keepalive_expiry,
+        ),
+        timeout=httpx.Timeout(settings.model_request_timeout, connect=10.0),
+    )
+
+def create_model_client(
+    http_client: Optional["httpx.AsyncClient"] = None,
+    deployment: Optional["ModelDeployment"] = None,
+    max_retries: Optional[int] = None,
+):
+    """Create and return the Azure OpenAI model client (or the offline fake when configured).
+
+    ``deployment`` selects a routed deployment; its unset fields come from the AZURE_* environment.
+    ``max_retries`` overrides the SDK's own retries (0 when the caller retries itself).
+    """
+    from .model_routing import ModelDeployment
+
+    settings = get_settings()
+    deployment = deployment or ModelDeployment(DEFAULT_CLIENT)
+    if settings.model_client == "fake":
+        from .fake_model_client import FakeChatCompletionClient
+        return FakeChatCompletionClient.from_file(
+            settings.fake_model_recording, deployment.fake_profile or settings.fake_model_profile
+        )
+
+    from autogen_ext.models.openai import AzureOpenAIChatCompletionClient
+
+    kwargs = {"http_client": http_client} if http_client is not None else {}
+    if max_retries is not None:
+        kwargs["max_retries"] = max_retries
     return AzureOpenAIChatCompletionClient(
-        model=os.environ["AZURE_OPENAI_MODEL_NAME"],
-        azure_deployment=os.environ["AZURE_DEPLOYMENT_NAME"],
-        azure_endpoint=os.environ["AZURE_OPENAI_ENDPOINT"],
-        api_version=os.environ["AZURE_OPENAI_API_VERSION"],
-        api_key=os.environ["AZURE_OPENAI_API_KEY"],
-    )
\ No newline at end of file
+        model=deployment.model or os.environ["AZURE_OPENAI_MODEL_NAME"],
+        azure_deployment=deployment.deployment or os.environ["AZURE_DEPLOYMENT_NAME"],
+        azure_endpoint=deployment.endpoint or os.environ["AZURE_OPENAI_ENDPOINT"],
+        api_version=deployment.api_version or os.environ["AZURE_OPENAI_API_VERSION"],
+        api_key=os.environ[deployment.api_key_env],
+        **kwargs,
+    )
+
+def create_model_router(
+    http_client: Optional["httpx.AsyncClient"] = None, settings: Optional[Settings] = None
+) -> "ModelRouter":
+    """Create a client per configured deployment and route agents to them (MODEL_DEPLOYMENTS/MODEL_ROUTES).
+
+    Calls follow the configured timeouts, retries and hedge routes (MODEL_CALL_TIMEOUT and friends).
+    """
+    from .model_routing import ModelRouter, load_call_policy, load_deployments, load_routes
+
+    settings = settings or get_settings()
+    deployments = load_deployments(settings)
+    routes = load_routes(settings, deployments)
+    hedge_routes = load_routes(settings, deployments, hedge=True)
+    # The router retries with its own jittered backoff; SDK retries would multiply its attempts
+    # and run past the per-attempt timeout
+    clients = {
+        name: create_model_client(http_client, deployment, max_retries=0) for name, deployment in deployments.items()
+    }
+    return ModelRouter(deployments, clients, routes, load_call_policy(settings), hedge_routes)
+
+class ModelClientPool:
+    """Process-wide model clients that share one pooled HTTP/2 connection pool.
+
+    Clients (one per configured deployment) are created once - by ``start()`` during the
+    startup warm-up, or on first use - and borrowed by request-level code, which must not
+    close them. ``router`` hands each agent its deployment's client.
+    """
+
+    def __init__(self, settings: Optional[Settings] = None, response_hooks: Optional[List[ResponseHook]] = None):
+        self._settings = settings or get_settings()
+        self._response_hooks = response_hooks or []
+        self._http_client: Optional["httpx.AsyncClient"] = None
+        self._router: Optional["ModelRouter"] = None
+
+    @property
+    def started(self) -> bool:
+        return self._router is not None
+
+    def _ensure_started(self) -> "ModelRouter":
+        if self._router is None:
+            from .token_accounting import observe_cached_tokens
+
+            http_client = create_http_client(self._settings, [*self._response_hooks, observe_cached_tokens])
+            try:
+                self._router = create_model_router(http_client, self._settings)
+            except BaseException:
+                # Not yet shared with anyone, and nothing else will close it
+                asyncio.ensure_future(http_client.aclose())
+                raise
+            self._http_client = http_client
+        return self._router
+
+    async def start(self) -> None:
+        """Open the shared HTTP client and build the model clients."""
+        self._ensure_started()
+
+    async def prime(self, timeout: float = 5.0) -> int:
+        """Open a pooled connection to each deployment's endpoint ahead of the first model call.
+
+        Returns how many endpoints answered; unreachable ones are left to the first call.
+        """
+        if self._settings.model_client == "fake":
+            return 0
+        router = self._ensure_started()
+        endpoints = {
+            deployment.endpoint or os.environ.get("AZURE_OPENAI_ENDPOINT", "")
+            for deployment in router.deployments.values()
+        }
+        endpoints.discard("")
+
+        async def connect(endpoint: str) -> bool:
+            # Any response means the TCP/TLS (and HTTP/2) session is now pooled
+            try:
+                await self._http_client.head(endpoint, timeout=timeout)
+                return True
+            except Exception as error:
+                logger.info("Could not pre-connect to %s: %s", endpoint, error)
+                return False
+
+        return sum(await asyncio.gather(*(connect(endpoint) for endpoint in endpoints)))
+
+    @property
+    def router(self) -> "ModelRouter":
+        """The per-agent router over the pooled clients (built now if the warm-up has not yet)."""
+        return self._ensure_started()
+
+    def get(self, name: str = DEFAULT_CLIENT):
+        """Borrow a deployment's model client by name."""
+        try:
+            return self.router.client(name)
+        except KeyError:
+            raise RuntimeError(f"Model client '{name}' is not configured") from None
+
+    async def close(self) -> None:
+        """Close all model clients and the shared HTTP connection pool."""
+        router, self._router = self._router, None
+        if router is not None:
+            await router.close()
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
@@ -0,0 +1,377 @@
+"""
+Batch plan generation: JSONL of requests in, JSONL of final documents out, with bounded parallelism and checkpoints
+"""
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from ..config import Settings, get_settings
+from ..models.request import TravelPlanRequest
+from ..models.travel import TravelRequest
+from .destination_knowledge import DestinationKnowledgeCache, destination_key
+from .metrics import get_metrics
+from .plan_cache import canonical_request_key
+from .shared_store import SQLiteWriter, connect
+from .stream_encoding import dumps, loads
+
+ITEM_COMPLETED = "completed"
+ITEM_DEGRADED = "degraded"
+ITEM_FAILED = "failed"
+
+class BatchError(ValueError):
+    """Raised when a batch as a whole cannot be run (empty or too large); bad lines only fail their item."""
+
+@dataclass
+class BatchItem:
+    """One line of a batch: its request, or why it could not be read.
+
+    ``key`` is the plan cache key of the request, so identical lines share one plan
+    and one checkpoint.
+    """
+    line: int
+    item_id: Optional[str] = None
+    travel_request: Optional[TravelRequest] = None
+    key: str = ""
+    error: Optional[str] = None
+
+    @property
+    def label(self) -> Optional[str]:
+        request = self.travel_request
+        return f"{request.destination_city}, {request.destination_country}" if request else None
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, detail['loc'])) or 'line'}: {detail['msg']}" for detail in error.errors())
+
+def parse_batch(body: str, max_items: int) -> List[BatchItem]:
+    """Read a JSONL batch: one ``TravelPlanRequest`` object per line, with an optional ``id`` echoed back.
+
+    Blank lines are skipped. A line that is not a valid request becomes a failed item
+    instead of failing the batch; ``stream_mode`` is ignored (results are whole documents).
+    """
+    items = []
+    for number, text in enumerate(body.splitlines(), start=1):
+        if not text.strip():
+            continue
+        item = BatchItem(line=number)
+        items.append(item)
+        try:
+            data = json.loads(text)
+            if not isinstance(data, dict):
+                raise ValueError("expected a JSON object")
+            item.item_id = str(data["id"]) if data.get("id") is not None else None
+            request = TravelPlanRequest.model_validate(data)
+        except ValidationError as error:
+            item.error = _validation_message(error)
+            continue
+        except ValueError as error:
+            item.error = f"Invalid JSON: {error}"
+            continue
+        item.travel_request = TravelRequest(**request.model_dump(exclude={"stream_mode"}))
+        item.key = canonical_request_key(item.travel_request)
+
+    if not items:
+        raise BatchError("The batch has no requests")
+    if len(items) > max_items:
+        raise BatchError(f"The batch has {len(items)} requests; at most {max_items} are allowed")
+    return items
+
+def batch_id_for(body: str) -> str:
+    """Default batch id: a hash of the input, so rerunning the same file resumes the same batch."""
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()[:16]
+
+def group_by_destination(items: List[BatchItem]) -> "OrderedDict[str, List[BatchItem]]":
+    """Group runnable items by destination (city, country, priority), in order of first appearance."""
+    groups: "OrderedDict[str, List[BatchItem]]" = OrderedDict()
+    for item in items:
+        groups.setdefault(destination_key(item.travel_request), []).append(item)
+    return groups
+
+class BatchCheckpoints:
+    """Finished batch items by (batch id, request key), so a rerun skips what already completed.
+
+    Kept in SQLite when a database path (or the shared store) is configured, so a rerun
+    resumes across restarts and on any worker; otherwise in memory for this process.
+    Failed and degraded items are recorded too but run again on a rerun. Records are written
+    by a writer thread; ``flush`` waits for them before reading a batch back.
+    """
+
+    def __init__(self, settings: Optional[Settings] = None):
+        settings = settings or get_settings()
+        self._retention = settings.batch_retention
+        database_path = settings.batch_db_path or settings.shared_store_path
+        self._connection = connect(database_path) if database_path else None
+        self._writer = SQLiteWriter(database_path, name="batch-writer") if database_path else None
+        self._memory: Dict[str, Dict[str, tuple]] = {}
+        if self._connection is not None:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS batch_items ("
+                " batch_id TEXT NOT NULL, item_key TEXT NOT NULL, status TEXT NOT NULL,"
+                " document TEXT, error TEXT, updated_at REAL NOT NULL, PRIMARY KEY (batch_id, item_key))"
+            )
+            self._connection.commit()
+
+    @property
+    def persistent(self) -> bool:
+        return self._connection is not None
+
+    async def flush(self) -> None:
+        """Wait until the items recorded so far are written."""
+        if self._writer is not None:
+            await self._writer.flush()
+
+    def completed(self, batch_id: str) -> Dict[str, str]:
+        """Documents of a batch's completed items by request key."""
+        if self._connection is None:
+            entries = self._memory.get(batch_id, {})
+            return {key: entry[1] for key, entry in entries.items() if entry[0] == ITEM_COMPLETED}
+        return dict(self._connection.execute(
+            "SELECT item_key, document FROM batch_items WHERE batch_id = ? AND status = ?", (batch_id, ITEM_COMPLETED)
+        ).fetchall())
+
+    def record(self, batch_id: str, key: str, status: str, document: str = "", error: Optional[str] = None) -> None:
+        now = time.time()
+        if self._connection is None:
+            self._memory.setdefault(batch_id, {})[key] = (status, document, error, now)
+            return
+        row = (batch_id, key, status, document or None, error, now)
+        self._writer.write(lambda connection: connection.execute(
+            "INSERT OR REPLACE INTO batch_items (batch_id, item_key, status, document, error, updated_at)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            row,
+        ))
+
+    def summary(self, batch_id: str) -> Dict[str, int]:
+        """Checkpointed item counts of a batch by status."""
+        if self._connection is None:
+            counts: Dict[str, int] = {}
+            for entry in self._memory.get(batch_id, {}).values():
+                counts[entry[0]] = counts.get(entry[0], 0) + 1
+            return counts
+        return dict(self._connection.execute(
+            "SELECT status, COUNT(*) FROM batch_items WHERE batch_id = ? GROUP BY status", (batch_id,)
+        ).fetchall())
+
+    def prune(self) -> int:
+        """Forget checkpoints older than the retention period; returns how many were deleted."""
+        expire_before = time.time() - self._retention
+        if self._connection is None:
+            pruned = 0
+            for batch_id, entries in list(self._memory.items()):
+                for key in [key for key, entry in entries.items() if entry[3] < expire_before]:
+                    del entries[key]
+                    pruned += 1
+                if not entries:
+                    del self._memory[batch_id]
+            return pruned
+        pruned = self._connection.execute("DELETE FROM batch_items WHERE updated_at < ?", (expire_before,)).rowcount
+        self._connection.commit()
+        return max(pruned, 0)
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        if self._connection is not None:
+            self._connection.close()
+
+def _record(type: str, **fields) -> str:
+    return dumps({"type": type, **fields}) + "\n"
+
+class BatchRunner:
+    """Runs the items of a batch at most ``parallelism`` at a time and streams a JSONL record as each finishes.
+
+    Identical requests are planned once. Items are grouped by destination: when the
+    destination knowledge cache does not know a destination yet, one of its plans runs
+    first and the rest follow once it has learned the destination, so the
+    destination-level work is done once per group. Other groups run meanwhile.
+
+    The stream starts with a ``batch`` record, then has an ``item`` record per line
+    (``completed`` with its document, ``degraded`` with the document of a plan that
+    finished early and its ``outcome``, or ``failed`` with the error; items completed by
+    an earlier run come first, marked ``resumed``), a ``progress`` record after each
+    item and every ``progress_interval`` seconds, and a closing ``summary``.
+    """
+
+    def __init__(
+        self,
+        batch_id: str,
+        items: List[BatchItem],
+        plan: Callable[[TravelRequest], AsyncIterator[str]],
+        checkpoints: BatchCheckpoints,
+        destinations: Optional[DestinationKnowledgeCache] = None,
+        parallelism: int = 2,
+        progress_interval: float = 10.0,
+    ):
+        self.batch_id = batch_id
+        self._items = items
+        self._plan = plan
+        self._checkpoints = checkpoints
+        self._destinations = destinations
+        self._semaphore = asyncio.Semaphore(max(1, parallelism))
+        self._parallelism = max(1, parallelism)
+        self._progress_interval = progress_interval
+        self._results: "asyncio.Queue[List[str]]" = asyncio.Queue()
+        self._counts = {ITEM_COMPLETED: 0, ITEM_DEGRADED: 0, ITEM_FAILED: 0, "resumed": 0, "generated": 0}
+        self._started = time.perf_counter()
+
+    def _item_record(self, item: BatchItem, status: str, **fields) -> str:
+        self._counts[status] += 1
+        return _record("item", line=item.line, id=item.item_id, destination=item.label, status=status, **fields)
+
+    def _progress(self) -> str:
+        elapsed = time.perf_counter() - self._started
+        finished = self._counts[ITEM_COMPLETED] + self._counts[ITEM_DEGRADED] + self._counts[ITEM_FAILED]
+        pending = len(self._items) - finished
+        # Throughput of the plans generated by this run, not of resumed items
+        rate = self._counts["generated"] / elapsed * 60 if elapsed > 0 else 0.0
+        return _record(
+            "progress",
+            batch_id=self.batch_id,
+            total=len(self._items),
+            completed=self._counts[ITEM_COMPLETED],
+            degraded=self._counts[ITEM_DEGRADED],
+            failed=self._counts[ITEM_FAILED],
+            pending=pending,
+            elapsed_seconds=round(elapsed, 2),
+            plans_per_minute=round(rate, 2),
+            eta_seconds=round(pending / rate * 60, 1) if rate and pending else None,
+        )
+
+    async def _generate(self, travel_request: TravelRequest) -> Tuple[str, Optional[str]]:
+        """Drain one plan and return its final document and outcome; raises RuntimeError if it failed."""
+        document = ""
+        outcome = None
+        errors = []
+        async with self._semaphore:
+            async for line in self._plan(travel_request):
+                message = loads(line)
+                if message.get("type") == "final":
+                    document = message.get("content") or document
+                    outcome = message.get("outcome")
+                elif message.get("type") == "markdown_update" and message.get("content"):
+                    document = message["content"]
+                elif message.get("type") == "error":
+                    errors.append(message.get("content") or "Unknown error")
+        if errors:
+            raise RuntimeError(errors[-1])
+        if not document:
+            raise RuntimeError("The plan ended without a final document")
+        return document, outcome
+
+    async def _run_key(self, items: List[BatchItem]) -> None:
+        """Plan one request and report it for every line that asked for it."""
+        started = time.perf_counter()
+        metrics = get_metrics()
+        try:
+            document, outcome = await self._generate(items[0].travel_request)
+        except asyncio.CancelledError:
+            raise
+        except Exception as error:
+            message = str(error) or type(error).__name__
+            self._checkpoints.record(self.batch_id, items[0].key, ITEM_FAILED, error=message)
+            metrics.batch_items.labels(ITEM_FAILED).inc(len(items))
+            records = [self._item_record(item, ITEM_FAILED, error=message) for item in items]
+        else:
+            # A plan finished early (deadline, token cap) is sent but not kept, so a rerun plans it again
+            status = ITEM_COMPLETED if outcome == "completed" else ITEM_DEGRADED
+            self._checkpoints.record(self.batch_id, items[0].key, status, document)
+            metrics.batch_items.labels(status).inc(len(items))
+            seconds = round(time.perf_counter() - started, 2)
+            records = [
+                self._item_record(item, status, document=document, outcome=outcome, seconds=seconds, resumed=False)
+                for item in items
+            ]
+        self._counts["generated"] += 1
+        await self._results.put(records + [self._progress()])
+
+    async def _run_group(self, keys: List[List[BatchItem]]) -> None:
+        leader, followers = keys[0], keys[1:]
+        destinations = self._destinations
+        if followers and destinations is not None and destinations.enabled and not destinations.contains(
+            leader[0].travel_request
+        ):
+            # Let one plan learn the destination before the others ask for it
+            await self._run_key(leader)
+            await asyncio.gather(*(self._run_key(items) for items in followers))
+        else:
+            await asyncio.gather(*(self._run_key(items) for items in keys))
+
+    async def run(self) -> AsyncIterator[str]:
+        """Run the batch, yielding its JSONL records; cancelling the stream stops the remaining plans."""
+        await self._checkpoints.flush()
+        completed = self._checkpoints.completed(self.batch_id)
+        invalid = [item for item in self._items if item.error]
+        resumed = [item for item in self._items if not item.error and item.key in completed]
+        by_key: "OrderedDict[str, List[BatchItem]]" = OrderedDict()
+        for item in self._items:
+            if not item.error and item.key not in completed:
+                by_key.setdefault(item.key, []).append(item)
+        groups = group_by_destination([items[0] for items in by_key.values()])
+
+        yield _record(
+            "batch",
+            batch_id=self.batch_id,
+            total=len(self._items),
+            resumed=len(resumed),
+            invalid=len(invalid),
+            plans=len(by_key),
+            destinations=len(groups),
+            parallelism=self._parallelism,
+            checkpoints="persistent" if self._checkpoints.persistent else "memory",
+        )
+        metrics = get_metrics()
+        for item in invalid:
+            metrics.batch_items.labels(ITEM_FAILED).inc()
+            yield self._item_record(item, ITEM_FAILED, error=item.error)
+        for item in resumed:
+            metrics.batch_items.labels("resumed").inc()
+            self._counts["resumed"] += 1
+            yield self._item_record(
+                item, ITEM_COMPLETED, document=completed[item.key], outcome="completed", seconds=0.0, resumed=True
+            )
+        if invalid or resumed:
+            yield self._progress()
+
+        tasks = [
+            asyncio.create_task(self._run_group([by_key[leader.key] for leader in group]))
+            for group in groups.values()
+        ]
+        remaining = asyncio.ensure_future(asyncio.gather(*tasks)) if tasks else None
+        try:
+            while remaining is not None and not (remaining.done() and self._results.empty()):
+                getter = asyncio.ensure_future(self._results.get())
+                done, _ = await asyncio.wait({getter, remaining}, timeout=self._progress_interval,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if getter in done:
+                    for record in getter.result():
+                        yield record
+                    continue
+                getter.cancel()
+                if not done:
+                    yield self._progress()
+            if remaining is not None:
+                # Raises if a group itself broke (item errors are reported, never raised)
+                remaining.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+            if remaining is not None:
+                await asyncio.gather(remaining, return_exceptions=True)
+
+        elapsed = time.perf_counter() - self._started
+        yield _record(
+            "summary",
+            batch_id=self.batch_id,
+            total=len(self._items),
+            completed=self._counts[ITEM_COMPLETED],
+            degraded=self._counts[ITEM_DEGRADED],
+            failed=self._counts[ITEM_FAILED],
+            resumed=self._counts["resumed"],
+            elapsed_seconds=round(elapsed, 2),
+            plans_per_minute=round(self._counts["generated"] / elapsed * 60, 2) if elapsed > 0 else 0.0,
+        )
@@ -0,0 +1,169 @@
+"""
+Chunked itinerary generation: a skeleton first, then blocks of days written concurrently and stitched together
+"""
+import asyncio
+import re
+from typing import List, Optional, Sequence, Tuple
+
+from autogen_agentchat.agents import BaseChatAgent
+from autogen_agentchat.base import Response
+from autogen_agentchat.messages import BaseChatMessage, TextMessage
+from autogen_core import CancellationToken
+from autogen_core.models import RequestUsage, SystemMessage, UserMessage
+
+from ..models.travel import TravelRequest
+from ..utils.content_processing import extract_markdown_content, find_section_span
+from ..utils.image_links import ITINERARY_HEADING
+from .agent_templates import CHUNK_INSTRUCTIONS, SKELETON_INSTRUCTIONS, knowledge_details, trip_details
+from .destination_knowledge import DestinationKnowledge
+
+ITINERARY_COMPLETION_MARKER = "ITINERARY_COMPLETE - Ready for ImagesAgent"
+
+_DAY_HEADING = re.compile(r"^###\s*Day\s+(\d+)\b.*$", re.M)
+
+# Closing remarks models add after the day entries: a stage marker or a line addressed to the reader
+_SIGN_OFF = re.compile(
+    r"\b[A-Z]+(?:_[A-Z]+)*_COMPLETE\b"
+    r"|^\W*(?:(?:I|We)\s+hope\b|Enjoy\s+your\s+(?:trip|stay|travels|journey|time)\b|Happy\s+travels\b"
+    r"|Have\s+an?\s+(?:great|wonderful|fantastic|amazing)\s+(?:trip|time|stay)\b|Let\s+me\s+know\b"
+    r"|Bon\s+voyage\b|This\s+(?:completes|concludes|covers)\b)",
+    re.I,
+)
+
+def split_day_ranges(days: int, days_per_chunk: int) -> List[Tuple[int, int]]:
+    """Split days 1..``days`` into inclusive (first, last) blocks of at most ``days_per_chunk``."""
+    days_per_chunk = max(1, days_per_chunk)
+    return [(first, min(first + days_per_chunk - 1, days)) for first in range(1, days + 1, days_per_chunk)]
+
+def skeleton_day_headings(skeleton: str) -> dict:
+    """Map day numbers to their ``### Day N: ...`` heading lines in the skeleton."""
+    return {int(match.group(1)): match.group(0).strip() for match in _DAY_HEADING.finditer(skeleton)}
+
+def clean_day_block(output: str) -> str:
+    """Keep only the day entries of a chunk completion (from its first day heading on)."""
+    text = extract_markdown_content(output)
+    match = _DAY_HEADING.search(text)
+    if match is None:
+        return ""
+    text = text[match.start():]
+    # Drop anything after the day entries, such as a stray section heading or closing remark
+    boundary = re.search(r"^(?:##?\s|<!--)", text, re.M)
+    text = (text[:boundary.start()] if boundary else text).strip()
+    # ... or a sign-off paragraph after the last day's activity list
+    paragraphs = text.rsplit("\n\n", 1)
+    if len(paragraphs) == 2 and _is_sign_off(*paragraphs):
+        text = paragraphs[0].rstrip()
+    return text
+
+def _is_sign_off(body: str, paragraph: str) -> bool:
+    """Whether the last ``paragraph`` of a day block is a closing remark rather than part of the day.
+
+    Prose or a time-of-day label is day content and stays; only a known sign-off, or a
+    line with no words at all (such as ``---``) right after the activity list, is dropped.
+    """
+    if _SIGN_OFF.search(paragraph):
+        return True
+    after_list = body.rstrip().rsplit("\n", 1)[-1].lstrip().startswith(("-", "*"))
+    return after_list and not re.search(r"\w", paragraph)
+
+def stitch_itinerary(skeleton: str, blocks: Sequence[str], days: int) -> str:
+    """Replace the skeleton's itinerary section with the generated day blocks.
+
+    Days missing from every block keep their skeleton heading, so the document always
+    has one entry per day in order.
+    """
+    headings = skeleton_day_headings(skeleton)
+    written = {}
+    for block in blocks:
+        matches = list(_DAY_HEADING.finditer(block))
+        for index, match in enumerate(matches):
+            end = matches[index + 1].start() if index + 1 < len(matches) else len(block)
+            written.setdefault(int(match.group(1)), block[match.start():end].strip())
+
+    entries = [written.get(day) or headings.get(day) or f"### Day {day}" for day in range(1, days + 1)]
+    section = f"## 📅 {ITINERARY_HEADING}\n\n" + "\n\n".join(entries) + "\n\n"
+
+    span = find_section_span(skeleton, ITINERARY_HEADING)
+    if span is None:
+        return skeleton.rstrip() + "\n\n" + section
+    return skeleton[:span[0]] + section + skeleton[span[1]:]
+
+class ChunkedItineraryAgent(BaseChatAgent):
+    """Itinerary stage for long trips that writes blocks of days concurrently.
+
+    A skeleton completion fixes the base locations and each day's theme; every block of
+    ``days_per_chunk`` days is then written from the skeleton alone, at most
+    ``max_parallel`` at a time, and stitched into the structure downstream stages expect.
+    Destination ``knowledge`` goes into the skeleton prompt, which fixes the base locations.
+    """
+
+    def __init__(
+        self,
+        model_client,
+        travel_request: TravelRequest,
+        days: int,
+        days_per_chunk: int,
+        max_parallel: int,
+        name: str = "ItineraryAgent",
+        knowledge: Optional[DestinationKnowledge] = None,
+    ):
+        super().__init__(name=name, description="Creates personalized travel document based on user preferences.")
+        self._model_client = model_client
+        self._travel_request = travel_request
+        self._days = days
+        self._days_per_chunk = days_per_chunk
+        self._max_parallel = max(1, max_parallel)
+        self._knowledge = knowledge
+
+    @property
+    def produced_message_types(self) -> Sequence[type[BaseChatMessage]]:
+        return (TextMessage,)
+
+    async def _complete(
+        self, system_message: str, prompt: str, cancellation_token: CancellationToken
+    ) -> Tuple[str, Optional[RequestUsage]]:
+        result = await self._model_client.create(
+            [SystemMessage(content=system_message), UserMessage(content=prompt, source="user")],
+            cancellation_token=cancellation_token,
+        )
+        content = result.content if isinstance(result.content, str) else ""
+        return content, result.usage
+
+    async def on_messages(self, messages: Sequence[BaseChatMessage], cancellation_token: CancellationToken) -> Response:
+        task = "\n\n".join(message.content for message in messages if isinstance(getattr(message, "content", None), str))
+        usages: List[RequestUsage] = []
+
+        skeleton_system_message = f"{SKELETON_INSTRUCTIONS}\n\n{trip_details(self._travel_request, self._days)}"
+        if self._knowledge:
+            skeleton_system_message += f"\n\n{knowledge_details(self._knowledge)}"
+        output, usage = await self._complete(skeleton_system_message, task, cancellation_token)
+        usages.append(usage)
+        skeleton = extract_markdown_content(output)
+
+        semaphore = asyncio.Semaphore(self._max_parallel)
+        chunk_system_message = f"{CHUNK_INSTRUCTIONS}\n\n{trip_details(self._travel_request)}"
+
+        async def write_days(first: int, last: int) -> str:
+            async with semaphore:
+                prompt = f"SKELETON:\n{skeleton}\n\nWrite Day {first} through Day {last}."
+                block, block_usage = await self._complete(chunk_system_message, prompt, cancellation_token)
+                usages.append(block_usage)
+                return clean_day_block(block)
+
+        blocks = await asyncio.gather(
+            *(write_days(first, last) for first, last in split_day_ranges(self._days, self._days_per_chunk))
+        )
+        document = stitch_itinerary(skeleton, blocks, self._days)
+
+        usage = RequestUsage(
+            prompt_tokens=sum(usage.prompt_tokens for usage in usages if usage),
+            completion_tokens=sum(usage.completion_tokens for usage in usages if usage),
+        )
+        return Response(
+            chat_message=TextMessage(
+                content=f"{document}\n\n{ITINERARY_COMPLETION_MARKER}", source=self.name, models_usage=usage
+            )
+        )
+
+    async def on_reset(self, cancellation_token: CancellationToken) -> None:
+        pass
@@ -0,0 +1,215 @@
+"""
+Destination knowledge cache: facts about a destination learned from finished plans and reused across dates and budgets
+"""
+import json
+import re
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from ..config import Settings, get_settings
+from ..models.travel import TravelRequest
+from ..utils.image_links import ITINERARY_HEADING
+from ..utils.travel_document import TravelDocument
+from .plan_cache import DiskTier, normalize_text
+
+# Longest base locations / tips text kept per destination, so the itinerary prompt stays small
+MAX_FRAGMENT_CHARS = 1500
+MAX_LANDMARKS = 20
+
+_ROUTE = re.compile(r"\*\*Route:\*\*\s*([A-Z]{3})\s*→\s*([A-Z]{3})")
+
+# Tips about money, bookings, dining and getting around depend on the plan's budget, so they are not reused
+_BUDGET_DEPENDENT = re.compile(
+    r"[$€£¥]|\b(?:budget\w*|costs?|pric\w*|cheap\w*|expensive|luxur\w*|afford\w*|sav(?:e|es|ing|ings)|money|cash|"
+    r"spend\w*|splurge\w*|currency|book\w*|reserv\w*|restaurants?|dining|dine|meals?|food|eat\w*|hotels?|"
+    r"accommodation|pass(?:es)?|tickets?|taxis?|transport\w*|transit|fares?|upgrade\w*)\b",
+    re.IGNORECASE,
+)
+
+@dataclass
+class DestinationKnowledge:
+    """Reusable facts about a destination: nothing in them depends on dates or budget.
+
+    ``tips`` keeps only the cultural and practical lines of a plan's Travel Tips (see
+    ``budget_independent_tips``).
+    """
+    base_locations: str = ""
+    landmarks: List[str] = field(default_factory=list)
+    airport: Optional[str] = None
+    tips: str = ""
+
+    def __bool__(self) -> bool:
+        return bool(self.base_locations or self.landmarks or self.airport or self.tips)
+
+def _trim(text: Optional[str]) -> str:
+    text = (text or "").strip()
+    if len(text) <= MAX_FRAGMENT_CHARS:
+        return text
+    # Cut at a line boundary so no list item or link is left half-written
+    return text[:MAX_FRAGMENT_CHARS].rsplit("\n", 1)[0].rstrip()
+
+def budget_independent_tips(tips: str) -> str:
+    """The lines of a Travel Tips body that hold for any budget; sub-headings left empty are dropped."""
+    kept: List[str] = []
+    heading = None
+    for line in tips.splitlines():
+        stripped = line.strip()
+        if stripped.startswith("#"):
+            heading = line
+        elif stripped and not _BUDGET_DEPENDENT.search(stripped):
+            if heading is not None:
+                kept += (["", heading] if kept else [heading])
+                heading = None
+            kept.append(line)
+    return "\n".join(kept).strip()
+
+def extract_knowledge(document: str) -> DestinationKnowledge:
+    """Pull the destination-level fragments out of a finished travel document."""
+    indexed = TravelDocument(document)
+    landmarks = []
+    for text, url in indexed.links(ITINERARY_HEADING):
+        if "tbm=isch" in url and text not in landmarks:
+            landmarks.append(text)
+    route = _ROUTE.search(indexed.section("Flight Information") or "")
+    return DestinationKnowledge(
+        base_locations=_trim(indexed.section_body("Recommended Base Locations")),
+        landmarks=landmarks[:MAX_LANDMARKS],
+        airport=route.group(2) if route else None,
+        tips=_trim(budget_independent_tips(indexed.section_body("Travel Tips") or "")),
+    )
+
+def destination_key(travel_request: TravelRequest) -> str:
+    """Cache key shared by every plan for the same destination and priority focus."""
+    return json.dumps([
+        normalize_text(travel_request.destination_city),
+        normalize_text(travel_request.destination_country),
+        normalize_text(travel_request.priority),
+    ], ensure_ascii=False)
+
+class DestinationKnowledgeCache:
+    """Destination knowledge keyed on (city, country, priority), with TTL and LRU eviction.
+
+    Completed plans teach the cache; later plans for the same destination get the
+    knowledge in their itinerary prompt, whatever their dates and budget. Entries live
+    in memory with an optional SQLite tier (the shared store by default), which is
+    also what ``prewarm.py`` fills.
+    """
+
+    def __init__(self, settings: Optional[Settings] = None):
+        settings = settings or get_settings()
+        self.enabled = settings.destination_cache_enabled
+        self._ttl = settings.destination_cache_ttl
+        self._max_entries = settings.destination_cache_max_entries
+        self._memory: "OrderedDict[str, Tuple[float, DestinationKnowledge]]" = OrderedDict()
+        disk_path = settings.destination_cache_db_path or settings.shared_store_path
+        self._disk = (
+            DiskTier(disk_path, settings.destination_cache_max_disk_entries, table="destination_knowledge")
+            if disk_path else None
+        )
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "expirations": 0,
+        }
+        # Itinerary tokens by whether the plan had knowledge: [plans, trip days, prompt tokens, completion tokens]
+        self._itinerary_usage = {True: [0, 0, 0, 0], False: [0, 0, 0, 0]}
+
+    @property
+    def persistent(self) -> bool:
+        return self._disk is not None
+
+    def get(self, travel_request: TravelRequest) -> Optional[DestinationKnowledge]:
+        """Knowledge for a request's destination, promoting disk hits into memory."""
+        if not self.enabled:
+            return None
+        key = destination_key(travel_request)
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                self._memory.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[1]
+            del self._memory[key]
+            self.stats["expirations"] += 1
+
+        stored = self._disk.get(key, now) if self._disk is not None else None
+        if stored is None:
+            self.stats["misses"] += 1
+            return None
+        knowledge = DestinationKnowledge(**stored[1])
+        # Entries stored before tips were filtered may still hold budget-specific advice
+        knowledge.tips = budget_independent_tips(knowledge.tips)
+        self._remember(key, stored[0], knowledge)
+        self.stats["hits"] += 1
+        return knowledge
+
+    def contains(self, travel_request: TravelRequest) -> bool:
+        """Whether knowledge for a request's destination is stored; not counted as a lookup."""
+        if not self.enabled:
+            return False
+        key = destination_key(travel_request)
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry is not None and entry[0] > now:
+            return True
+        return self._disk is not None and self._disk.contains(key, now)
+
+    def learn(self, travel_request: TravelRequest, document: str) -> Optional[DestinationKnowledge]:
+        """Store what a finished document says about its destination; returns None if it said nothing."""
+        if not self.enabled:
+            return None
+        knowledge = extract_knowledge(document)
+        if not knowledge:
+            return None
+        key = destination_key(travel_request)
+        now = time.time()
+        expires_at = now + self._ttl
+        self._remember(key, expires_at, knowledge)
+        if self._disk is not None:
+            self._disk.put(key, expires_at, asdict(knowledge), now)
+        self.stats["stores"] += 1
+        return knowledge
+
+    def _remember(self, key: str, expires_at: float, knowledge: DestinationKnowledge) -> None:
+        self._memory[key] = (expires_at, knowledge)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._max_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def record_itinerary_usage(self, with_knowledge: bool, usage: Optional[Dict[str, int]], days: int) -> None:
+        """Count a plan's itinerary tokens, to compare plans with and without knowledge."""
+        if usage:
+            totals = self._itinerary_usage[with_knowledge]
+            totals[0] += 1
+            totals[1] += max(days, 1)
+            totals[2] += usage["prompt_tokens"]
+            totals[3] += usage["completion_tokens"]
+
+    def snapshot(self) -> Dict[str, object]:
+        """Counters, hit rate and itinerary tokens per trip day with and without knowledge."""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        itinerary = {}
+        for with_knowledge, (plans, days, prompt_tokens, completion_tokens) in self._itinerary_usage.items():
+            itinerary["with_knowledge" if with_knowledge else "without_knowledge"] = {
+                "plans": plans,
+                "prompt_tokens_per_day": round(prompt_tokens / days) if days else None,
+                "completion_tokens_per_day": round(completion_tokens / days) if days else None,
+            }
+        return {
+            **self.stats,
+            "evictions": self.stats["evictions"] + (self._disk.evictions if self._disk is not None else 0),
+            "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else None,
+            "entries": len(self._memory),
+            "persistent": self.persistent,
+            "itinerary_tokens": itinerary,
+        }
+
+    def close(self) -> None:
+        if self._disk is not None:
+            self._disk.close()
@@ -0,0 +1,265 @@
+"""
+Offline stand-in for the Azure OpenAI client: recorded or synthetic responses with latency and token-rate profiles
+"""
+import asyncio
+import json
+import random
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, AsyncGenerator, Dict, List, Mapping, Optional, Sequence, Union
+
+from autogen_core import CancellationToken
+from autogen_core.models import (
+    ChatCompletionClient,
+    CreateResult,
+    LLMMessage,
+    ModelCapabilities,
+    ModelInfo,
+    RequestUsage,
+    SystemMessage
+)
+from autogen_core.tools import Tool, ToolSchema
+
+from .local_agents import latest_document
+from .token_accounting import count_message_tokens, count_text_tokens
+
+@dataclass(frozen=True)
+class LatencyProfile:
+    """How long a fake completion takes: time to first token, then a steady token rate."""
+    first_token_seconds: float
+    tokens_per_second: float
+    jitter: float = 0.0  # relative +/- spread applied to both values
+
+LATENCY_PROFILES: Dict[str, LatencyProfile] = {
+    "instant": LatencyProfile(0.0, float("inf")),
+    "fast": LatencyProfile(0.2, 300.0, 0.1),
+    "azure": LatencyProfile(0.8, 60.0, 0.25),
+    "slow": LatencyProfile(2.5, 20.0, 0.25),
+}
+
+# Recognize the calling agent from its system message
+AGENT_SIGNATURES = (
+    ("SKELETON of a", "ItinerarySkeleton"),
+    ("writing part of a larger travel plan", "ItineraryChunk"),
+    ("revising one day of an existing travel plan", "DayEdit"),
+    ("travel tips specialist", "TipsAgent"),
+    ("lead itinerary planner", "ItineraryAgent"),
+    ("images specialist", "ImagesAgent"),
+    ("flight specialist", "FlightsAgent"),
+    ("accommodation specialist", "AccommodationAgent"),
+    ("quality control critic", "CriticAgent"),
+)
+
+COMPLETION_MARKERS = {
+    "ItineraryAgent": "ITINERARY_COMPLETE - Ready for ImagesAgent",
+    "ImagesAgent": "IMAGES_COMPLETE - Ready for FlightsAgent",
+    "FlightsAgent": "FLIGHTS_COMPLETE - Ready for AccommodationAgent",
+    "AccommodationAgent": "ACCOMMODATION_COMPLETE - Ready for CriticAgent",
+    "TipsAgent": "TIPS_COMPLETE - Ready for CriticAgent",
+}
+
+_ACTIVITIES = (
+    "Explore the historic old town and its central market",
+    "Visit the national museum and the surrounding gardens",
+    "Take a guided food tour through the night market",
+    "Hike to the viewpoint above the harbour for sunset",
+    "Join a cooking class focused on regional specialities",
+    "Wander the riverside promenade and local craft shops",
+)
+
+def identify_agent(messages: Sequence[LLMMessage]) -> str:
+    """Name the agent whose system message opens the request."""
+    system = next((message.content for message in messages if isinstance(message, SystemMessage)), "")
+    for signature, agent in AGENT_SIGNATURES:
+        if signature in system:
+            return agent
+    return "unknown"
+
+def synthesize_itinerary(prompt: str) -> str:
+    """Build a plausible itinerary document from the travel prompt (city, country and duration)."""
+    match = re.search(r"trip to (.+?), (.+?) for (\d+) days", prompt)
+    city, country, days = (match.group(1), match.group(2), int(match.group(3))) if match else ("Tokyo", "Japan", 3)
+    days = max(1, days)
+    entries = []
+    for day in range(1, days + 1):
+        morning, afternoon, evening = (_ACTIVITIES[(day + offset) % len(_ACTIVITIES)] for offset in range(3))
+        entries.append(
+            f"### Day {day}: Discovering {city}\n"
+            f"**Morning (9:00-12:00)**\n- {morning} in **{city} Central**\n\n"
+            f"**Afternoon (12:00-17:00)** \n- {afternoon} near **{city} Station**\n\n"
+            f"**Evening (17:00-21:00)**\n- {evening}"
+        )
+    return (
+        f"# 🌟 {city}, {country} Travel Plan\n\n"
+        f"## 📋 Trip Overview\n- **Duration:** {days} days\n\n"
+        f"## 🗺️ Recommended Base Locations\n1. **{city} Central** - Close to the main sights\n\n"
+        f"## 📅 Day-by-Day Itinerary\n\n" + "\n\n".join(entries) + "\n\n"
+        "<!-- FLIGHTS_PLACEHOLDER -->\n\n<!-- ACCOMMODATION_PLACEHOLDER -->\n\n"
+        "## 💡 Travel Tips & Practical Information\n- Buy a transit pass on arrival"
+    )
+
+class FakeChatCompletionClient(ChatCompletionClient):
+    """Replays recorded per-agent responses, or plays each agent's part synthetically.
+
+    ``recordings`` maps agent names to a response (or a list cycled through in order).
+    Agents without a recording echo the latest document with their completion marker;
+    the itinerary is synthesized from the prompt and the critic approves the document.
+    Completions take the time the latency profile implies for their length.
+    """
+
+    def __init__(
+        self,
+        recordings: Optional[Mapping[str, Union[str, List[str]]]] = None,
+        profile: Union[str, LatencyProfile] = "instant",
+        model: str = "gpt-4o",
+        seed: Optional[int] = None,
+    ):
+        self._recordings = {agent: [value] if isinstance(value, str) else list(value)
+                            for agent, value in (recordings or {}).items()}
+        self._turns: Dict[str, int] = {}
+        self._profile = LATENCY_PROFILES[profile] if isinstance(profile, str) else profile
+        self._model = model
+        self._random = random.Random(seed)
+        self._total_usage = RequestUsage(prompt_tokens=0, completion_tokens=0)
+        self._last_usage = RequestUsage(prompt_tokens=0, completion_tokens=0)
+
+    @classmethod
+    def from_file(cls, path: Optional[str], profile: str = "instant", **kwargs) -> "FakeChatCompletionClient":
+        """Load recordings from a JSON file mapping agent names to responses."""
+        recordings = json.loads(Path(path).read_text(encoding="utf-8")) if path else None
+        return cls(recordings, profile, **kwargs)
+
+    def _respond(self, agent: str, messages: Sequence[LLMMessage]) -> str:
+        recorded = self._recordings.get(agent)
+        if recorded:
+            turn = self._turns.get(agent, 0)
+            self._turns[agent] = turn + 1
+            return recorded[turn % len(recorded)]
+
+        prompt = next((message.content for message in messages
+                       if getattr(message, "source", None) == "user" and isinstance(message.content, str)), "")
+        if agent in ("ItineraryAgent", "ItinerarySkeleton"):
+            return f"```markdown\n{synthesize_itinerary(prompt)}\n```\n\n{COMPLETION_MARKERS['ItineraryAgent']}"
+        if agent == "ItineraryChunk":
+            match = re.search(r"Write Day (\d+) through Day (\d+)", prompt)
+            first, last = (int(match.group(1)), int(match.group(2))) if match else (1, 1)
+            return "\n\n".join(
+                f"### Day {day}: Discovering the city\n**Morning (9:00-12:00)**\n- {_ACTIVITIES[day % len(_ACTIVITIES)]}"
+                for day in range(first, last + 1)
+            )
+        if agent == "DayEdit":
+            match = re.search(r"CHANGE:\n(.+?)\n\nRewrite Day (\d+)", prompt, re.S)
+            change, day = (match.group(1).strip(), int(match.group(2))) if match else ("Free time", 1)
+            return (
+                f"### Day {day}: Revised day\n**Morning (9:00-12:00)**\n- {change} near **Riverside Park**\n\n"
+                f"**Afternoon (12:00-17:00)**\n- {_ACTIVITIES[day % len(_ACTIVITIES)]}"
+            )
+        if agent == "TipsAgent":
+            system = next((message.content for message in messages if isinstance(message, SystemMessage)), "")
+            budget = re.search(r"Budget Level: (.+)", system)
+            return (
+                "## 💡 Travel Tips & Practical Information\n"
+                f"- Plan daily spending for a {budget.group(1).strip() if budget else 'flexible'} budget\n"
+                f"- Buy a transit pass on arrival\n\n{COMPLETION_MARKERS['TipsAgent']}"
+            )
+        document = latest_document(messages)
+        if agent == "CriticAgent":
+            return f"DOCUMENT_READY\n\n{document}"
+        return f"{document}\n\n{COMPLETION_MARKERS.get(agent, '')}".strip()
+
+    async def _sleep(self, seconds: float, cancellation_token: Optional[CancellationToken]) -> None:
+        """Wait like a model call, aborting with CancelledError when the token fires (as the real client does)."""
+        delay = asyncio.ensure_future(asyncio.sleep(seconds))
+        if cancellation_token is not None:
+            cancellation_token.link_future(delay)
+        await delay
+
+    def _jittered(self, value: float) -> float:
+        if not self._profile.jitter or value in (0.0, float("inf")):
+            return value
+        return value * (1 + self._random.uniform(-self._profile.jitter, self._profile.jitter))
+
+    def _result(self, content: str, messages: Sequence[LLMMessage]) -> CreateResult:
+        usage = RequestUsage(
+            prompt_tokens=count_message_tokens(messages, self._model),
+            completion_tokens=count_text_tokens(content, self._model),
+        )
+        self._last_usage = usage
+        self._total_usage = RequestUsage(
+            prompt_tokens=self._total_usage.prompt_tokens + usage.prompt_tokens,
+            completion_tokens=self._total_usage.completion_tokens + usage.completion_tokens,
+        )
+        return CreateResult(finish_reason="stop", content=content, usage=usage, cached=False)
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: Optional[bool | type] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        content = self._respond(identify_agent(messages), messages)
+        tokens = count_text_tokens(content, self._model)
+        delay = self._jittered(self._profile.first_token_seconds) + tokens / self._jittered(self._profile.tokens_per_second)
+        if delay:
+            await self._sleep(delay, cancellation_token)
+        return self._result(content, messages)
+
+    async def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: Optional[bool | type] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        content = self._respond(identify_agent(messages), messages)
+        first_token = self._jittered(self._profile.first_token_seconds)
+        if first_token:
+            await self._sleep(first_token, cancellation_token)
+
+        # Chunks of roughly four tokens, keeping whitespace so the streamed text is exact
+        chunks = re.findall(r"\S*\s*", content)
+        rate = self._jittered(self._profile.tokens_per_second)
+        batch = []
+        for chunk in chunks:
+            if not chunk:
+                continue
+            batch.append(chunk)
+            if len(batch) == 4:
+                if rate != float("inf"):
+                    await self._sleep(4 / rate, cancellation_token)
+                yield "".join(batch)
+                batch = []
+        if batch:
+            yield "".join(batch)
+        yield self._result(content, messages)
+
+    async def close(self) -> None:
+        pass
+
+    def actual_usage(self) -> RequestUsage:
+        return self._last_usage
+
+    def total_usage(self) -> RequestUsage:
+        return self._total_usage
+
+    def count_tokens(self, messages: Sequence[LLMMessage], *, tools: Sequence[Tool | ToolSchema] = []) -> int:
+        return count_message_tokens(messages, self._model)
+
+    def remaining_tokens(self, messages: Sequence[LLMMessage], *, tools: Sequence[Tool | ToolSchema] = []) -> int:
+        return max(0, 128000 - self.count_tokens(messages))
+
+    @property
+    def capabilities(self) -> ModelCapabilities:  # type: ignore
+        return ModelCapabilities(vision=False, function_calling=False, json_output=False)  # type: ignore
+
+    @property
+    def model_info(self) -> ModelInfo:
+        return ModelInfo(
+            vision=False, function_calling=False, json_output=False, family="unknown", structured_output=False
+        )
@@ -0,0 +1,411 @@
+"""
+Background plan jobs with a persistent event log and resumable event streams
+"""
+import asyncio
+import json
+import os
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Deque, Dict, List, Optional, Tuple
+
+from ..config import Settings, get_settings
+from ..utils.document_delta import apply_patch, utf16_length
+from .shared_store import SQLiteWriter, connect
+from .stream_encoding import SequencedLine, dumps, loads, stream_line
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+JOB_INTERRUPTED = "interrupted"
+FINISHED_STATUSES = (JOB_COMPLETED, JOB_FAILED, JOB_INTERRUPTED)
+
+# Event types dropped from finished jobs' logs once they are compacted
+COMPACTABLE_TYPES = ("markdown_update", "delta", "queued")
+
+def _snapshot_event(sequence: int, document: str) -> str:
+    """The full-document event that stands in for a compacted delta job's patches.
+
+    A delta-mode final carries no content, so replays need the document from somewhere.
+    """
+    return stream_line("markdown_update", document, character_count=utf16_length(document), sequence=sequence)
+
+# Seconds between database reads when following a job run by another worker process
+FOLLOW_POLL_INTERVAL = 0.25
+
+@dataclass
+class JobInfo:
+    """Public state of a job."""
+    job_id: str
+    status: str
+    created_at: float
+    finished_at: Optional[float] = None
+    event_count: int = 0
+
+class _JobLog:
+    """Recent events of a job kept in memory, with a wakeup for followers.
+
+    Also keeps the job's request and the latest version of its document, so a finished
+    plan can be re-planned by job id.
+    """
+
+    def __init__(self, ring_size: int, request: Optional[dict] = None):
+        self.events: Deque[Tuple[int, str]] = deque(maxlen=ring_size)
+        self.next_sequence = 0
+        self.task: Optional[asyncio.Task] = None
+        self.request = request
+        self.document = ""
+        self.compacted = False
+        self._changed = asyncio.Event()
+
+    def track_document(self, message: dict) -> None:
+        """Follow the document through full updates and delta patches."""
+        message_type = message.get("type")
+        if message_type in ("markdown_update", "final") and message.get("content"):
+            self.document = message["content"]
+        elif message_type == "delta":
+            patch = (message.get("offset") or 0, message.get("length") or 0, message.get("content", ""))
+            self.document = apply_patch(self.document, patch)
+
+    def append(self, line: str) -> Tuple[int, str]:
+        sequence = self.next_sequence
+        self.next_sequence += 1
+        # Stamp the offset into the message so clients know where to resume from
+        message = loads(line)
+        message["sequence"] = sequence
+        stamped = dumps(message) + "\n"
+        self.events.append((sequence, stamped))
+        self.notify()
+        return sequence, stamped
+
+    def notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait(self) -> None:
+        await self._changed.wait()
+
+def _process_alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+class _JobDatabase:
+    """SQLite persistence for job records and event logs, shared by worker processes.
+
+    Each job row records the pid of the worker running it, so a restarting worker
+    only interrupts jobs whose process is gone. Writes go through a writer thread (events
+    queued together share a commit); reads use this connection on the caller's thread.
+    """
+
+    def __init__(self, path: str):
+        self._connection = connect(path)
+        self._connection.executescript(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " job_id TEXT PRIMARY KEY, status TEXT NOT NULL, created_at REAL NOT NULL,"
+            " finished_at REAL, event_count INTEGER NOT NULL DEFAULT 0, compacted INTEGER NOT NULL DEFAULT 0);"
+            "CREATE TABLE IF NOT EXISTS job_events ("
+            " job_id TEXT NOT NULL, sequence INTEGER NOT NULL, type TEXT NOT NULL, line TEXT NOT NULL,"
+            " PRIMARY KEY (job_id, sequence));"
+        )
+        columns = {row[1] for row in self._connection.execute("PRAGMA table_info(jobs)")}
+        for column, definition in (("owner_pid", "INTEGER"), ("request", "TEXT"), ("document", "TEXT")):
+            if column not in columns:
+                self._connection.execute(f"ALTER TABLE jobs ADD COLUMN {column} {definition}")
+        self._connection.commit()
+        self._writer = SQLiteWriter(path, name="jobs-writer")
+
+    async def flush(self) -> None:
+        """Wait until the writes submitted so far are visible to reads."""
+        await self._writer.flush()
+
+    def save_job(self, info: JobInfo, request: Optional[dict] = None, document: str = "") -> None:
+        row = (info.job_id, info.status, info.created_at, info.finished_at, info.event_count, os.getpid(),
+               json.dumps(request) if request is not None else None, document or None)
+        self._writer.write(lambda connection: connection.execute(
+            "INSERT OR REPLACE INTO jobs"
+            " (job_id, status, created_at, finished_at, event_count, owner_pid, request, document)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            row,
+        ))
+
+    def append_event(self, info: JobInfo, sequence: int, message_type: str, line: str) -> None:
+        """Queue an event and the job's progress; they are committed together, visible to the other workers."""
+        status, event_count = info.status, info.event_count
+
+        def write(connection) -> None:
+            connection.execute(
+                "INSERT OR REPLACE INTO job_events (job_id, sequence, type, line) VALUES (?, ?, ?, ?)",
+                (info.job_id, sequence, message_type, line),
+            )
+            connection.execute(
+                "UPDATE jobs SET status = ?, event_count = ? WHERE job_id = ?", (status, event_count, info.job_id)
+            )
+
+        self._writer.write(write)
+
+    def load_job(self, job_id: str) -> Optional[JobInfo]:
+        row = self._connection.execute(
+            "SELECT job_id, status, created_at, finished_at, event_count FROM jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        return JobInfo(*row) if row else None
+
+    def load_result(self, job_id: str) -> Optional[Tuple[Optional[dict], str]]:
+        row = self._connection.execute(
+            "SELECT request, document FROM jobs WHERE job_id = ? AND status = ?", (job_id, JOB_COMPLETED)
+        ).fetchone()
+        if row is None or not row[1]:
+            return None
+        return (json.loads(row[0]) if row[0] else None), row[1]
+
+    def events_after(self, job_id: str, after: int) -> List[Tuple[int, str]]:
+        return self._connection.execute(
+            "SELECT sequence, line FROM job_events WHERE job_id = ? AND sequence > ? ORDER BY sequence",
+            (job_id, after),
+        ).fetchall()
+
+    def mark_interrupted(self, now: float) -> None:
+        """Jobs left running by a process that has exited can never finish."""
+        rows = self._connection.execute(
+            "SELECT job_id, owner_pid FROM jobs WHERE status IN (?, ?)", (JOB_QUEUED, JOB_RUNNING)
+        ).fetchall()
+        orphaned = [
+            (JOB_INTERRUPTED, now, job_id) for job_id, pid in rows if pid == os.getpid() or not _process_alive(pid)
+        ]
+        self._connection.executemany("UPDATE jobs SET status = ?, finished_at = ? WHERE job_id = ?", orphaned)
+        self._connection.commit()
+
+    def status_counts(self) -> Dict[str, int]:
+        return dict(self._connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    def compact(self, expire_before: float, compact_before: float) -> None:
+        """Queue the deletion of expired jobs and the compaction of older finished jobs' logs."""
+        self._writer.write(lambda connection: self._compact(connection, expire_before, compact_before))
+
+    @staticmethod
+    def _compact(connection, expire_before: float, compact_before: float) -> Tuple[int, int]:
+        """Delete expired jobs and drop intermediate events of older finished jobs.
+
+        The last patch of a delta-mode job is replaced by a snapshot of its document
+        instead, so a replay still ends with the whole plan.
+        """
+        expired = [row[0] for row in connection.execute(
+            "SELECT job_id FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (expire_before,)
+        )]
+        for job_id in expired:
+            connection.execute("DELETE FROM job_events WHERE job_id = ?", (job_id,))
+            connection.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+
+        snapshots = connection.execute(
+            "SELECT jobs.job_id, MAX(job_events.sequence), jobs.document FROM jobs"
+            " JOIN job_events ON job_events.job_id = jobs.job_id AND job_events.type = 'delta'"
+            " WHERE jobs.finished_at IS NOT NULL AND jobs.finished_at < ? AND jobs.compacted = 0"
+            " AND jobs.document IS NOT NULL GROUP BY jobs.job_id",
+            (compact_before,),
+        ).fetchall()
+        connection.executemany(
+            "UPDATE job_events SET type = 'snapshot', line = ? WHERE job_id = ? AND sequence = ?",
+            [(_snapshot_event(sequence, document), job_id, sequence) for job_id, sequence, document in snapshots],
+        )
+
+        placeholders = ", ".join("?" for _ in COMPACTABLE_TYPES)
+        compacted = connection.execute(
+            f"DELETE FROM job_events WHERE type IN ({placeholders}) AND job_id IN ("
+            " SELECT job_id FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ? AND compacted = 0)",
+            (*COMPACTABLE_TYPES, compact_before),
+        ).rowcount
+        connection.execute(
+            "UPDATE jobs SET compacted = 1 WHERE finished_at IS NOT NULL AND finished_at < ?", (compact_before,)
+        )
+        return len(expired), max(compacted, 0)
+
+    def close(self) -> None:
+        self._writer.close()
+        self._connection.close()
+
+class JobStore:
+    """Runs plans detached from HTTP connections and keeps their event logs for replay.
+
+    Every event gets a sequence number; clients resume with ``events(job_id, after=N)``.
+    Recent events are served from an in-memory ring, older ones from SQLite when a
+    database path (or the shared store) is configured. With the database shared, any
+    worker can serve a job's status and events; jobs run by other workers are
+    followed by polling it.
+    """
+
+    def __init__(self, settings: Optional[Settings] = None):
+        settings = settings or get_settings()
+        self._ring_size = settings.jobs_ring_size
+        self._retention = settings.jobs_retention
+        self._compact_after = settings.jobs_compact_after
+        self._compaction_interval = settings.jobs_compaction_interval
+        database_path = settings.jobs_db_path or settings.shared_store_path
+        self._database = _JobDatabase(database_path) if database_path else None
+        self._jobs: Dict[str, JobInfo] = {}
+        self._logs: Dict[str, _JobLog] = {}
+        self._compactor: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        """Recover state left by a previous process and start periodic compaction."""
+        if self._database is not None:
+            self._database.mark_interrupted(time.time())
+        self._compactor = asyncio.create_task(self._compact_periodically())
+
+    def create(self, producer: Callable[[], AsyncIterator[str]], request: Optional[dict] = None) -> JobInfo:
+        """Start a job that drains ``producer`` in the background.
+
+        ``request`` (the plan's request fields) is kept with the finished document for ``result``.
+        """
+        info = JobInfo(job_id=uuid.uuid4().hex, status=JOB_QUEUED, created_at=time.time())
+        log = _JobLog(self._ring_size, request)
+        self._jobs[info.job_id] = info
+        self._logs[info.job_id] = log
+        self._save(info, log)
+        log.task = asyncio.create_task(self._run(info, log, producer))
+        return info
+
+    def get(self, job_id: str) -> Optional[JobInfo]:
+        """Return a job's state from memory or the database."""
+        info = self._jobs.get(job_id)
+        if info is None and self._database is not None:
+            info = self._database.load_job(job_id)
+        return info
+
+    def result(self, job_id: str) -> Optional[Tuple[Optional[dict], str]]:
+        """The request and final document of a completed job, or None."""
+        info = self._jobs.get(job_id)
+        log = self._logs.get(job_id)
+        if info is not None and log is not None:
+            if info.status == JOB_COMPLETED and log.document:
+                return log.request, log.document
+            return None
+        return self._database.load_result(job_id) if self._database is not None else None
+
+    async def _run(self, info: JobInfo, log: _JobLog, producer: Callable[[], AsyncIterator[str]]) -> None:
+        failed = False
+        completed = False
+        try:
+            async for line in producer():
+                message = loads(line)
+                message_type = message.get("type", "")
+                log.track_document(message)
+                if message_type != "queued":
+                    info.status = JOB_RUNNING
+                failed = failed or message_type == "error"
+                completed = completed or message_type == "final"
+                sequence, stamped = log.append(line)
+                info.event_count = log.next_sequence
+                if self._database is not None:
+                    self._database.append_event(info, sequence, message_type, stamped)
+        except asyncio.CancelledError:
+            info.status = JOB_INTERRUPTED
+            raise
+        except Exception:
+            failed = True
+        finally:
+            if info.status != JOB_INTERRUPTED:
+                info.status = JOB_COMPLETED if completed and not failed else JOB_FAILED
+            info.finished_at = time.time()
+            self._save(info, log)
+            log.notify()
+
+    def _save(self, info: JobInfo, log: _JobLog) -> None:
+        if self._database is not None:
+            self._database.save_job(info, log.request, log.document)
+
+    async def events(self, job_id: str, after: int = -1) -> AsyncIterator[str]:
+        """Yield a job's events with sequence greater than ``after``, following until it finishes."""
+        log = self._logs.get(job_id)
+        position = after
+
+        while True:
+            # Read the status first so events appended before the job finished are never missed
+            info = self.get(job_id)
+            finished = info is None or info.status in FINISHED_STATUSES or (log is None and self._database is None)
+
+            if log is not None and log.events and log.events[0][0] <= position + 1:
+                backlog = [event for event in log.events if event[0] > position]
+            elif self._database is not None:
+                if log is not None:
+                    # Our own job: make sure its queued events are written before reading them back
+                    await self._database.flush()
+                backlog = self._database.events_after(job_id, position)
+            else:
+                # Older events fell out of the ring and there is no database to replay from
+                backlog = [event for event in log.events if event[0] > position] if log else []
+
+            for sequence, line in backlog:
+                position = sequence
+                yield SequencedLine(line, sequence)
+
+            if finished:
+                return
+            if not backlog:
+                if log is not None:
+                    await log.wait()
+                else:
+                    # Run by another worker: nothing wakes us, so poll the shared log
+                    await asyncio.sleep(FOLLOW_POLL_INTERVAL)
+
+    def snapshot(self) -> dict:
+        """Return job counts by status (across all workers when the database is shared)."""
+        if self._database is not None:
+            counts = self._database.status_counts()
+        else:
+            counts: Dict[str, int] = {}
+            for info in self._jobs.values():
+                counts[info.status] = counts.get(info.status, 0) + 1
+        return {"jobs": sum(counts.values()), "by_status": counts, "persistent": self._database is not None}
+
+    async def _compact_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self._compaction_interval)
+            self.compact()
+
+    def compact(self) -> None:
+        """Forget jobs past the retention window and compact stale event logs."""
+        now = time.time()
+        for job_id, info in list(self._jobs.items()):
+            if info.finished_at is not None and info.finished_at < now - self._retention:
+                del self._jobs[job_id]
+                self._logs.pop(job_id, None)
+            elif info.finished_at is not None and info.finished_at < now - self._compact_after:
+                log = self._logs.get(job_id)
+                if log is not None and not log.compacted:
+                    log.compacted = True
+                    kept = []
+                    types = [(sequence, line, loads(line).get("type")) for sequence, line in log.events]
+                    last_delta = max((sequence for sequence, _, kind in types if kind == "delta"), default=None)
+                    for sequence, line, kind in types:
+                        if sequence == last_delta and log.document:
+                            kept.append((sequence, _snapshot_event(sequence, log.document)))
+                        elif kind not in COMPACTABLE_TYPES:
+                            kept.append((sequence, line))
+                    log.events = deque(kept, maxlen=log.events.maxlen)
+        if self._database is not None:
+            self._database.compact(now - self._retention, now - self._compact_after)
+
+    async def drain(self, timeout: float) -> None:
+        """Give running jobs up to ``timeout`` seconds to finish (on shutdown, before ``close``)."""
+        running = [log.task for log in self._logs.values() if log.task and not log.task.done()]
+        if running and timeout > 0:
+            await asyncio.wait(running, timeout=timeout)
+
+    async def close(self) -> None:
+        """Stop compaction and interrupt running jobs."""
+        if self._compactor is not None:
+            self._compactor.cancel()
+        running = [log.task for log in self._logs.values() if log.task and not log.task.done()]
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, *([self._compactor] if self._compactor else []), return_exceptions=True)
+        if self._database is not None:
+            self._database.close()
@@ -0,0 +1,154 @@
+"""
+Code-side pipeline stages that stand in for LLM agents inside the team
+"""
+import logging
+from typing import Callable, List, Sequence, Tuple
+
+from autogen_agentchat.agents import BaseChatAgent
+from autogen_agentchat.base import ChatAgent, Response
+from autogen_agentchat.messages import BaseChatMessage, TextMessage
+from autogen_core import CancellationToken
+
+from ..models.travel import TravelRequest
+from ..utils.booking_links import fill_accommodation_section, fill_flights_section
+from ..utils.content_processing import extract_markdown_content
+from ..utils.document_validation import validate_document
+from ..utils.image_links import add_itinerary_image_links
+from .metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+def latest_document(messages: Sequence[BaseChatMessage]) -> str:
+    """Return the most recent markdown document among the given messages."""
+    for message in reversed(messages):
+        content = getattr(message, "content", None)
+        if isinstance(content, str):
+            document = extract_markdown_content(content)
+            if document.startswith("#"):
+                return document
+    return ""
+
+def document_versions(messages: Sequence[BaseChatMessage]) -> List[str]:
+    """Return every markdown document among the given messages, oldest first."""
+    versions = []
+    for message in messages:
+        content = getattr(message, "content", None)
+        if isinstance(content, str):
+            document = extract_markdown_content(content)
+            if document.startswith("#"):
+                versions.append(document)
+    return versions
+
+class DocumentStageAgent(BaseChatAgent):
+    """Team participant that transforms the latest document in code instead of calling a model."""
+
+    def __init__(self, name: str, description: str, transform: Callable[[str], str], completion_marker: str):
+        super().__init__(name=name, description=description)
+        self._transform = transform
+        self._completion_marker = completion_marker
+        self._document = ""
+
+    @property
+    def produced_message_types(self) -> Sequence[type[BaseChatMessage]]:
+        return (TextMessage,)
+
+    async def on_messages(self, messages: Sequence[BaseChatMessage], cancellation_token: CancellationToken) -> Response:
+        self._document = latest_document(messages) or self._document
+        updated = self._transform(self._document) if self._document else self._document
+        self._document = updated
+        return Response(
+            chat_message=TextMessage(content=f"{updated}\n\n{self._completion_marker}", source=self.name)
+        )
+
+    async def on_reset(self, cancellation_token: CancellationToken) -> None:
+        self._document = ""
+
+def create_local_images_agent():
+    """Create the code-side images stage"""
+    return DocumentStageAgent(
+        name="ImagesAgent",
+        description="Adds Google image search links to notable locations in the Day-by-Day Itinerary section.",
+        transform=add_itinerary_image_links,
+        completion_marker="IMAGES_COMPLETE - Ready for FlightsAgent",
+    )
+
+def create_local_flights_agent(travel_request: TravelRequest, route: Tuple[str, str]):
+    """Create the code-side flights stage for an already resolved (origin, destination) route"""
+    return DocumentStageAgent(
+        name="FlightsAgent",
+        description="Adds flight booking links built from the user's travel details.",
+        transform=lambda document: fill_flights_section(document, travel_request, route),
+        completion_marker="FLIGHTS_COMPLETE - Ready for AccommodationAgent",
+    )
+
+def create_local_accommodation_agent(travel_request: TravelRequest):
+    """Create the code-side accommodation stage"""
+    return DocumentStageAgent(
+        name="AccommodationAgent",
+        description="Adds Airbnb links for each recommended base location.",
+        transform=lambda document: fill_accommodation_section(document, travel_request),
+        completion_marker="ACCOMMODATION_COMPLETE - Ready for CriticAgent",
+    )
+
+def create_local_replan_agent():
+    """Create the first stage of a re-plan, which hands on the prepared previous document"""
+    return DocumentStageAgent(
+        name="ReplanAgent",
+        description="Starts from the previous plan with the sections the change affects cleared.",
+        transform=lambda document: document,
+        completion_marker="REPLAN_READY - Ready for the affected stages",
+    )
+
+class ValidatingCriticAgent(BaseChatAgent):
+    """Critic stage that checks the finished document in code and only asks the LLM critic when that fails.
+
+    The latest document is validated against the earlier versions in the conversation
+    (placeholders, tracked links, days, truncation); dropped sections and links are
+    restored locally. A document that passes is approved with ``DOCUMENT_READY`` without
+    a model call. Otherwise the LLM critic reviews it, and links its output dropped are
+    restored as well.
+    """
+
+    def __init__(self, critic: ChatAgent, expected_days: int = 0):
+        super().__init__(name=critic.name, description=critic.description)
+        self._critic = critic
+        self._expected_days = expected_days
+        self._versions: List[str] = []
+
+    @property
+    def produced_message_types(self) -> Sequence[type[BaseChatMessage]]:
+        return (TextMessage,)
+
+    async def on_messages(self, messages: Sequence[BaseChatMessage], cancellation_token: CancellationToken) -> Response:
+        self._versions.extend(document_versions(messages))
+        metrics = get_metrics()
+        if self._versions:
+            report = validate_document(self._versions[-1], self._versions[:-1], self._expected_days)
+            if report.ok:
+                metrics.critic_reviews.labels("repaired" if report.repairs else "validated").inc()
+                if report.repairs:
+                    logger.info("Critic validation repaired the document: %s", "; ".join(report.repairs))
+                return Response(
+                    chat_message=TextMessage(content=f"DOCUMENT_READY\n\n{report.document}", source=self.name)
+                )
+            logger.info("Critic validation failed, asking the LLM critic: %s", "; ".join(report.issues))
+
+        metrics.critic_reviews.labels("llm").inc()
+        response = await self._critic.on_messages(messages, cancellation_token)
+        content = response.chat_message.content
+        reviewed = extract_markdown_content(content) if isinstance(content, str) else ""
+        if reviewed.startswith("#") and self._versions:
+            # The LLM critic re-emits the whole document; put back any links it lost
+            repaired = validate_document(reviewed, self._versions, self._expected_days).document
+            content = ("DOCUMENT_READY\n\n" if "DOCUMENT_READY" in content else "") + repaired
+            self._versions.append(repaired)
+        return Response(
+            chat_message=TextMessage(
+                content=content, source=self.name, models_usage=response.chat_message.models_usage
+            ),
+            inner_messages=response.inner_messages,
+        )
+
+    async def on_reset(self, cancellation_token: CancellationToken) -> None:
+        self._versions = []
+        await self._critic.on_reset(cancellation_token)
@@ -0,0 +1,312 @@
+"""
+Low-overhead pipeline instrumentation exposed in the Prometheus text format, with optional OpenTelemetry spans
+"""
+import time
+from bisect import bisect_left
+from functools import lru_cache
+from typing import TYPE_CHECKING, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+from ..config import get_settings
+
+if TYPE_CHECKING:
+    # Only for annotations; httpx is loaded with the model clients
+    import httpx
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+SIZE_BUCKETS = (500, 1000, 2000, 5000, 10000, 20000, 50000, 100000)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class _Metric:
+    """A metric family: children are created per label-value tuple and cached."""
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        if not self.label_names:
+            # Unlabelled metrics are exported (as zero) before their first observation
+            self.labels()
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.label_names):
+                raise ValueError(f"{self.name} expects labels {self.label_names}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+    def _render_child(self, values: Tuple[str, ...], child) -> List[str]:
+        return [f"{self.name}{_format_labels(self.label_names, values)} {_format_value(child.value)}"]
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.labels().dec(amount)
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = (), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help_text, label_names)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def _render_child(self, values: Tuple[str, ...], child: _HistogramValue) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else _format_value(bound)
+            bucket_labels = _format_labels(self.label_names, values, 'le="' + le + '"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+        labels = _format_labels(self.label_names, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+class PlanMetrics:
+    """All instruments of the planning pipeline."""
+
+    def __init__(self, tracing: bool = False):
+        self.plans_in_flight = Gauge("travel_plan_in_flight", "Plans currently being generated")
+        self.plans = Counter("travel_plan_plans_total", "Finished plans by outcome", ("outcome",))
+        self.plan_seconds = Histogram("travel_plan_duration_seconds", "Wall time of a plan generation")
+        self.setup_seconds = Histogram(
+            "travel_plan_setup_seconds", "Time to create the model client and agent team for a plan"
+        )
+        self.first_event_seconds = Histogram(
+            "travel_plan_time_to_first_event_seconds", "Time from plan start to the team's first event"
+        )
+        self.queue_wait_seconds = Histogram(
+            "travel_plan_queue_wait_seconds", "Time a plan waited for a scheduler slot"
+        )
+        self.stage_seconds = Histogram(
+            "travel_plan_agent_duration_seconds", "Duration of an agent's turn", ("agent",)
+        )
+        self.document_chars = Histogram(
+            "travel_plan_document_chars", "Document size produced by each agent", ("agent",), buckets=SIZE_BUCKETS
+        )
+        self.model_call_seconds = Histogram(
+            "travel_plan_model_call_seconds", "Latency of model calls by agent", ("agent",)
+        )
+        self.model_call_retries = Counter(
+            "travel_plan_model_call_retries_total", "Model calls retried after a timeout or transient error", ("agent",)
+        )
+        self.model_call_timeouts = Counter(
+            "travel_plan_model_call_timeouts_total", "Model call attempts that hit their stage timeout", ("agent",)
+        )
+        self.model_hedges = Counter(
+            "travel_plan_model_hedges_total", "Hedged model requests, fired and won by the hedge", ("agent", "outcome")
+        )
+        self.route_wait_seconds = Histogram(
+            "travel_plan_model_route_wait_seconds", "Time model calls waited for a slot on their deployment", ("route",)
+        )
+        self.route_in_flight = Gauge(
+            "travel_plan_model_route_in_flight", "Model calls in flight by deployment", ("route",)
+        )
+        self.agent_tokens = Counter(
+            "travel_plan_agent_tokens_total", "Tokens spent by each agent", ("agent", "kind")
+        )
+        self.cancelled_tokens_spent = Counter(
+            "travel_plan_cancelled_tokens_spent_total", "Tokens spent by plans before they were cancelled"
+        )
+        self.client_disconnects = Counter(
+            "travel_plan_client_disconnects_total", "Clients that disconnected before their stream ended", ("endpoint",)
+        )
+        self.replans = Counter(
+            "travel_plan_replans_total",
+            "Re-plan requests by how they were served: incremental, from scratch (full) or unchanged",
+            ("mode",)
+        )
+        self.batch_items = Counter(
+            "travel_plan_batch_items_total",
+            "Batch items by outcome: completed, degraded (finished early), failed or resumed from a checkpoint",
+            ("outcome",)
+        )
+        self.critic_reviews = Counter(
+            "travel_plan_critic_reviews_total",
+            "Critic turns by outcome: validated or repaired locally, or reviewed by the LLM critic",
+            ("outcome",)
+        )
+        self.model_responses = Counter(
+            "travel_plan_model_responses_total", "Model HTTP responses by status code", ("status",)
+        )
+        self.model_retries = Counter(
+            "travel_plan_model_retries_total", "Model responses that trigger a client retry (429 and 5xx)"
+        )
+        self.stream_first_byte_seconds = Histogram(
+            "travel_plan_stream_first_byte_seconds", "Time from request to the first streamed line", ("endpoint",)
+        )
+        self.stream_events = Counter(
+            "travel_plan_stream_events_total", "Lines streamed to clients", ("endpoint",)
+        )
+        self.stream_bytes = Counter(
+            "travel_plan_stream_bytes_total", "Bytes streamed to clients", ("endpoint",)
+        )
+        self.stream_wire_bytes = Counter(
+            "travel_plan_stream_wire_bytes_total",
+            "Bytes sent to clients after SSE framing and compression",
+            ("endpoint", "format", "encoding")
+        )
+        self.scheduler_active = Gauge("travel_plan_scheduler_active", "Plans holding a scheduler slot")
+        self.scheduler_queued = Gauge("travel_plan_scheduler_queued", "Plans waiting for a scheduler slot")
+        self.cache_events = Gauge("travel_plan_cache_events", "Plan cache counters", ("event",))
+        self.destination_cache_events = Gauge(
+            "travel_plan_destination_cache_events", "Destination knowledge cache counters", ("event",)
+        )
+
+        self._metrics: List[_Metric] = [value for value in vars(self).values() if isinstance(value, _Metric)]
+        self.tracer = _create_tracer() if tracing else None
+
+    async def observe_response(self, response: "httpx.Response") -> None:
+        """httpx response hook: count model responses and the ones the client will retry."""
+        status = response.status_code
+        self.model_responses.labels(str(status)).inc()
+        if status == 429 or status >= 500:
+            self.model_retries.inc()
+
+    async def instrument_stream(self, stream: AsyncIterator[str], endpoint: str) -> AsyncIterator[str]:
+        """Count the lines and bytes of a response stream and time its first line."""
+        started = time.perf_counter()
+        events = self.stream_events.labels(endpoint)
+        sent = self.stream_bytes.labels(endpoint)
+        first = True
+        async for line in stream:
+            if first:
+                first = False
+                self.stream_first_byte_seconds.labels(endpoint).observe(time.perf_counter() - started)
+            events.inc()
+            sent.inc(len(line.encode("utf-8")))
+            yield line
+
+    async def count_wire_bytes(
+        self, chunks: AsyncIterator[bytes], endpoint: str, stream_format: str, encoding: Optional[str]
+    ) -> AsyncIterator[bytes]:
+        """Count the bytes of an encoded response stream as they are sent."""
+        sent = self.stream_wire_bytes.labels(endpoint, stream_format, encoding or "identity")
+        async for chunk in chunks:
+            sent.inc(len(chunk))
+            yield chunk
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+def _create_tracer():
+    """Return an OpenTelemetry tracer, or None when the API is not installed."""
+    try:
+        from opentelemetry import trace
+    except ImportError:
+        return None
+    return trace.get_tracer("travel_planner")
+
+class PlanSpan:
+    """OpenTelemetry span for one plan with child spans per agent turn; a no-op without a tracer."""
+
+    def __init__(self, tracer, name: str, attributes: Optional[dict] = None):
+        self._tracer = tracer
+        self._span = tracer.start_span(name, attributes=attributes) if tracer is not None else None
+
+    def agent_turn(self, agent: str, started: float, attributes: Optional[dict] = None) -> None:
+        """Record a finished agent turn that began at ``started`` (a ``time.time()`` value)."""
+        if self._span is None:
+            return
+        from opentelemetry import trace
+        span = self._tracer.start_span(
+            f"agent {agent}",
+            context=trace.set_span_in_context(self._span),
+            start_time=int(started * 1e9),
+            attributes={"agent": agent, **(attributes or {})},
+        )
+        span.end()
+
+    def end(self, error: Optional[str] = None) -> None:
+        if self._span is None:
+            return
+        if error:
+            from opentelemetry.trace import Status, StatusCode
+            self._span.set_status(Status(StatusCode.ERROR, error))
+        self._span.end()
+
+@lru_cache(maxsize=1)
+def get_metrics() -> PlanMetrics:
+    """Return the process-wide pipeline metrics."""
+    return PlanMetrics(tracing=get_settings().tracing_enabled)
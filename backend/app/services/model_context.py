@@ -0,0 +1,58 @@
+"""
+Model context policy: each agent sees its task and the latest document, not the whole conversation
+"""
+from typing import List, Optional, Sequence
+
+from autogen_core.model_context import ChatCompletionContext
+from autogen_core.models import LLMMessage, UserMessage
+
+from ..utils.content_processing import extract_markdown_content, keep_sections
+
+def _document_text(message: LLMMessage) -> Optional[str]:
+    """Return the markdown document carried by a message, if it carries one."""
+    content = getattr(message, "content", None)
+    if not isinstance(content, str):
+        return None
+    document = extract_markdown_content(content)
+    return document if document.startswith("#") else None
+
+class LatestDocumentContext(ChatCompletionContext):
+    """Keeps only the original task and the most recent document version.
+
+    In a round-robin team every agent otherwise receives every earlier agent's full
+    document echo, so prompt tokens grow with the square of the number of stages.
+    With ``sections`` set, the document is further reduced to its title, those
+    sections and its placeholders.
+    """
+
+    def __init__(self, sections: Optional[Sequence[str]] = None, initial_messages: Optional[List[LLMMessage]] = None):
+        super().__init__(initial_messages)
+        self._sections = tuple(sections) if sections is not None else None
+
+    def _select(self, messages: List[LLMMessage]) -> List[LLMMessage]:
+        task = next(
+            (message for message in messages
+             if isinstance(message, UserMessage) and message.source == "user" and _document_text(message) is None),
+            None,
+        )
+        latest = next((message for message in reversed(messages) if _document_text(message) is not None), None)
+        if task is None and latest is None:
+            return messages
+        return [message for message in (task, latest) if message is not None]
+
+    async def add_message(self, message: LLMMessage) -> None:
+        """Add a message, dropping everything but the task and the latest document."""
+        self._messages = self._select(self._messages + [message])
+
+    async def get_messages(self) -> List[LLMMessage]:
+        selected: List[LLMMessage] = []
+        for message in self._select(self._messages):
+            document = _document_text(message)
+            if document is None:
+                selected.append(message)
+                continue
+            if self._sections is not None:
+                document = keep_sections(document, self._sections)
+            # The agent's own earlier document is replayed as input, not as its reply
+            selected.append(UserMessage(content=document, source=getattr(message, "source", "user")))
+        return selected
@@ -0,0 +1,466 @@
+"""
+Per-agent model routing across deployments: concurrency limits, timeouts, retries, hedging and per-agent stats
+"""
+import asyncio
+import json
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncGenerator, AsyncIterator, Awaitable, Callable, Deque, Dict, Mapping, Optional, Sequence, Union
+
+import httpx
+import openai
+
+from autogen_core import CancellationToken
+from autogen_core.models import (
+    ChatCompletionClient,
+    CreateResult,
+    LLMMessage,
+    ModelCapabilities,
+    ModelInfo,
+    RequestUsage
+)
+from autogen_core.tools import Tool, ToolSchema
+
+from ..config import Settings
+from .metrics import get_metrics
+
+DEFAULT_ROUTE = "default"
+
+# Latencies kept per agent for the percentile stats and hedging delay
+LATENCY_WINDOW = 512
+
+# HTTP statuses worth retrying besides 5xx: request timeout, conflict, rate limit
+_TRANSIENT_STATUSES = frozenset({408, 409, 429})
+
+@dataclass(frozen=True)
+class ModelDeployment:
+    """A model deployment agents can be routed to; unset fields fall back to the AZURE_* environment."""
+    name: str
+    deployment: Optional[str] = None
+    model: Optional[str] = None
+    endpoint: Optional[str] = None
+    api_version: Optional[str] = None
+    # Environment variable holding the deployment's API key
+    api_key_env: str = "AZURE_OPENAI_API_KEY"
+    # Model calls in flight on this deployment at once, across all plans (0 = unlimited)
+    max_concurrency: int = 0
+    # Latency profile when MODEL_CLIENT=fake, to try a routing before deploying it
+    fake_profile: Optional[str] = None
+
+def load_deployments(settings: Settings) -> Dict[str, ModelDeployment]:
+    """The configured deployments by name, always including "default"."""
+    deployments = {DEFAULT_ROUTE: ModelDeployment(DEFAULT_ROUTE)}
+    if settings.model_deployments:
+        try:
+            configured = json.loads(settings.model_deployments)
+            for name, options in configured.items():
+                deployments[name] = ModelDeployment(name, **options)
+        except (ValueError, TypeError, AttributeError) as error:
+            raise ValueError(f"MODEL_DEPLOYMENTS is not a valid deployment mapping: {error}") from error
+    return deployments
+
+def _agent_pairs(value: Optional[str], setting: str) -> Dict[str, str]:
+    """Parse "Agent=value" pairs separated by commas."""
+    pairs = {}
+    for pair in filter(None, (part.strip() for part in (value or "").split(","))):
+        agent, separator, target = (part.strip() for part in pair.partition("="))
+        if not separator or not agent or not target:
+            raise ValueError(f"{setting} entry '{pair}' must be Agent=value")
+        pairs[agent] = target
+    return pairs
+
+def load_routes(settings: Settings, deployments: Mapping[str, ModelDeployment], hedge: bool = False) -> Dict[str, str]:
+    """Agent name -> deployment name, from MODEL_ROUTES (or MODEL_HEDGE_ROUTES) "Agent=deployment" pairs."""
+    setting = "MODEL_HEDGE_ROUTES" if hedge else "MODEL_ROUTES"
+    routes = _agent_pairs(settings.model_hedge_routes if hedge else settings.model_routes, setting)
+    for agent, deployment in routes.items():
+        if deployment not in deployments:
+            raise ValueError(f"{setting} routes {agent} to unknown deployment '{deployment}'")
+    return routes
+
+@dataclass(frozen=True)
+class CallPolicy:
+    """How routed model calls deal with stragglers and transient failures."""
+    # Seconds per attempt (0 = none); for streamed calls, the longest wait for the next chunk
+    timeout: float = 0.0
+    stage_timeouts: Dict[str, float] = field(default_factory=dict)
+    retries: int = 2
+    retry_base_delay: float = 0.5
+    retry_max_delay: float = 8.0
+    # Calls an agent makes before its p95 latency is trusted as the hedging delay
+    hedge_min_samples: int = 20
+
+    def timeout_for(self, agent: str) -> float:
+        return self.stage_timeouts.get(agent, self.timeout)
+
+    def retry_delay(self, attempt: int) -> float:
+        """Full jitter: uniform between zero and the capped exponential backoff."""
+        return random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+
+def load_call_policy(settings: Settings) -> CallPolicy:
+    try:
+        stage_timeouts = {
+            agent: float(seconds)
+            for agent, seconds in _agent_pairs(settings.model_stage_timeouts, "MODEL_STAGE_TIMEOUTS").items()
+        }
+    except ValueError as error:
+        raise ValueError(f"MODEL_STAGE_TIMEOUTS must be Agent=seconds pairs: {error}") from error
+    return CallPolicy(
+        timeout=settings.model_call_timeout,
+        stage_timeouts=stage_timeouts,
+        retries=max(settings.model_retries, 0),
+        retry_base_delay=settings.model_retry_base_delay,
+        retry_max_delay=settings.model_retry_max_delay,
+        hedge_min_samples=max(settings.model_hedge_min_samples, 1),
+    )
+
+def is_transient(error: BaseException) -> bool:
+    """Whether a failed model call is worth retrying: timeouts, connection errors, 429 and 5xx."""
+    if isinstance(error, (asyncio.TimeoutError, httpx.TransportError, openai.APIConnectionError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in _TRANSIENT_STATUSES or error.status_code >= 500
+    return False
+
+class _AgentStats:
+    """Model calls, latency and tokens of one agent across plans."""
+
+    def __init__(self, route: str):
+        self.route = route
+        self.calls = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+    def record(self, seconds: float, usage: Optional[RequestUsage]) -> None:
+        self.calls += 1
+        self.seconds += seconds
+        self.latencies.append(seconds)
+        if usage is not None:
+            self.prompt_tokens += usage.prompt_tokens
+            self.completion_tokens += usage.completion_tokens
+
+    def p95(self, min_samples: int = 1) -> Optional[float]:
+        if len(self.latencies) < min_samples:
+            return None
+        latencies = sorted(self.latencies)
+        return latencies[int(len(latencies) * 0.95)]
+
+    def snapshot(self) -> Dict[str, object]:
+        latencies = sorted(self.latencies)
+        return {
+            "route": self.route,
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "timeouts": self.timeouts,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "mean_seconds": round(self.seconds / self.calls, 3) if self.calls else None,
+            "p50_seconds": round(latencies[len(latencies) // 2], 3) if latencies else None,
+            "p95_seconds": round(self.p95(), 3) if latencies else None,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "completion_tokens_per_second": (
+                round(self.completion_tokens / self.seconds, 1) if self.seconds else None
+            ),
+        }
+
+class _Route:
+    """A deployment's model client and the concurrency limit its calls share."""
+
+    def __init__(self, deployment: ModelDeployment, client: ChatCompletionClient):
+        self.deployment = deployment
+        self.client = client
+        self._semaphore = asyncio.Semaphore(deployment.max_concurrency) if deployment.max_concurrency > 0 else None
+        self.in_flight = 0
+        self.waiting = 0
+        self.calls = 0
+        self.wait_seconds = 0.0
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold one of the route's concurrent call slots."""
+        metrics = get_metrics()
+        name = self.deployment.name
+        started = time.perf_counter()
+        if self._semaphore is not None:
+            self.waiting += 1
+            try:
+                await self._semaphore.acquire()
+            finally:
+                self.waiting -= 1
+        waited = time.perf_counter() - started
+        self.calls += 1
+        self.wait_seconds += waited
+        metrics.route_wait_seconds.labels(name).observe(waited)
+        self.in_flight += 1
+        metrics.route_in_flight.labels(name).inc()
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            metrics.route_in_flight.labels(name).dec()
+            if self._semaphore is not None:
+                self._semaphore.release()
+
+    def snapshot(self) -> Dict[str, object]:
+        return {
+            "deployment": self.deployment.deployment,
+            "model": self.deployment.model,
+            "max_concurrency": self.deployment.max_concurrency or None,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "calls": self.calls,
+            "mean_wait_seconds": round(self.wait_seconds / self.calls, 3) if self.calls else None,
+        }
+
+async def _sleep(seconds: float, cancellation_token: Optional[CancellationToken]) -> None:
+    """Sleep that the team's cancellation token cuts short."""
+    sleeping = asyncio.ensure_future(asyncio.sleep(seconds))
+    if cancellation_token is not None:
+        cancellation_token.link_future(sleeping)
+    await sleeping
+
+class RoutedModelClient(ChatCompletionClient):
+    """An agent's view of its route.
+
+    Calls wait for a route slot and are timed per agent. Each attempt is bounded by the
+    agent's stage timeout, and timeouts and transient errors are retried with full
+    jitter. With a hedge route, a call still running after the agent's p95 latency
+    gets a duplicate request on the hedge deployment and the first success wins.
+    """
+
+    def __init__(self, agent: str, route: _Route, stats: _AgentStats, policy: Optional[CallPolicy] = None,
+                 hedge_route: Optional[_Route] = None):
+        self._agent = agent
+        self._route = route
+        self._inner = route.client
+        self._stats = stats
+        self._policy = policy or CallPolicy()
+        self._hedge_route = hedge_route
+
+    async def _attempt(self, route: _Route, call: Callable[[ChatCompletionClient], Awaitable[CreateResult]]) -> CreateResult:
+        """One bounded call on ``route``; the timeout starts once the call has a route slot."""
+        timeout = self._policy.timeout_for(self._agent)
+        async with route.slot():
+            try:
+                return await (asyncio.wait_for(call(route.client), timeout) if timeout > 0 else call(route.client))
+            except asyncio.TimeoutError:
+                self._stats.timeouts += 1
+                get_metrics().model_call_timeouts.labels(self._agent).inc()
+                raise
+
+    async def _hedged(self, call: Callable[[ChatCompletionClient], Awaitable[CreateResult]]) -> CreateResult:
+        """Run a call, duplicating it on the hedge route if it outlasts the agent's p95 latency."""
+        delay = self._stats.p95(self._policy.hedge_min_samples) if self._hedge_route is not None else None
+        if delay is None:
+            return await self._attempt(self._route, call)
+
+        primary = asyncio.ensure_future(self._attempt(self._route, call))
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return primary.result()
+            hedge = asyncio.ensure_future(self._attempt(self._hedge_route, call))
+            pending.add(hedge)
+            self._stats.hedges += 1
+            get_metrics().model_hedges.labels(self._agent, "fired").inc()
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self._stats.hedge_wins += 1
+                            get_metrics().model_hedges.labels(self._agent, "won").inc()
+                        return task.result()
+            # Both failed: report the original request's error
+            return primary.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: Optional[bool | type] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        def call(client: ChatCompletionClient) -> Awaitable[CreateResult]:
+            return client.create(
+                messages,
+                tools=tools,
+                json_output=json_output,
+                extra_create_args=extra_create_args,
+                cancellation_token=cancellation_token,
+            )
+
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                result = await self._hedged(call)
+            except Exception as error:
+                self._stats.errors += 1
+                if attempt >= self._policy.retries or not is_transient(error):
+                    raise
+                attempt += 1
+                self._stats.retries += 1
+                get_metrics().model_call_retries.labels(self._agent).inc()
+                await _sleep(self._policy.retry_delay(attempt), cancellation_token)
+                continue
+            self._stats.record(time.perf_counter() - started, result.usage)
+            return result
+
+    async def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: Optional[bool | type] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        # Streams are not hedged, and only retried until their first chunk has been passed on
+        timeout = self._policy.timeout_for(self._agent)
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            yielded = False
+            try:
+                async with self._route.slot():
+                    stream = self._inner.create_stream(
+                        messages,
+                        tools=tools,
+                        json_output=json_output,
+                        extra_create_args=extra_create_args,
+                        cancellation_token=cancellation_token,
+                    )
+                    try:
+                        while True:
+                            try:
+                                next_item = stream.__anext__()
+                                item = await (asyncio.wait_for(next_item, timeout) if timeout > 0 else next_item)
+                            except StopAsyncIteration:
+                                return
+                            except asyncio.TimeoutError:
+                                self._stats.timeouts += 1
+                                get_metrics().model_call_timeouts.labels(self._agent).inc()
+                                raise
+                            if isinstance(item, CreateResult):
+                                self._stats.record(time.perf_counter() - started, item.usage)
+                            yielded = True
+                            yield item
+                    finally:
+                        await stream.aclose()
+            except Exception as error:
+                self._stats.errors += 1
+                if yielded or attempt >= self._policy.retries or not is_transient(error):
+                    raise
+                attempt += 1
+                self._stats.retries += 1
+                get_metrics().model_call_retries.labels(self._agent).inc()
+                await _sleep(self._policy.retry_delay(attempt), cancellation_token)
+
+    async def close(self) -> None:
+        # The route's client is shared and closed by the router
+        pass
+
+    def actual_usage(self) -> RequestUsage:
+        return self._inner.actual_usage()
+
+    def total_usage(self) -> RequestUsage:
+        return self._inner.total_usage()
+
+    def count_tokens(self, messages: Sequence[LLMMessage], *, tools: Sequence[Tool | ToolSchema] = []) -> int:
+        return self._inner.count_tokens(messages, tools=tools)
+
+    def remaining_tokens(self, messages: Sequence[LLMMessage], *, tools: Sequence[Tool | ToolSchema] = []) -> int:
+        return self._inner.remaining_tokens(messages, tools=tools)
+
+    @property
+    def capabilities(self) -> ModelCapabilities:  # type: ignore
+        return self._inner.capabilities  # type: ignore
+
+    @property
+    def model_info(self) -> ModelInfo:
+        return self._inner.model_info
+
+class ModelRouter:
+    """Hands each agent the model client of the deployment it is routed to.
+
+    One client per deployment is shared by every plan; agents without a route use
+    the default deployment. Each agent's calls are counted, timed and attributed to
+    their route, so ``snapshot()`` shows which stages are worth moving to a faster
+    (or cheaper) deployment. ``policy`` bounds and retries every call, and agents in
+    ``hedge_routes`` hedge their stragglers on a second deployment.
+    """
+
+    def __init__(self, deployments: Mapping[str, ModelDeployment], clients: Mapping[str, ChatCompletionClient],
+                 routes: Optional[Mapping[str, str]] = None, policy: Optional[CallPolicy] = None,
+                 hedge_routes: Optional[Mapping[str, str]] = None):
+        self._routes = {name: _Route(deployments[name], client) for name, client in clients.items()}
+        self._agent_routes = dict(routes or {})
+        self._hedge_routes = dict(hedge_routes or {})
+        self._policy = policy or CallPolicy()
+        self._agents: Dict[str, RoutedModelClient] = {}
+        self._stats: Dict[str, _AgentStats] = {}
+
+    @property
+    def policy(self) -> CallPolicy:
+        return self._policy
+
+    @property
+    def deployments(self) -> Dict[str, ModelDeployment]:
+        return {name: route.deployment for name, route in self._routes.items()}
+
+    def route_of(self, agent: str) -> str:
+        return self._agent_routes.get(agent, DEFAULT_ROUTE)
+
+    def client(self, name: str = DEFAULT_ROUTE) -> ChatCompletionClient:
+        """A deployment's own client, without routing or limits."""
+        return self._routes[name].client
+
+    def client_for(self, agent: str) -> RoutedModelClient:
+        """The client ``agent`` should call, limited and measured on its route."""
+        routed = self._agents.get(agent)
+        if routed is None:
+            route = self.route_of(agent)
+            stats = self._stats.setdefault(agent, _AgentStats(route))
+            hedge = self._hedge_routes.get(agent)
+            routed = self._agents[agent] = RoutedModelClient(
+                agent, self._routes[route], stats, self._policy, self._routes[hedge] if hedge else None
+            )
+        return routed
+
+    def snapshot(self) -> Dict[str, object]:
+        """Per-route load and per-agent latency and token stats."""
+        return {
+            "routes": {name: route.snapshot() for name, route in self._routes.items()},
+            "agents": {agent: stats.snapshot() for agent, stats in self._stats.items()},
+        }
+
+    async def close(self) -> None:
+        """Close every deployment's client."""
+        for route in self._routes.values():
+            try:
+                await route.client.close()
+            except Exception:
+                pass
+
+def route_client(model_client, agent: str):
+    """The client ``agent`` should call: its route's when ``model_client`` is a router."""
+    return model_client.client_for(agent) if isinstance(model_client, ModelRouter) else model_client
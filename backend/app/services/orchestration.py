@@ -0,0 +1,235 @@
+"""
+DAG-based agent orchestration: independent stages run concurrently and their section edits are merged
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple, TypeVar
+
+from autogen_agentchat.base import ChatAgent, Response
+from autogen_agentchat.messages import (
+    BaseAgentEvent,
+    BaseChatMessage,
+    ModelClientStreamingChunkEvent,
+    TextMessage
+)
+from autogen_core import CancellationToken
+
+from ..utils.content_processing import extract_markdown_content, find_section_span, replace_section
+
+T = TypeVar("T")
+
+# Seconds an abandoned team gets to unwind after its cancellation token fires (less when a deadline is closer)
+TEARDOWN_TIMEOUT = 10.0
+
+# Teams unwinding in the background, referenced until they finish
+_teardowns: Set[asyncio.Future] = set()
+
+async def cancellable_stream(
+    stream: AsyncIterator[T], cancellation_token: CancellationToken, deadline: Optional[float] = None
+) -> AsyncIterator[T]:
+    """Iterate a team's event stream so that abandoning it cancels the team's token first.
+
+    Closing an autogen team's stream waits for its agents to go idle, so a consumer that
+    is cancelled (or closes the iterator) must fire the token before the stream unwinds:
+    the token aborts in-flight model calls and stops further turns. Each item is awaited
+    through a shield, so the consumer's cancellation lands here rather than inside the
+    team; the team then unwinds in the background. The consumer waits for it at most
+    ``TEARDOWN_TIMEOUT`` seconds, and never past ``deadline`` (``time.monotonic()``).
+    """
+    pending: Optional[asyncio.Future] = None
+    finished = False
+    try:
+        while True:
+            pending = asyncio.ensure_future(stream.__anext__())
+            try:
+                item = await asyncio.shield(pending)
+            except StopAsyncIteration:
+                finished = True
+                return
+            pending = None
+            yield item
+    finally:
+        if not finished:
+            cancellation_token.cancel()
+            teardown = pending if pending is not None else asyncio.ensure_future(stream.aclose())
+            _teardowns.add(teardown)
+            teardown.add_done_callback(_teardown_done)
+            # A consumer cancelled by a cancel scope cannot wait here; the team still unwinds
+            timeout = TEARDOWN_TIMEOUT
+            if deadline is not None:
+                timeout = min(timeout, max(deadline - time.monotonic(), 0.0))
+            await asyncio.wait({teardown}, timeout=timeout)
+
+class PlanDeadlineExceeded(Exception):
+    """Raised when a plan's deadline passes before its team has finished."""
+
+async def until_deadline(stream: AsyncIterator[T], deadline: float) -> AsyncIterator[T]:
+    """Iterate a (cancellable) team stream until ``deadline`` (``time.monotonic()``), then raise.
+
+    The pending item is cancelled when time runs out, which ``cancellable_stream``
+    turns into cancelling the team.
+    """
+    while True:
+        try:
+            item = await asyncio.wait_for(stream.__anext__(), max(deadline - time.monotonic(), 0.0))
+        except StopAsyncIteration:
+            return
+        except asyncio.TimeoutError:
+            raise PlanDeadlineExceeded("Plan deadline reached before the agents finished") from None
+        yield item
+
+def _teardown_done(teardown: asyncio.Future) -> None:
+    _teardowns.discard(teardown)
+    if not teardown.cancelled():
+        teardown.exception()  # Already reported to the consumer, or irrelevant once abandoned
+
+@dataclass
+class Stage:
+    """A pipeline stage: its agent, the stages it depends on and the document section it owns.
+
+    A stage without a ``section`` owns the whole document and its output replaces it.
+    A ``history`` stage is also sent the documents of all its upstream stages, oldest
+    first, ahead of the merged one (e.g. for validating the merge against them).
+    """
+    agent: ChatAgent
+    inputs: Tuple[str, ...] = ()
+    section: Optional[str] = None
+    placeholder: str = ""
+    history: bool = False
+
+    @property
+    def name(self) -> str:
+        return self.agent.name
+
+def apply_section_edit(base: str, stage: Stage, output: str) -> str:
+    """Copy the section a stage owns from its output document into ``base``."""
+    if stage.section is None:
+        return output
+    span = find_section_span(output, stage.section)
+    if span is None:
+        # The stage did not produce its section; keep the base document as it was
+        return base
+    section = output[span[0]:span[1]]
+    return replace_section(base, stage.section, section, stage.placeholder, before_heading="Travel Tips")
+
+def validate_stage_graph(stages: List[Stage]) -> None:
+    """Ensure stage names are unique, inputs exist and the graph is acyclic."""
+    names = [stage.name for stage in stages]
+    if len(set(names)) != len(names):
+        raise ValueError("Stage names must be unique")
+    known = set()
+    for stage in stages:
+        missing = [name for name in stage.inputs if name not in known]
+        if missing:
+            raise ValueError(f"Stage {stage.name} depends on unknown or later stages: {missing}")
+        known.add(stage.name)
+
+class StageGraphRunner:
+    """Runs a list of stages (in topological order) as a dependency graph."""
+
+    def __init__(self, stages: List[Stage]):
+        validate_stage_graph(stages)
+        self._stages = {stage.name: stage for stage in stages}
+        self._order = [stage.name for stage in stages]
+        # Wall time of each finished stage, for instrumentation
+        self.stage_durations: Dict[str, float] = {}
+
+    def _stage_input(self, stage: Stage, task: str, documents: Dict[str, str]) -> str:
+        """Merge the documents of a stage's inputs into the document it should work on."""
+        if not stage.inputs:
+            return task
+        merged = documents[stage.inputs[0]]
+        for name in stage.inputs[1:]:
+            merged = apply_section_edit(merged, self._stages[name], documents[name])
+        return merged
+
+    def _upstream(self, stage: Stage) -> List[str]:
+        """Names of all stages a stage depends on, directly or not, in graph order."""
+        pending, found = list(stage.inputs), set()
+        while pending:
+            name = pending.pop()
+            if name not in found:
+                found.add(name)
+                pending.extend(self._stages[name].inputs)
+        return [name for name in self._order if name in found]
+
+    def _stage_messages(self, stage: Stage, task: str, documents: Dict[str, str]) -> List[TextMessage]:
+        """The original task, followed by the merged input document for dependent stages."""
+        messages = [TextMessage(content=task, source="user")]
+        if stage.history:
+            messages.extend(TextMessage(content=documents[name], source=name) for name in self._upstream(stage))
+        if stage.inputs:
+            messages.append(TextMessage(content=self._stage_input(stage, task, documents), source=stage.inputs[0]))
+        return messages
+
+    async def _run_stage(
+        self, stage: Stage, messages: List[TextMessage], events: asyncio.Queue, cancellation_token: CancellationToken
+    ) -> None:
+        """Run one stage, forwarding its streaming events and finally its response message."""
+        started = time.perf_counter()
+        try:
+            async for item in stage.agent.on_messages_stream(messages, cancellation_token):
+                if isinstance(item, Response):
+                    self.stage_durations[stage.name] = time.perf_counter() - started
+                    await events.put((stage, item.chat_message, None))
+                elif isinstance(item, ModelClientStreamingChunkEvent):
+                    await events.put((None, item, None))
+        except Exception as error:
+            await events.put((stage, None, error))
+
+    async def run_stream(
+        self, task: str, cancellation_token: Optional[CancellationToken] = None
+    ) -> AsyncIterator[BaseAgentEvent | BaseChatMessage]:
+        """Run the graph, yielding token chunks and each stage's message as it finishes.
+
+        Messages from concurrent branches carry the document with every section edit
+        completed so far, so consumers always see a cumulative document.
+        """
+        cancellation_token = cancellation_token or CancellationToken()
+        events: asyncio.Queue = asyncio.Queue()
+        documents: Dict[str, str] = {}
+        current = ""
+        running: List[asyncio.Task] = []
+        started = set()
+
+        try:
+            while len(documents) < len(self._order):
+                for name in self._order:
+                    stage = self._stages[name]
+                    if name in started or any(dep not in documents for dep in stage.inputs):
+                        continue
+                    started.add(name)
+                    messages = self._stage_messages(stage, task, documents)
+                    running.append(asyncio.create_task(
+                        self._run_stage(stage, messages, events, cancellation_token)
+                    ))
+
+                # The token stops the graph as well as the stages' model calls
+                next_event = asyncio.ensure_future(events.get())
+                cancellation_token.link_future(next_event)
+                stage, message, error = await next_event
+                if error is not None:
+                    raise error
+                if stage is None:
+                    # Token chunk from a streaming model client
+                    yield message
+                    continue
+
+                output = extract_markdown_content(message.content)
+                documents[stage.name] = apply_section_edit(
+                    self._stage_input(stage, task, documents), stage, output
+                )
+
+                if stage.section is None:
+                    current = documents[stage.name]
+                    yield message
+                else:
+                    current = apply_section_edit(current, stage, output)
+                    yield TextMessage(content=current, source=stage.name)
+        finally:
+            pending = [task_running for task_running in running if not task_running.done()]
+            for task_running in pending:
+                task_running.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
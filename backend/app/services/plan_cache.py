@@ -0,0 +1,360 @@
+"""
+Plan result cache with request normalization, TTL/LRU eviction and single-flight dedup
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
+
+from ..config import Settings, get_settings
+from ..models.travel import TravelRequest
+from .shared_store import SQLiteWriter, connect
+from .stream_encoding import stream_line
+
+logger = logging.getLogger(__name__)
+
+# Message types that describe this particular delivery rather than the plan itself
+TRANSIENT_MESSAGE_TYPES = frozenset({"queued", "usage"})
+
+def normalize_text(value: Optional[str]) -> str:
+    """Collapse whitespace and case so cosmetic differences share a cache entry."""
+    return re.sub(r"\s+", " ", value or "").strip().casefold()
+
+def canonical_request_key(travel_request: TravelRequest, variant: str = "") -> str:
+    """Return a stable cache key for a travel request and stream variant."""
+    canonical = {
+        "variant": variant,
+        "destination_city": normalize_text(travel_request.destination_city),
+        "destination_country": normalize_text(travel_request.destination_country),
+        "depart_date": travel_request.depart_date.strip(),
+        "return_date": travel_request.return_date.strip(),
+        "priority": normalize_text(travel_request.priority),
+        "budget_level": normalize_text(travel_request.budget_level),
+        "departure_airport": normalize_text(travel_request.departure_airport),
+        "destination_airport": normalize_text(travel_request.destination_airport),
+        "additional_preferences": normalize_text(travel_request.additional_preferences),
+    }
+    encoded = json.dumps(canonical, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+def cacheable_lines(lines: List[str]) -> Optional[List[str]]:
+    """Return the lines worth replaying, or None if the stream did not finish cleanly.
+
+    A stream is cacheable when it produced a completed final document and no error; a
+    plan finished early (deadline, token cap) is not replayed to later requests.
+    Transient scheduling messages are dropped so replays start straight away.
+    """
+    kept = []
+    has_final = False
+    for line in lines:
+        message = json.loads(line)
+        message_type = message.get("type")
+        if message_type == "error":
+            return None
+        if message_type == "final":
+            if message.get("outcome") != "completed":
+                return None
+            has_final = True
+        if message_type not in TRANSIENT_MESSAGE_TYPES:
+            kept.append(line)
+    return kept if has_final else None
+
+class _Flight:
+    """An in-progress generation that any number of identical requests can follow."""
+
+    def __init__(self):
+        self.lines: List[str] = []
+        self.done = False
+        self.task: Optional[asyncio.Task] = None
+        self.followers = 0
+        # Pending cancellation while nobody follows the generation
+        self.abandon: Optional[asyncio.TimerHandle] = None
+        self._changed = asyncio.Event()
+
+    def publish(self, line: str) -> None:
+        self.lines.append(line)
+        self._notify()
+
+    def finish(self) -> None:
+        self.done = True
+        self._notify()
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def follow(self) -> AsyncIterator[str]:
+        """Replay everything produced so far, then follow new lines until done."""
+        index = 0
+        while True:
+            while index < len(self.lines):
+                yield self.lines[index]
+                index += 1
+            if self.done:
+                return
+            await self._changed.wait()
+
+class DiskTier:
+    """SQLite-backed second cache tier, shared by the worker processes that open the same file.
+
+    Values are stored as JSON in ``table``, so other caches can keep their own tier in the same file.
+    Lookups read on the caller's thread; access times, expiry and stores are queued to a writer
+    thread, so a request never waits on another worker's write lock.
+    """
+
+    def __init__(self, path: str, max_entries: int, table: str = "plan_cache"):
+        self._max_entries = max_entries
+        self._table = table
+        self._connection = connect(path)
+        self._connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            " key TEXT PRIMARY KEY, expires_at REAL NOT NULL, last_access REAL NOT NULL, events TEXT NOT NULL)"
+        )
+        self._connection.commit()
+        self._writer = SQLiteWriter(path, name=f"{table}-writer")
+        # Entries evicted by stores, counted on the writer thread
+        self.evictions = 0
+
+    def get(self, key: str, now: float) -> Optional[Tuple[float, Any]]:
+        row = self._connection.execute(
+            f"SELECT expires_at, events FROM {self._table} WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[0] <= now:
+            self._writer.write(lambda connection: connection.execute(
+                f"DELETE FROM {self._table} WHERE key = ? AND expires_at <= ?", (key, now)
+            ))
+            return None
+        self._writer.write(lambda connection: connection.execute(
+            f"UPDATE {self._table} SET last_access = ? WHERE key = ?", (now, key)
+        ))
+        return row[0], json.loads(row[1])
+
+    def contains(self, key: str, now: float) -> bool:
+        """Whether an unexpired entry is stored, without touching it."""
+        return self._connection.execute(
+            f"SELECT 1 FROM {self._table} WHERE key = ? AND expires_at > ?", (key, now)
+        ).fetchone() is not None
+
+    def put(self, key: str, expires_at: float, value: Any, now: float) -> None:
+        """Queue an entry for storage, evicting the least recently used ones beyond the size cap."""
+
+        def write(connection) -> None:
+            connection.execute(
+                f"INSERT OR REPLACE INTO {self._table} (key, expires_at, last_access, events) VALUES (?, ?, ?, ?)",
+                (key, expires_at, now, json.dumps(value)),
+            )
+            connection.execute(f"DELETE FROM {self._table} WHERE expires_at <= ?", (now,))
+            evicted = connection.execute(
+                f"DELETE FROM {self._table} WHERE key IN ("
+                f" SELECT key FROM {self._table} ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self._max_entries,),
+            ).rowcount
+            self.evictions += max(evicted, 0)
+
+        self._writer.write(write)
+
+    async def flush(self) -> None:
+        """Wait until the writes queued so far are visible to lookups."""
+        await self._writer.flush()
+
+    def close(self) -> None:
+        self._writer.close()
+        self._connection.close()
+
+class PlanCache:
+    """Caches completed plan event streams keyed on the canonicalized request.
+
+    Entries live in an in-memory LRU with an optional SQLite tier behind it (the shared
+    store by default, so every worker sees every stored plan). Concurrent identical
+    requests share a single in-progress generation within a worker. A generation whose
+    last follower went away is cancelled unless a follower joins within the reconnect
+    grace period.
+    """
+
+    def __init__(self, settings: Optional[Settings] = None):
+        settings = settings or get_settings()
+        self.enabled = settings.plan_cache_enabled
+        self._ttl = settings.plan_cache_ttl
+        self._max_entries = settings.plan_cache_max_entries
+        self._reconnect_grace = settings.plan_reconnect_grace
+        self._memory: "OrderedDict[str, Tuple[float, List[str]]]" = OrderedDict()
+        disk_path = settings.plan_cache_db_path or settings.shared_store_path
+        self._disk = DiskTier(disk_path, settings.plan_cache_max_disk_entries) if disk_path else None
+        self._inflight: Dict[str, _Flight] = {}
+        # Keys ``has`` found on disk and promoted into memory, still to be counted as disk hits
+        self._promoted: Set[str] = set()
+        self.stats = {
+            "hits": 0,
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "joined": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "stores": 0,
+            "reconnected": 0,
+            "abandoned": 0,
+        }
+
+    def get(self, key: str) -> Optional[List[str]]:
+        """Return the cached event lines for a key, promoting disk hits into memory."""
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                self._memory.move_to_end(key)
+                if key in self._promoted:
+                    self._promoted.discard(key)
+                    self.stats["disk_hits"] += 1
+                else:
+                    self.stats["memory_hits"] += 1
+                return entry[1]
+            del self._memory[key]
+            self._promoted.discard(key)
+            self.stats["expirations"] += 1
+
+        if self._disk is not None:
+            stored = self._disk.get(key, now)
+            if stored is not None:
+                self._remember(key, *stored)
+                self.stats["disk_hits"] += 1
+                return stored[1]
+        return None
+
+    def put(self, key: str, lines: List[str]) -> None:
+        """Store a completed event stream in every tier."""
+        now = time.time()
+        expires_at = now + self._ttl
+        self._remember(key, expires_at, lines)
+        if self._disk is not None:
+            self._disk.put(key, expires_at, lines, now)
+        self.stats["stores"] += 1
+
+    def _remember(self, key: str, expires_at: float, lines: List[str]) -> None:
+        self._memory[key] = (expires_at, lines)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._max_entries:
+            evicted, _ = self._memory.popitem(last=False)
+            self._promoted.discard(evicted)
+            self.stats["evictions"] += 1
+
+    def has(self, travel_request: TravelRequest, variant: str = "") -> bool:
+        """Whether a request would be served without starting a new generation.
+
+        A disk hit is promoted into memory (uncounted), so the ``stream`` that follows
+        serves it without reading the disk again.
+        """
+        if not self.enabled:
+            return False
+        key = canonical_request_key(travel_request, variant)
+        if key in self._inflight:
+            return True
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry is not None and entry[0] > now:
+            return True
+        stored = self._disk.get(key, now) if self._disk is not None else None
+        if stored is None:
+            return False
+        self._remember(key, *stored)
+        self._promoted.add(key)
+        return True
+
+    async def stream(
+        self, travel_request: TravelRequest, producer: Callable[[], AsyncIterator[str]], variant: str = ""
+    ) -> AsyncIterator[str]:
+        """Serve a plan from cache, join an identical in-progress run, or start a new one.
+
+        ``variant`` separates streams of the same plan that are encoded differently.
+        """
+        if not self.enabled:
+            async for line in producer():
+                yield line
+            return
+
+        key = canonical_request_key(travel_request, variant)
+        cached = self.get(key)
+        if cached is not None:
+            self.stats["hits"] += 1
+            for line in cached:
+                yield line
+            return
+
+        flight = self._inflight.get(key)
+        if flight is None:
+            self.stats["misses"] += 1
+            flight = _Flight()
+            self._inflight[key] = flight
+            # Runs detached so followers still get the plan if the first client goes away
+            flight.task = asyncio.create_task(self._generate(key, flight, producer))
+        else:
+            self.stats["joined"] += 1
+
+        async for line in self._follow(flight):
+            yield line
+
+    async def _follow(self, flight: _Flight) -> AsyncIterator[str]:
+        """Follow a generation, scheduling its cancellation when the last follower leaves."""
+        flight.followers += 1
+        if flight.abandon is not None:
+            flight.abandon.cancel()
+            flight.abandon = None
+            self.stats["reconnected"] += 1
+        try:
+            async for line in flight.follow():
+                yield line
+        finally:
+            flight.followers -= 1
+            if flight.followers == 0 and not flight.done:
+                flight.abandon = asyncio.get_running_loop().call_later(
+                    max(self._reconnect_grace, 0.0), self._abandon, flight
+                )
+
+    def _abandon(self, flight: _Flight) -> None:
+        flight.abandon = None
+        if flight.followers == 0 and not flight.done and flight.task is not None:
+            self.stats["abandoned"] += 1
+            flight.task.cancel()
+
+    async def _generate(self, key: str, flight: _Flight, producer: Callable[[], AsyncIterator[str]]) -> None:
+        try:
+            async for line in producer():
+                flight.publish(line)
+            lines = cacheable_lines(flight.lines)
+            if lines is not None:
+                self.put(key, lines)
+        except Exception as error:
+            # Nobody awaits the task: log the failure and end every follower's stream with it
+            logger.exception("Plan generation failed")
+            flight.publish(stream_line("error", f"❌ Error generating travel plan: {error}"))
+        finally:
+            self._inflight.pop(key, None)
+            flight.finish()
+
+    def snapshot(self) -> Dict[str, int]:
+        """Return cache counters and current sizes."""
+        return {
+            **self.stats,
+            "evictions": self.stats["evictions"] + (self._disk.evictions if self._disk is not None else 0),
+            "entries": len(self._memory),
+            "in_flight": len(self._inflight),
+        }
+
+    async def close(self) -> None:
+        """Cancel in-progress generations and close the disk tier."""
+        pending = [flight.task for flight in self._inflight.values() if flight.task]
+        for flight in self._inflight.values():
+            if flight.abandon is not None:
+                flight.abandon.cancel()
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        if self._disk is not None:
+            self._disk.close()
@@ -0,0 +1,300 @@
+"""
+Incremental re-planning: diff a changed request against the previous one and redo only the sections it affects
+"""
+import asyncio
+import logging
+import re
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from autogen_agentchat.agents import BaseChatAgent
+from autogen_agentchat.base import Response
+from autogen_agentchat.messages import BaseChatMessage, TextMessage
+from autogen_core import CancellationToken
+from autogen_core.models import RequestUsage, SystemMessage, UserMessage
+
+from ..models.travel import TravelRequest
+from ..utils.booking_links import ACCOMMODATION_PLACEHOLDER, FLIGHTS_PLACEHOLDER, resolve_airports
+from ..utils.content_processing import extract_markdown_content, find_section_span
+from ..utils.image_links import ITINERARY_HEADING, link_day_entries
+from ..utils.prompt_generation import trip_duration_days
+from ..utils.travel_document import TravelDocument
+from .agent_templates import DAY_EDIT_INSTRUCTIONS, trip_details
+from .chunked_itinerary import clean_day_block, skeleton_day_headings
+from .local_agents import latest_document
+from .plan_cache import normalize_text
+
+logger = logging.getLogger(__name__)
+
+DAYS_COMPLETION_MARKER = "DAYS_COMPLETE - Ready for CriticAgent"
+
+# Changes that reshape the whole itinerary, so the plan is made again from scratch
+_FULL_REPLAN_FIELDS = (
+    ("destination_city", "destination"),
+    ("destination_country", "destination"),
+    ("priority", "priority focus"),
+    ("additional_preferences", "preferences"),
+)
+
+_DAY_HEADING = re.compile(r"^###\s*Day\s+(\d+)\b.*$", re.M)
+
+class ReplanError(ValueError):
+    """Raised when a re-plan cannot be applied to its previous plan, e.g. an edit of a day it does not have."""
+
+@dataclass(frozen=True)
+class ReplanScope:
+    """What a changed request invalidates in a previous plan.
+
+    ``full_reason`` is set when the change reshapes the whole itinerary (another
+    destination, focus or trip length) and the plan has to be made from scratch.
+    """
+    changed: Tuple[str, ...] = ()
+    overview: bool = False
+    flights: bool = False
+    accommodation: bool = False
+    tips: bool = False
+    days: Tuple[int, ...] = ()
+    full_reason: Optional[str] = None
+
+    @property
+    def full(self) -> bool:
+        return self.full_reason is not None
+
+    @property
+    def unchanged(self) -> bool:
+        return not self.full and not self.sections
+
+    @property
+    def sections(self) -> List[str]:
+        """The parts of the document that are redone, in document order."""
+        sections = ["Trip Overview"] if self.overview else []
+        sections += [f"Day {day}" for day in self.days]
+        if self.flights:
+            sections.append("Flight Information")
+        if self.accommodation:
+            sections.append("Accommodation Options")
+        if self.tips:
+            sections.append("Travel Tips")
+        return sections
+
+def diff_requests(
+    previous: TravelRequest, updated: TravelRequest, day_edits: Optional[Dict[int, str]] = None
+) -> ReplanScope:
+    """Work out which sections of ``previous``'s plan a change to ``updated`` (and day edits) invalidates.
+
+    Dates only move the booking links and the overview; a new budget also changes the
+    accommodation and tips; airports only change the flights. Day edits redo those days.
+    """
+    for name, label in _FULL_REPLAN_FIELDS:
+        if normalize_text(getattr(previous, name)) != normalize_text(getattr(updated, name)):
+            return ReplanScope(changed=(name,), full_reason=f"the {label} changed")
+    if trip_duration_days(previous) != trip_duration_days(updated):
+        return ReplanScope(
+            changed=("depart_date", "return_date"),
+            full_reason=f"the trip length changed from {trip_duration_days(previous)} "
+                        f"to {trip_duration_days(updated)} days",
+        )
+
+    changed = []
+    dates = (previous.depart_date, previous.return_date) != (updated.depart_date, updated.return_date)
+    if dates:
+        changed += ["depart_date", "return_date"]
+    budget = normalize_text(previous.budget_level) != normalize_text(updated.budget_level)
+    if budget:
+        changed.append("budget_level")
+    airports = False
+    if (normalize_text(previous.departure_airport), normalize_text(previous.destination_airport)) != (
+        normalize_text(updated.departure_airport), normalize_text(updated.destination_airport)
+    ):
+        # Only a different airport counts, not another way of writing the same one ("LHR" vs "Heathrow")
+        before, after = resolve_airports(previous), resolve_airports(updated)
+        airports = (before.departure_airport, before.destination_airport) != (
+            after.departure_airport, after.destination_airport
+        )
+        if airports:
+            changed += ["departure_airport", "destination_airport"]
+
+    return ReplanScope(
+        changed=tuple(changed),
+        overview=dates or budget,
+        flights=dates or airports,
+        accommodation=dates or budget,
+        tips=budget,
+        days=tuple(sorted(day_edits or ())),
+    )
+
+def day_spans(section: str) -> Dict[int, Tuple[int, int]]:
+    """(start, end) of each ``### Day N`` entry in an itinerary section, trailing blank lines included."""
+    matches = list(_DAY_HEADING.finditer(section))
+    spans = {}
+    for index, match in enumerate(matches):
+        end = matches[index + 1].start() if index + 1 < len(matches) else len(section)
+        spans.setdefault(int(match.group(1)), (match.start(), end))
+    return spans
+
+def replace_day(document: str, day: int, entry: str) -> str:
+    """Replace one day's entry in the itinerary, keeping the blank lines around it."""
+    span = find_section_span(document, ITINERARY_HEADING)
+    if span is None:
+        return document
+    section = document[span[0]:span[1]]
+    spans = day_spans(section)
+    if day not in spans:
+        return document
+    start, end = spans[day]
+    current = section[start:end]
+    section = section[:start] + entry.strip() + current[len(current.rstrip()):] + section[end:]
+    return document[:span[0]] + section + document[span[1]:]
+
+def _day_entries(document: str) -> Dict[int, str]:
+    section = TravelDocument(document).section(ITINERARY_HEADING) or ""
+    return {day: section[start:end].strip() for day, (start, end) in day_spans(section).items()}
+
+def _update_overview(document: str, travel_request: TravelRequest, scope: ReplanScope) -> str:
+    """Rewrite the Trip Overview lines of the changed fields."""
+    indexed = TravelDocument(document)
+    section = indexed.section("Trip Overview")
+    if section is None:
+        return document
+    values = {}
+    if "depart_date" in scope.changed:
+        values["Dates"] = f"{travel_request.depart_date} to {travel_request.return_date}"
+    if "budget_level" in scope.changed:
+        values["Budget"] = travel_request.budget_level.capitalize()
+    for label, value in values.items():
+        section = re.sub(
+            rf"^(\s*[-*]\s*\*\*{label}:\*\*\s*).*$", lambda match: match.group(1) + value, section, count=1, flags=re.M
+        )
+    indexed.replace_section("Trip Overview", section)
+    return str(indexed)
+
+def with_day_edits(travel_request: TravelRequest, day_edits: Dict[int, str]) -> TravelRequest:
+    """The request with day edits folded into its preferences, for a plan made from scratch."""
+    if not day_edits:
+        return travel_request
+    edits = "; ".join(f"Day {day}: {edit.strip()}" for day, edit in sorted(day_edits.items()))
+    preferences = f"{travel_request.additional_preferences}. {edits}" if travel_request.additional_preferences else edits
+    return replace(travel_request, additional_preferences=preferences)
+
+@dataclass
+class Replan:
+    """A re-plan ready to run: the previous plan with the affected sections cleared, and what to redo there.
+
+    ``previous_days`` keeps the edited days as they were, for the model to revise.
+    """
+    scope: ReplanScope
+    document: str
+    day_edits: Dict[int, str] = field(default_factory=dict)
+    previous_days: Dict[int, str] = field(default_factory=dict)
+
+def prepare_replan(
+    previous_document: str,
+    previous_request: TravelRequest,
+    travel_request: TravelRequest,
+    day_edits: Optional[Dict[int, str]] = None,
+) -> Replan:
+    """Diff the requests and clear what the change invalidates from the previous document.
+
+    The overview lines are rewritten in place, the booking sections go back to their
+    placeholders and edited days keep only their heading, so the stages that redo them
+    start from the same document a new plan would give them. A previous plan that does
+    not have the full itinerary for the trip is made again from scratch.
+    """
+    day_edits = {int(day): edit for day, edit in (day_edits or {}).items() if edit and edit.strip()}
+    scope = diff_requests(previous_request, travel_request, day_edits)
+    document = extract_markdown_content(previous_document or "")
+    if scope.full:
+        return Replan(scope, document, day_edits)
+
+    days = trip_duration_days(travel_request)
+    entries = _day_entries(document)
+    unknown = sorted(day for day in day_edits if not 1 <= day <= days)
+    if unknown:
+        raise ReplanError(f"The trip has days 1-{days}; cannot edit day {', '.join(map(str, unknown))}")
+    if not document.startswith("#") or sorted(entries) != list(range(1, days + 1)):
+        return Replan(replace(scope, full_reason="the previous plan has no complete itinerary"), document, day_edits)
+
+    if scope.overview:
+        document = _update_overview(document, travel_request, scope)
+    indexed = TravelDocument(document)
+    if scope.flights:
+        indexed.replace_section("Flight Information", FLIGHTS_PLACEHOLDER, before_heading="Travel Tips")
+    if scope.accommodation:
+        indexed.replace_section("Accommodation Options", ACCOMMODATION_PLACEHOLDER, before_heading="Travel Tips")
+    document = str(indexed)
+    for day in scope.days:
+        heading = entries[day].split("\n", 1)[0]
+        document = replace_day(document, day, heading)
+    return Replan(scope, document, day_edits, {day: entries[day] for day in scope.days})
+
+class DayEditAgent(BaseChatAgent):
+    """Re-planning stage that rewrites the edited days of the itinerary, one model call per day.
+
+    Each day is revised from the plan's outline, the day as it was and the traveller's
+    change, concurrently; the new day gets its Google Images links locally. A day the
+    model does not return keeps its previous entry.
+    """
+
+    def __init__(
+        self,
+        model_client,
+        travel_request: TravelRequest,
+        day_edits: Dict[int, str],
+        previous_days: Dict[int, str],
+        name: str = "DayEditAgent",
+    ):
+        super().__init__(name=name, description="Rewrites the edited days of the itinerary.")
+        self._model_client = model_client
+        self._travel_request = travel_request
+        self._day_edits = day_edits
+        self._previous_days = previous_days
+
+    @property
+    def produced_message_types(self) -> Sequence[type[BaseChatMessage]]:
+        return (TextMessage,)
+
+    async def _rewrite(
+        self, day: int, outline: str, cancellation_token: CancellationToken
+    ) -> Tuple[str, Optional[RequestUsage]]:
+        previous = self._previous_days.get(day, f"### Day {day}")
+        prompt = (
+            f"PLAN OUTLINE:\n{outline}\n\nDAY {day} NOW:\n{previous}\n\n"
+            f"CHANGE:\n{self._day_edits[day]}\n\nRewrite Day {day}."
+        )
+        result = await self._model_client.create(
+            [
+                SystemMessage(content=f"{DAY_EDIT_INSTRUCTIONS}\n\n{trip_details(self._travel_request)}"),
+                UserMessage(content=prompt, source="user"),
+            ],
+            cancellation_token=cancellation_token,
+        )
+        block = clean_day_block(result.content if isinstance(result.content, str) else "")
+        heading = _DAY_HEADING.match(block)
+        if heading is None or int(heading.group(1)) != day:
+            logger.warning("Day %d was not rewritten; keeping the previous entry", day)
+            block = previous
+        # Only the first entry, in case the model wrote more than the one day
+        block = block[:day_spans(block).get(day, (0, len(block)))[1]].strip()
+        return link_day_entries(block), result.usage
+
+    async def on_messages(self, messages: Sequence[BaseChatMessage], cancellation_token: CancellationToken) -> Response:
+        document = latest_document(messages)
+        outline = "\n".join(skeleton_day_headings(document).values())
+        days = sorted(self._day_edits)
+        results = await asyncio.gather(*(self._rewrite(day, outline, cancellation_token) for day in days))
+        for day, (entry, _) in zip(days, results):
+            document = replace_day(document, day, entry)
+
+        usages = [usage for _, usage in results if usage]
+        usage = RequestUsage(
+            prompt_tokens=sum(usage.prompt_tokens for usage in usages),
+            completion_tokens=sum(usage.completion_tokens for usage in usages),
+        )
+        return Response(
+            chat_message=TextMessage(
+                content=f"{document}\n\n{DAYS_COMPLETION_MARKER}", source=self.name, models_usage=usage
+            )
+        )
+
+    async def on_reset(self, cancellation_token: CancellationToken) -> None:
+        pass
@@ -0,0 +1,217 @@
+"""
+Rate-limit-aware plan scheduler with admission control, priority queues and backpressure
+"""
+import asyncio
+import heapq
+import itertools
+import time
+from typing import TYPE_CHECKING, AsyncIterator, Callable, List, Optional
+
+from ..config import Settings, get_settings
+from .metrics import get_metrics
+from .shared_store import SharedTokenBucket, TokenBucket
+from .stream_encoding import stream_line
+
+if TYPE_CHECKING:
+    # Only for annotations; httpx is loaded with the model clients
+    import httpx
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+class SchedulerFull(Exception):
+    """Raised when the wait queue is full; ``retry_after`` is a suggested delay in seconds."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Planning queue is full, retry after {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+class _Ticket:
+    """A plan waiting for (or holding) an execution slot."""
+
+    def __init__(self, priority: int, sequence: int, tokens: int):
+        self.priority = priority
+        self.batch = priority >= PRIORITY_BATCH
+        self.sequence = sequence
+        self.tokens = tokens
+        self.admitted = asyncio.get_running_loop().create_future()
+
+    def __lt__(self, other: "_Ticket") -> bool:
+        return (self.priority, self.sequence) < (other.priority, other.sequence)
+
+def _parse_seconds(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+class PlanScheduler:
+    """Admits plans under a concurrency limit and a tokens-per-minute budget.
+
+    Waiting plans are ordered by priority then arrival. Batch plans run in their own
+    lane: they hold at most a share of the slots and do not count against the wait
+    queue, so a large batch never gets interactive requests rejected. The token bucket
+    is debited with an estimate per plan and corrected from the rate-limit headers on
+    model responses; a 429 pauses admission until the advertised retry time. With a
+    shared store configured, the bucket and the pause are shared by all worker
+    processes; the concurrency limit is per process.
+    """
+
+    def __init__(self, settings: Optional[Settings] = None):
+        settings = settings or get_settings()
+        self._max_concurrent = max(1, settings.scheduler_max_concurrent_plans)
+        self._max_queue = settings.scheduler_max_queue
+        self._tokens_per_minute = settings.scheduler_tokens_per_minute
+        self._tokens_per_plan = settings.scheduler_estimated_tokens_per_plan
+        self._max_backoff = settings.scheduler_max_backoff
+        self._plan_seconds = settings.scheduler_estimated_plan_seconds
+        self._max_batch = max(1, int(self._max_concurrent * settings.scheduler_batch_share))
+
+        self._queue: List[_Ticket] = []
+        self._sequence = itertools.count()
+        self._active = 0
+        self._batch_active = 0
+        self._bucket = (
+            SharedTokenBucket(settings.shared_store_path, self._tokens_per_minute)
+            if settings.shared_store_path else TokenBucket(self._tokens_per_minute)
+        )
+        self._consecutive_429 = 0
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+        self.stats = {"admitted": 0, "rejected": 0, "rate_limited": 0}
+
+    # Admission
+
+    def check_capacity(self) -> None:
+        """Raise SchedulerFull if a new interactive plan could not even join the wait queue."""
+        if self._waiting_interactive() >= self._max_queue and not self._can_admit():
+            self.stats["rejected"] += 1
+            raise SchedulerFull(self.estimate_retry_after())
+
+    def estimate_retry_after(self) -> float:
+        """Suggest how long a rejected client should wait before retrying."""
+        waits = [self._bucket.paused_for(), self._bucket.wait(self._tokens_per_plan)]
+        # Batch plans queue behind interactive ones, so only the interactive queue delays a retry
+        waits.append(self._plan_seconds * (self._waiting_interactive() + 1) / self._max_concurrent)
+        return max(1.0, *waits)
+
+    def _waiting_interactive(self) -> int:
+        return sum(1 for ticket in self._queue if not ticket.batch and not ticket.admitted.done())
+
+    def _can_admit(self) -> bool:
+        return (
+            self._active < self._max_concurrent
+            and self._bucket.paused_for() == 0.0
+            and self._bucket.wait(self._tokens_per_plan) == 0.0
+        )
+
+    def _dispatch(self) -> None:
+        """Admit queued plans while slots, budget and backoff allow."""
+        self._wakeup = None
+        batch_full = False
+        while self._queue and self._can_admit():
+            ticket = self._queue[0]
+            if ticket.admitted.done():
+                heapq.heappop(self._queue)
+                continue
+            if ticket.batch and self._batch_active >= self._max_batch:
+                # Batch plans sort last, so only batch plans are left and their share is in use
+                batch_full = True
+                break
+            heapq.heappop(self._queue)
+            self._active += 1
+            if ticket.batch:
+                self._batch_active += 1
+            self._bucket.debit(ticket.tokens)
+            self.stats["admitted"] += 1
+            ticket.admitted.set_result(True)
+
+        # Blocked on budget or backoff rather than slots: try again when that clears
+        if self._queue and not batch_full and self._active < self._max_concurrent and self._wakeup is None:
+            delay = max(self._bucket.paused_for(), self._bucket.wait(self._tokens_per_plan), 0.05)
+            self._wakeup = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+    def _enqueue(self, priority: int) -> _Ticket:
+        ticket = _Ticket(priority, next(self._sequence), self._tokens_per_plan)
+        heapq.heappush(self._queue, ticket)
+        self._dispatch()
+        return ticket
+
+    def _position(self, ticket: _Ticket) -> int:
+        """1-based position of a waiting ticket."""
+        return 1 + sum(1 for other in self._queue if other < ticket and not other.admitted.done())
+
+    def _leave(self, ticket: _Ticket) -> None:
+        if ticket.admitted.done() and not ticket.admitted.cancelled():
+            self._active -= 1
+            if ticket.batch:
+                self._batch_active -= 1
+        else:
+            ticket.admitted.cancel()
+            if ticket in self._queue:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+        self._dispatch()
+
+    # Rate-limit feedback
+
+    async def observe_response(self, response: "httpx.Response") -> None:
+        """httpx response hook: track rate-limit headers and back off on 429s."""
+        headers = response.headers
+        remaining = _parse_seconds(headers.get("x-ratelimit-remaining-tokens"))
+        if remaining is not None:
+            self._bucket.limit(remaining)
+
+        if response.status_code == 429:
+            self._consecutive_429 += 1
+            self.stats["rate_limited"] += 1
+            retry_after_ms = _parse_seconds(headers.get("retry-after-ms"))
+            retry_after = retry_after_ms / 1000 if retry_after_ms is not None else _parse_seconds(headers.get("retry-after"))
+            if retry_after is None:
+                retry_after = 2 ** min(self._consecutive_429, 6)
+            self._bucket.pause(min(retry_after, self._max_backoff))
+        elif response.status_code < 400:
+            self._consecutive_429 = 0
+
+    # Streaming
+
+    async def stream(
+        self, producer: Callable[[], AsyncIterator[str]], priority: int = PRIORITY_INTERACTIVE
+    ) -> AsyncIterator[str]:
+        """Wait for a slot, emitting ``queued`` events with the queue position, then run the plan."""
+        ticket = self._enqueue(priority)
+        enqueued = time.monotonic()
+        try:
+            last_position = None
+            while not ticket.admitted.done():
+                position = self._position(ticket)
+                if position != last_position:
+                    last_position = position
+                    yield stream_line("queued", f"⏳ Waiting for a planning slot (position {position} in queue)")
+                try:
+                    await asyncio.wait_for(asyncio.shield(ticket.admitted), timeout=1.0)
+                except asyncio.TimeoutError:
+                    pass
+            get_metrics().queue_wait_seconds.observe(time.monotonic() - enqueued)
+
+            async for line in producer():
+                yield line
+        finally:
+            self._leave(ticket)
+
+    def snapshot(self) -> dict:
+        """Return scheduler counters and current state."""
+        return {
+            **self.stats,
+            "active": self._active,
+            "batch_active": self._batch_active,
+            "queued": len(self._queue),
+            "token_budget": round(self._bucket.level()) if self._tokens_per_minute else None,
+            "paused_for": round(self._bucket.paused_for(), 2),
+            "shared": isinstance(self._bucket, SharedTokenBucket),
+        }
+
+    def close(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+            self._wakeup = None
+        self._bucket.close()
@@ -0,0 +1,270 @@
+"""
+State shared by worker processes through one SQLite file in WAL mode: connections and rate-limit budgets
+"""
+import asyncio
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# How long a writer waits for another process's transaction before failing
+BUSY_TIMEOUT_SECONDS = 5.0
+
+# Writes committed together at most by a SQLiteWriter
+WRITER_BATCH_SIZE = 256
+
+# Seconds a shared token bucket serves its local copy before reading the shared one again
+BUCKET_SYNC_INTERVAL = 0.2
+
+def connect(path: str) -> sqlite3.Connection:
+    """Open a SQLite connection that concurrent processes can share.
+
+    WAL mode lets readers proceed while one process writes; writers queue on the
+    busy timeout instead of failing with "database is locked".
+    """
+    connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT_SECONDS, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
+
+class SQLiteWriter:
+    """A thread that owns its own connection to a SQLite file and runs writes in submission order.
+
+    Keeps busy waits and commits off the event loop. ``submit`` takes a function of the
+    connection and returns a ``Future`` of its result; writes queued together are
+    committed in one transaction (up to ``WRITER_BATCH_SIZE``), so a burst of stream
+    events costs one commit instead of one each.
+    """
+
+    def __init__(self, path: str, name: str = "sqlite-writer"):
+        self._queue: "queue.Queue[Optional[Tuple[Callable[[sqlite3.Connection], Any], Future]]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, args=(path,), name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, work: Callable[[sqlite3.Connection], Any]) -> Future:
+        future: Future = Future()
+        self._queue.put((work, future))
+        return future
+
+    def write(self, work: Callable[[sqlite3.Connection], Any]) -> None:
+        """Submit a write nobody waits for; failures are logged."""
+        self.submit(work).add_done_callback(_log_failure)
+
+    async def flush(self) -> None:
+        """Wait until every write submitted so far is committed."""
+        await asyncio.wrap_future(self.submit(lambda connection: None))
+
+    def _run(self, path: str) -> None:
+        connection = connect(path)
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            while len(batch) < WRITER_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                stopping = True
+                batch = [item for item in batch if item is not None]
+
+            results = []
+            for work, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    results.append((future, work(connection), None))
+                except Exception as error:
+                    results.append((future, None, error))
+            try:
+                connection.commit()
+            except Exception as error:
+                connection.rollback()
+                results = [(future, None, error) for future, _, _ in results]
+            for future, result, error in results:
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+        connection.close()
+
+    def close(self) -> None:
+        """Commit what is queued and stop the thread."""
+        self._queue.put(None)
+        self._thread.join()
+
+def _log_failure(future: Future) -> None:
+    if not future.cancelled() and future.exception() is not None:
+        logger.warning("Shared store write failed: %s", future.exception())
+
+class TokenBucket:
+    """A tokens-per-minute budget and 429 backoff held in this process.
+
+    ``tokens_per_minute`` of 0 means unlimited: waits are always zero but backoff
+    still applies. Times are wall-clock so the shared variant can use the same math.
+    """
+
+    def __init__(self, tokens_per_minute: int):
+        self.tokens_per_minute = tokens_per_minute
+        self._level = float(tokens_per_minute)
+        self._updated = time.time()
+        self._paused_until = 0.0
+
+    def _refilled(self, level: float, updated: float, now: float) -> float:
+        return min(float(self.tokens_per_minute), level + (now - updated) * self.tokens_per_minute / 60)
+
+    def _wait_for(self, level: float, amount: int) -> float:
+        needed = min(amount, self.tokens_per_minute) - level
+        return max(0.0, needed * 60 / self.tokens_per_minute)
+
+    def level(self) -> float:
+        if not self.tokens_per_minute:
+            return 0.0
+        now = time.time()
+        self._level, self._updated = self._refilled(self._level, self._updated, now), now
+        return self._level
+
+    def wait(self, amount: int) -> float:
+        """Seconds until the bucket holds ``amount`` tokens (capped at one minute's budget)."""
+        if not self.tokens_per_minute:
+            return 0.0
+        return self._wait_for(self.level(), amount)
+
+    def debit(self, amount: int) -> None:
+        if self.tokens_per_minute:
+            self._level = self.level() - min(amount, self.tokens_per_minute)
+
+    def limit(self, remaining: float) -> None:
+        """Lower the level to what the API reports as remaining."""
+        if self.tokens_per_minute:
+            self._level = min(self.level(), remaining)
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.time() + seconds)
+
+    def paused_for(self) -> float:
+        return max(0.0, self._paused_until - time.time())
+
+    def close(self) -> None:
+        pass
+
+class SharedTokenBucket(TokenBucket):
+    """A token bucket stored in the shared SQLite file, so all workers draw on one budget.
+
+    Each update is a single-statement read-modify-write run by a writer thread, so the
+    scheduler never waits on SQLite; a 429 seen by one worker pauses admission in all
+    of them. Reads are served from a local copy that takes this worker's updates at
+    once and is re-read from the file every ``BUCKET_SYNC_INTERVAL`` seconds.
+    """
+
+    def __init__(self, path: str, tokens_per_minute: int, name: str = "model"):
+        super().__init__(tokens_per_minute)
+        self._name = name
+        connection = connect(path)
+        try:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limits ("
+                " name TEXT PRIMARY KEY, level REAL NOT NULL, updated_at REAL NOT NULL, paused_until REAL NOT NULL)"
+            )
+            connection.execute(
+                "INSERT OR IGNORE INTO rate_limits (name, level, updated_at, paused_until) VALUES (?, ?, ?, 0)",
+                (name, float(tokens_per_minute), time.time()),
+            )
+            connection.commit()
+            self._level, self._updated, self._paused_until = self._select(connection)
+        finally:
+            connection.close()
+        self._writer = SQLiteWriter(path, name=f"rate-limits-{name}")
+        # Updates submitted so far, and the latest (updates, level, updated_at, paused_until) read from the file
+        self._writes = 0
+        self._synced: Optional[Tuple[int, float, float, float]] = None
+        self._applied: Optional[Tuple[int, float, float, float]] = None
+        self._reading: Optional[Future] = None
+        self._synced_at = time.monotonic()
+
+    def _select(self, connection: sqlite3.Connection) -> Tuple[float, float, float]:
+        return connection.execute(
+            "SELECT level, updated_at, paused_until FROM rate_limits WHERE name = ?", (self._name,)
+        ).fetchone()
+
+    def _submit(self, statement: Optional[str] = None, parameters: tuple = ()) -> Future:
+        """Run an update (or just a read) on the writer thread and keep the state it leaves."""
+        if statement is not None:
+            self._writes += 1
+        writes = self._writes
+
+        def work(connection: sqlite3.Connection) -> Tuple[int, float, float, float]:
+            if statement is not None:
+                connection.execute(statement, parameters)
+            return (writes, *self._select(connection))
+
+        future = self._writer.submit(work)
+        future.add_done_callback(self._on_result)
+        return future
+
+    def _on_result(self, future: Future) -> None:
+        # Writer thread: only publish the state; the event loop adopts it in _sync
+        if future.cancelled() or future.exception() is not None:
+            _log_failure(future)
+            return
+        self._synced = future.result()
+
+    def _sync(self) -> None:
+        """Adopt the state last read from the file, and read it again once the local copy is stale."""
+        synced = self._synced
+        if synced is not None and synced is not self._applied:
+            self._applied = synced
+            # A state read before this worker's latest updates reached the file would undo them
+            if synced[0] == self._writes:
+                self._level, self._updated, self._paused_until = synced[1:]
+        now = time.monotonic()
+        if now - self._synced_at >= BUCKET_SYNC_INTERVAL and (self._reading is None or self._reading.done()):
+            self._synced_at = now
+            self._reading = self._submit()
+
+    def level(self) -> float:
+        self._sync()
+        return super().level()
+
+    def debit(self, amount: int) -> None:
+        if self.tokens_per_minute:
+            self._sync()
+            super().debit(amount)
+            now = time.time()
+            self._submit(
+                "UPDATE rate_limits SET level = MIN(?, level + (? - updated_at) * ? / 60.0) - ?, updated_at = ?"
+                " WHERE name = ?",
+                (float(self.tokens_per_minute), now, self.tokens_per_minute, min(amount, self.tokens_per_minute),
+                 now, self._name),
+            )
+
+    def limit(self, remaining: float) -> None:
+        if self.tokens_per_minute:
+            self._sync()
+            super().limit(remaining)
+            now = time.time()
+            self._submit(
+                "UPDATE rate_limits SET level = MIN(?, level + (? - updated_at) * ? / 60.0, ?), updated_at = ?"
+                " WHERE name = ?",
+                (float(self.tokens_per_minute), now, self.tokens_per_minute, remaining, now, self._name),
+            )
+
+    def pause(self, seconds: float) -> None:
+        self._sync()
+        super().pause(seconds)
+        self._submit(
+            "UPDATE rate_limits SET paused_until = MAX(paused_until, ?) WHERE name = ?",
+            (self._paused_until, self._name),
+        )
+
+    def paused_for(self) -> float:
+        self._sync()
+        return super().paused_for()
+
+    def close(self) -> None:
+        self._writer.close()
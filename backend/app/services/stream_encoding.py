@@ -0,0 +1,183 @@
+"""
+Stream message encoding: fast NDJSON lines, pre-encoded constant frames, and SSE/compressed framing at the edge
+"""
+import json
+import zlib
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from pydantic_core import to_json
+
+from ..models.request import StreamMessage
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional codec
+    brotli = None
+
+MEDIA_NDJSON = "application/x-ndjson"
+MEDIA_SSE = "text/event-stream"
+
+# Every line carries all StreamMessage fields, in model order, like model_dump() did
+_FIELDS = tuple(StreamMessage.model_fields)
+_TEMPLATE = dict.fromkeys(_FIELDS)
+
+def dumps(value) -> str:
+    """Serialize to compact JSON (orjson when installed, else pydantic-core's serializer)."""
+    if orjson is not None:
+        return orjson.dumps(value).decode("utf-8")
+    return to_json(value).decode("utf-8")
+
+def loads(text: str):
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+def stream_line(type: str, content: str, agent: Optional[str] = None, **fields) -> str:
+    """Encode one stream message as an NDJSON line without building a model.
+
+    Produces the same keys as ``StreamMessage(...).model_dump()``; ``timestamp``
+    defaults to now.
+    """
+    message = _TEMPLATE.copy()
+    message["type"] = type
+    message["agent"] = agent
+    message["content"] = content
+    message["timestamp"] = datetime.now().isoformat()
+    for name, value in fields.items():
+        if name not in message:
+            raise TypeError(f"Unknown stream message field: {name}")
+        message[name] = value
+    return dumps(message) + "\n"
+
+def sparse_line(type: str, content: str, agent: Optional[str] = None, **fields) -> str:
+    """Encode a high-rate stream message (deltas) with only the fields that are set.
+
+    The ``StreamMessage`` fields left out are the ones that would be null.
+    """
+    message = {"type": type}
+    if agent is not None:
+        message["agent"] = agent
+    message["content"] = content
+    message["timestamp"] = datetime.now().isoformat()
+    for name, value in fields.items():
+        if name not in _TEMPLATE:
+            raise TypeError(f"Unknown stream message field: {name}")
+        if value is not None:
+            message[name] = value
+    return dumps(message) + "\n"
+
+class ConstantFrame:
+    """A message whose fields never change: encoded once, with only the timestamp filled in per use."""
+
+    __slots__ = ("_prefix", "_suffix")
+
+    def __init__(self, type: str, content: str, agent: Optional[str] = None):
+        marker = "\x00timestamp\x00"
+        message = _TEMPLATE.copy()
+        message.update(type=type, agent=agent, content=content, timestamp=marker)
+        prefix, suffix = dumps(message).split(dumps(marker), 1)
+        self._prefix = prefix + '"'
+        self._suffix = '"' + suffix + "\n"
+
+    def __call__(self) -> str:
+        return self._prefix + datetime.now().isoformat() + self._suffix
+
+@lru_cache(maxsize=256)
+def constant_frame(type: str, content: str, agent: Optional[str] = None) -> ConstantFrame:
+    """Return the shared pre-encoded frame for a constant message."""
+    return ConstantFrame(type, content, agent)
+
+# Edge framing
+
+@dataclass(frozen=True)
+class StreamFormat:
+    """Wire format of a response stream negotiated from the request headers."""
+    media_type: str = MEDIA_NDJSON
+    content_encoding: Optional[str] = None  # "gzip", "br" or None
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        headers = {"Vary": "Accept, Accept-Encoding"}
+        if self.content_encoding:
+            headers["Content-Encoding"] = self.content_encoding
+        return headers
+
+def _parse_quality(header: Optional[str]) -> List[Tuple[str, float]]:
+    """Split an Accept-style header into (value, q) pairs, dropping q=0."""
+    values = []
+    for part in (header or "").split(","):
+        name, *params = [item.strip() for item in part.split(";")]
+        if not name:
+            continue
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            values.append((name.lower(), quality))
+    return values
+
+def supported_encodings() -> Tuple[str, ...]:
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+def negotiate_format(accept: Optional[str], accept_encoding: Optional[str]) -> StreamFormat:
+    """Pick SSE when the client asks for ``text/event-stream`` (else NDJSON) and the best compression it accepts."""
+    accepted = dict(_parse_quality(accept))
+    sse = accepted.get(MEDIA_SSE, 0.0)
+    media_type = MEDIA_SSE if sse and sse >= accepted.get(MEDIA_NDJSON, 0.0) else MEDIA_NDJSON
+
+    encodings = dict(_parse_quality(accept_encoding))
+    candidates = [
+        (encodings.get(name, encodings.get("*", 0.0)), -rank, name)
+        for rank, name in enumerate(supported_encodings())
+    ]
+    quality, _, encoding = max(candidates)
+    return StreamFormat(media_type, encoding if quality > 0 else None)
+
+class SequencedLine(str):
+    """An NDJSON line that carries its job sequence number, so framing never re-parses it."""
+
+    def __new__(cls, line: str, sequence: int):
+        value = super().__new__(cls, line)
+        value.sequence = sequence
+        return value
+
+def sse_frame(line: str, sequence: Optional[int] = None) -> str:
+    """Frame an NDJSON line as a Server-Sent Event; a job sequence number becomes its event id."""
+    data = line.rstrip("\n")
+    if sequence is not None:
+        return f"id: {sequence}\ndata: {data}\n\n"
+    return f"data: {data}\n\n"
+
+async def encode_stream(lines: AsyncIterator[str], stream_format: StreamFormat) -> AsyncIterator[bytes]:
+    """Reframe an NDJSON line stream for the wire in the negotiated format."""
+    sse = stream_format.media_type == MEDIA_SSE
+    encoding = stream_format.content_encoding
+    if encoding == "gzip":
+        gzip = zlib.compressobj(6, zlib.DEFLATED, 31)
+        compress = lambda data: gzip.compress(data) + gzip.flush(zlib.Z_SYNC_FLUSH)
+        finish = gzip.flush
+    elif encoding == "br":
+        br = brotli.Compressor(mode=brotli.MODE_TEXT, quality=5)
+        compress = lambda data: br.process(data) + br.flush()
+        finish = br.finish
+    else:
+        compress = finish = None
+
+    # Each event is flushed through the compressor so it reaches the client without waiting for more
+    async for line in lines:
+        data = (sse_frame(line, getattr(line, "sequence", None)) if sse else line).encode("utf-8")
+        yield compress(data) if compress else data
+    if finish:
+        yield finish()
@@ -0,0 +1,233 @@
+"""
+Per-agent token accounting and per-plan token caps for model calls
+"""
+import logging
+import os
+import time
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Any, AsyncGenerator, Dict, Mapping, Optional, Sequence, Tuple, Union
+
+import httpx
+from autogen_core import CancellationToken
+from autogen_core.models import (
+    ChatCompletionClient,
+    CreateResult,
+    LLMMessage,
+    ModelCapabilities,
+    ModelInfo,
+    RequestUsage
+)
+from autogen_core.tools import Tool, ToolSchema
+
+from .metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+# Chat formatting overhead per message and for priming the reply (OpenAI chat format)
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+# The ledger and agent of the model call in flight, for attributing what the HTTP response reports
+_current_call: ContextVar[Optional[Tuple["TokenLedger", str]]] = ContextVar("current_model_call", default=None)
+
+class TokenBudgetExceeded(Exception):
+    """Raised before a model call once a plan has spent its token cap."""
+
+@lru_cache(maxsize=8)
+def _encoding(model: str):
+    """Return the tiktoken encoding for a model, or None when it cannot be loaded (e.g. offline)."""
+    try:
+        import tiktoken
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+def count_text_tokens(text: str, model: str) -> int:
+    """Count the tokens in ``text``, estimating four characters per token without an encoding."""
+    encoding = _encoding(model)
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+def count_message_tokens(messages: Sequence[LLMMessage], model: str) -> int:
+    """Count the prompt tokens of a chat request."""
+    total = TOKENS_PER_REPLY
+    for message in messages:
+        content = getattr(message, "content", "")
+        text = content if isinstance(content, str) else str(content)
+        total += TOKENS_PER_MESSAGE + count_text_tokens(text, model)
+    return total
+
+class TokenLedger:
+    """Prompt and completion tokens spent by each agent during one plan.
+
+    ``cap`` (0 = unlimited) is checked before every metered model call.
+    """
+
+    def __init__(self, cap: int = 0, model: Optional[str] = None, plan: str = ""):
+        self.cap = cap
+        self.model = model or os.environ.get("AZURE_OPENAI_MODEL_NAME", "gpt-4o")
+        self.plan = plan
+        self.agents: Dict[str, Dict[str, int]] = {}
+
+    @property
+    def total(self) -> int:
+        return sum(usage["prompt_tokens"] + usage["completion_tokens"] for usage in self.agents.values())
+
+    @property
+    def exceeded(self) -> bool:
+        return bool(self.cap) and self.total >= self.cap
+
+    def check(self, agent: str) -> None:
+        if self.exceeded:
+            raise TokenBudgetExceeded(
+                f"Plan token cap of {self.cap} reached ({self.total} spent) before {agent} could run"
+            )
+
+    def _usage(self, agent: str) -> Dict[str, int]:
+        return self.agents.setdefault(
+            agent, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_prompt_tokens": 0}
+        )
+
+    def record(self, agent: str, prompt_tokens: int, completion_tokens: int) -> None:
+        usage = self._usage(agent)
+        usage["calls"] += 1
+        usage["prompt_tokens"] += prompt_tokens
+        usage["completion_tokens"] += completion_tokens
+        metrics = get_metrics()
+        metrics.agent_tokens.labels(agent, "prompt").inc(prompt_tokens)
+        metrics.agent_tokens.labels(agent, "completion").inc(completion_tokens)
+        logger.info(
+            "plan=%s agent=%s prompt_tokens=%d completion_tokens=%d plan_total=%d",
+            self.plan, agent, prompt_tokens, completion_tokens, self.total
+        )
+
+    def record_cached(self, agent: str, cached_tokens: int) -> None:
+        """Record prompt tokens the API served from its prompt cache (a part of the prompt tokens)."""
+        self._usage(agent)["cached_prompt_tokens"] += cached_tokens
+        get_metrics().agent_tokens.labels(agent, "cached_prompt").inc(cached_tokens)
+
+    def meter(self, model_client: ChatCompletionClient, agent: str) -> "MeteredModelClient":
+        """Wrap a model client so its calls are charged to ``agent``."""
+        return MeteredModelClient(model_client, self, agent)
+
+    def agent_usage(self, agent: str) -> Optional[Dict[str, int]]:
+        usage = self.agents.get(agent)
+        return dict(usage) if usage else None
+
+    def snapshot(self) -> dict:
+        return {"agents": {name: dict(usage) for name, usage in self.agents.items()}, "total": self.total, "cap": self.cap}
+
+async def observe_cached_tokens(response: httpx.Response) -> None:
+    """httpx response hook: charge the cached prompt tokens a completion reports to the calling agent.
+
+    Only JSON (non-streamed) completions are read, so streamed turns report no cached
+    tokens; the body is cached on the response, so the OpenAI client parses it as usual.
+    """
+    call = _current_call.get()
+    if call is None or response.status_code != 200:
+        return
+    if not response.headers.get("content-type", "").startswith("application/json"):
+        return
+    await response.aread()
+    try:
+        details = (response.json().get("usage") or {}).get("prompt_tokens_details") or {}
+        cached_tokens = int(details.get("cached_tokens") or 0)
+    except (ValueError, AttributeError, TypeError):
+        return
+    if cached_tokens:
+        ledger, agent = call
+        ledger.record_cached(agent, cached_tokens)
+
+class MeteredModelClient(ChatCompletionClient):
+    """Model client wrapper that counts tokens with tiktoken and enforces the plan's token cap."""
+
+    def __init__(self, inner: ChatCompletionClient, ledger: TokenLedger, agent: str):
+        self._inner = inner
+        self._ledger = ledger
+        self._agent = agent
+
+    def _completion_tokens(self, result: CreateResult) -> int:
+        content = result.content if isinstance(result.content, str) else str(result.content)
+        return count_text_tokens(content, self._ledger.model)
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: Optional[bool | type] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        self._ledger.check(self._agent)
+        started = time.perf_counter()
+        call = _current_call.set((self._ledger, self._agent))
+        try:
+            result = await self._inner.create(
+                messages,
+                tools=tools,
+                json_output=json_output,
+                extra_create_args=extra_create_args,
+                cancellation_token=cancellation_token,
+            )
+        finally:
+            _current_call.reset(call)
+        get_metrics().model_call_seconds.labels(self._agent).observe(time.perf_counter() - started)
+        self._ledger.record(
+            self._agent, count_message_tokens(messages, self._ledger.model), self._completion_tokens(result)
+        )
+        return result
+
+    async def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: Optional[bool | type] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        self._ledger.check(self._agent)
+        started = time.perf_counter()
+        async for item in self._inner.create_stream(
+            messages,
+            tools=tools,
+            json_output=json_output,
+            extra_create_args=extra_create_args,
+            cancellation_token=cancellation_token,
+        ):
+            if isinstance(item, CreateResult):
+                get_metrics().model_call_seconds.labels(self._agent).observe(time.perf_counter() - started)
+                self._ledger.record(
+                    self._agent, count_message_tokens(messages, self._ledger.model), self._completion_tokens(item)
+                )
+            yield item
+
+    async def close(self) -> None:
+        # The wrapped client is shared and closed by its owner
+        pass
+
+    def actual_usage(self) -> RequestUsage:
+        return self._inner.actual_usage()
+
+    def total_usage(self) -> RequestUsage:
+        return self._inner.total_usage()
+
+    def count_tokens(self, messages: Sequence[LLMMessage], *, tools: Sequence[Tool | ToolSchema] = []) -> int:
+        return self._inner.count_tokens(messages, tools=tools)
+
+    def remaining_tokens(self, messages: Sequence[LLMMessage], *, tools: Sequence[Tool | ToolSchema] = []) -> int:
+        return self._inner.remaining_tokens(messages, tools=tools)
+
+    @property
+    def capabilities(self) -> ModelCapabilities:  # type: ignore
+        return self._inner.capabilities  # type: ignore
+
+    @property
+    def model_info(self) -> ModelInfo:
+        return self._inner.model_info
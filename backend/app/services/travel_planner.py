@@ -1,66 +1,260 @@
 """
 Main travel planning service with streaming functionality
 """
-import json
-from datetime import datetime
-from typing import AsyncGenerator
+import time
+from typing import AsyncGenerator, List, Optional
 
-from ..models.request import StreamMessage
+from autogen_agentchat.messages import ModelClientStreamingChunkEvent
+from autogen_core import CancellationToken
+
+from ..config import get_settings
+from ..models.request import STREAM_MODE_DELTA, STREAM_MODE_FULL
 from ..models.travel import TravelRequest
-from .ai_client import create_model_client
-from .agents import create_sequential_travel_team
+from .ai_client import create_model_router
+from .agents import create_replan_team, create_travel_team
+from .destination_knowledge import DestinationKnowledgeCache
+from .metrics import PlanSpan, get_metrics
+from .orchestration import PlanDeadlineExceeded, cancellable_stream, until_deadline
+from .replanning import Replan
+from .stream_encoding import constant_frame, sparse_line, stream_line
+from .token_accounting import TokenLedger
+from ..utils.booking_links import (
+    ACCOMMODATION_PLACEHOLDER,
+    FLIGHTS_PLACEHOLDER,
+    fill_accommodation_section,
+    fill_flights_section,
+    resolve_airports,
+    resolve_flight_route
+)
 from ..utils.content_processing import extract_markdown_content
-from ..utils.prompt_generation import generate_travel_prompt
+from ..utils.document_delta import DocumentDeltaTracker, Patch, PatchCoalescer, utf16_length
+from ..utils.document_validation import validate_document
+from ..utils.prompt_generation import generate_travel_prompt, trip_duration_days
+
+# Constant progress messages, encoded once
+_PROMPT_READY = constant_frame("progress", "📝 Generated travel prompt and initializing AI agents...")
+_AGENTS_READY = constant_frame("progress", "🤖 AI agents ready - starting collaboration...")
+_PLAN_COMPLETE = constant_frame("progress", "✅ Travel plan complete!")
+_REPLAN_READY = constant_frame("progress", "♻️ Starting from the previous plan - only the affected stages will run...")
+
+def _delta_line(agent: Optional[str], patch: Patch, character_count: int) -> str:
+    """Encode a document patch: replace ``length`` UTF-16 code units at ``offset`` with ``content``."""
+    offset, length, content = patch
+    return sparse_line("delta", content, agent, offset=offset, length=length, character_count=character_count)
+
+def _snapshot_line(agent: Optional[str], document: str) -> str:
+    """Encode a full-document snapshot clients can resynchronize from."""
+    return stream_line("markdown_update", document, agent, character_count=utf16_length(document))
+
+def _usage_line(agent: Optional[str], ledger: TokenLedger) -> str:
+    """Encode token usage: one agent's running totals, or the plan summary when ``agent`` is None."""
+    if agent is None:
+        usage = ledger.snapshot()
+        content = f"📊 Plan used {usage['total']:,} tokens"
+    else:
+        usage = ledger.agent_usage(agent)
+        cached = f" ({usage['cached_prompt_tokens']:,} cached)" if usage["cached_prompt_tokens"] else ""
+        content = (
+            f"📊 {agent} used {usage['prompt_tokens']:,} prompt{cached} + {usage['completion_tokens']:,} "
+            f"completion tokens (plan total {ledger.total:,})"
+        )
+    return stream_line("usage", content, agent, usage=usage)
+
+def _final_line(agent: Optional[str], document: str, delta: bool, outcome: str) -> str:
+    """Encode the final message; in delta mode the client already holds the document.
+
+    ``outcome`` tells a completed plan from one finished early with the latest document.
+    """
+    return stream_line(
+        "final", "" if delta else document, agent, character_count=utf16_length(document), outcome=outcome
+    )
 
-async def stream_travel_plan(travel_request: TravelRequest) -> AsyncGenerator[str, None]:
-    """Stream travel plan generation with real-time updates."""
+def _deadline_document(versions: List[str], travel_request: TravelRequest) -> str:
+    """The newest document version that is complete enough to send as final when the deadline hits.
+
+    Booking sections still waiting on their stage are rendered locally. A version that
+    fails validation (e.g. cut off mid-stream) is passed over for an earlier one, as long
+    as one is valid; otherwise the newest version is sent anyway.
+    """
+    expected_days = trip_duration_days(travel_request)
+    route = resolve_flight_route(travel_request)
+    candidates = []
+    for index in range(len(versions) - 1, -1, -1):
+        document = versions[index]
+        if FLIGHTS_PLACEHOLDER in document and route is not None:
+            document = fill_flights_section(document, travel_request, route)
+        if ACCOMMODATION_PLACEHOLDER in document:
+            document = fill_accommodation_section(document, travel_request)
+        report = validate_document(document, versions[:index], expected_days)
+        if report.ok:
+            return report.document
+        candidates.append(report.document)
+    return candidates[0]
+
+async def stream_travel_plan(
+    travel_request: TravelRequest,
+    model_client=None,
+    stream_mode: str = STREAM_MODE_FULL,
+    destinations: Optional[DestinationKnowledgeCache] = None,
+    replan: Optional[Replan] = None,
+) -> AsyncGenerator[str, None]:
+    """Stream travel plan generation with real-time updates.
+
+    ``model_client`` (a client, or the ``ModelRouter`` that gives each agent its deployment's
+    client) is borrowed from the application's client pool and left open; when omitted,
+    dedicated clients are created for this plan and closed afterwards.
+    With ``stream_mode="delta"`` document changes are sent as ``delta`` patches built
+    from token streaming instead of full-document ``markdown_update`` messages.
+    Token spend is reported per agent in ``usage`` messages and capped per plan.
+    If the consumer stops iterating (a client disconnect), the team's cancellation
+    token aborts the in-flight model call and no further turns run. Past the plan
+    deadline (``PLAN_DEADLINE``) the team is cancelled the same way and the latest
+    valid document is sent as ``final``.
+    With ``destinations``, the itinerary stage gets what earlier plans learned about
+    the destination, and a completed plan for a destination it does not know yet teaches the cache.
+    Airports are resolved to IATA codes from the bundled index before any agent runs.
+    With ``replan`` the team starts from a previous plan and only redoes the sections the
+    change affects (see ``stream_replan``); destination knowledge is not used then.
+    """
     
-    model_client = None
+    owns_client = model_client is None
+    if replan is not None:
+        destinations = None
+    settings = get_settings()
+    travel_request = resolve_airports(travel_request)
+    ledger = TokenLedger(
+        cap=settings.plan_token_cap,
+        plan=f"{travel_request.destination_city}/{travel_request.depart_date}"
+    )
+    reported = {}
+    latest_markdown = ""
+    versions: List[str] = []
+    final_sent = False
+    
+    # Instrumentation: a plan that never reaches an outcome was cancelled by its consumer
+    metrics = get_metrics()
+    started = time.perf_counter()
+    deadline = time.monotonic() + settings.plan_deadline
+    metrics.plans_in_flight.inc()
+    span = PlanSpan(metrics.tracer, "travel_plan", {
+        "destination": f"{travel_request.destination_city}, {travel_request.destination_country}",
+        "stream_mode": stream_mode,
+        "replan": ", ".join(replan.scope.sections) if replan is not None else "",
+    })
+    outcome = "cancelled"
+    error_message = None
+    # Delta mode: streamed tokens held back to be sent as one patch, and the agent they came from
+    coalescer: Optional[PatchCoalescer] = None
+    draft_agent: Optional[str] = None
+    
+    def flush_deltas() -> List[str]:
+        if coalescer is None:
+            return []
+        return [_delta_line(draft_agent, patch, length) for patch, length in coalescer.flush()]
     
     try:
         # Initial setup message
-        yield json.dumps(StreamMessage(
-            type="progress",
-            content=f"🚀 Starting travel plan generation for {travel_request.destination_city}, {travel_request.destination_country}",
-            timestamp=datetime.now().isoformat()
-        ).model_dump()) + "\n"
-        
-        # Generate travel prompt
-        travel_prompt = generate_travel_prompt(travel_request)
-        
-        yield json.dumps(StreamMessage(
-            type="progress",
-            content="📝 Generated travel prompt and initializing AI agents...",
-            timestamp=datetime.now().isoformat()
-        ).model_dump()) + "\n"
+        if replan is not None:
+            yield stream_line(
+                "progress",
+                f"♻️ Re-planning {travel_request.destination_city}, {travel_request.destination_country}: "
+                f"updating {', '.join(replan.scope.sections)}"
+            )
+            # The team's task is the previous document with the affected sections cleared
+            travel_prompt = replan.document
+        else:
+            yield stream_line(
+                "progress",
+                f"🚀 Starting travel plan generation for {travel_request.destination_city}, {travel_request.destination_country}"
+            )
+            
+            # Generate travel prompt
+            travel_prompt = generate_travel_prompt(travel_request)
+            
+            yield _PROMPT_READY()
         
-        # Create model client and team
-        model_client = create_model_client()
-        team = create_sequential_travel_team(model_client, travel_request)
+        # Borrow the pooled model clients, or create them for this plan only
+        if owns_client:
+            model_client = create_model_router()
+        knowledge = destinations.get(travel_request) if destinations is not None else None
+        if replan is not None:
+            team = create_replan_team(model_client, travel_request, replan, ledger=ledger)
+        else:
+            team = create_travel_team(
+                model_client,
+                travel_request,
+                stream_tokens=stream_mode == STREAM_MODE_DELTA,
+                ledger=ledger,
+                knowledge=knowledge,
+            )
+        metrics.setup_seconds.observe(time.perf_counter() - started)
         
-        yield json.dumps(StreamMessage(
-            type="progress",
-            content="🤖 AI agents ready - starting collaboration...",
-            timestamp=datetime.now().isoformat()
-        ).model_dump()) + "\n"
+        yield _REPLAN_READY() if replan is not None else _AGENTS_READY()
         
-        # Track the latest markdown content
-        latest_markdown = ""
+        # In delta mode the client's copy of the document is kept in sync with patches
+        tracker = DocumentDeltaTracker() if stream_mode == STREAM_MODE_DELTA else None
+        if tracker is not None:
+            coalescer = PatchCoalescer(settings.stream_delta_window, settings.stream_delta_max_chars)
+        snapshot_interval = settings.stream_snapshot_interval
+        last_snapshot = time.monotonic()
         
-        # Run the team and stream updates
-        stream = team.run_stream(task=travel_prompt)
+        # Run the team and stream updates; abandoning the stream cancels the team
+        cancellation_token = CancellationToken()
+        stream = cancellable_stream(
+            team.run_stream(task=travel_prompt, cancellation_token=cancellation_token),
+            cancellation_token,
+            deadline if settings.plan_deadline > 0 else None,
+        )
+        if settings.plan_deadline > 0:
+            stream = until_deadline(stream, deadline)
+        stage_durations = getattr(team, "stage_durations", None)
+        turn_started = time.perf_counter()
+        first_event = True
         
         async for message in stream:
+            if first_event:
+                first_event = False
+                metrics.first_event_seconds.observe(time.perf_counter() - started)
+            
+            if isinstance(message, ModelClientStreamingChunkEvent):
+                patch = tracker.append_draft(message.source, message.content) if tracker else None
+                if patch:
+                    draft_agent = message.source
+                    for merged, length in coalescer.add(patch, tracker.length):
+                        yield _delta_line(message.source, merged, length)
+                    if snapshot_interval and time.monotonic() - last_snapshot >= snapshot_interval:
+                        last_snapshot = time.monotonic()
+                        for line in flush_deltas():
+                            yield line
+                        yield _snapshot_line(message.source, tracker.document)
+                continue
+            
+            # Whatever comes next applies to the document with the held-back tokens in it
+            for line in flush_deltas():
+                yield line
+            
             if hasattr(message, 'content') and hasattr(message, 'source') and message.source:
                 agent_name = message.source
                 
                 # Send progress update
-                yield json.dumps(StreamMessage(
-                    type="progress",
-                    agent=agent_name,
-                    content=f"🔄 {agent_name} is working...",
-                    timestamp=datetime.now().isoformat()
-                ).model_dump()) + "\n"
+                yield constant_frame("progress", f"🔄 {agent_name} is working...", agent_name)()
+                
+                # Turns run one after another in the round-robin team; the stage graph times them itself
+                now = time.perf_counter()
+                if agent_name != "user":
+                    if stage_durations and agent_name in stage_durations:
+                        duration = stage_durations[agent_name]
+                    else:
+                        duration = now - turn_started
+                    metrics.stage_seconds.labels(agent_name).observe(duration)
+                    span.agent_turn(agent_name, time.time() - duration)
+                turn_started = now
+                
+                # Report the agent's token spend when it changed
+                usage = ledger.agent_usage(agent_name)
+                if usage and reported.get(agent_name) != usage:
+                    reported[agent_name] = usage
+                    yield _usage_line(agent_name, ledger)
                 
                 # Extract and check for markdown content
                 clean_content = extract_markdown_content(message.content)
@@ -68,45 +262,115 @@ async def stream_travel_plan(travel_request: TravelRequest) -> AsyncGenerator[st
                 # Only send markdown updates if content is substantial and markdown-formatted
                 if len(clean_content) > 100 and clean_content.startswith('#'):
                     latest_markdown = clean_content
+                    versions.append(clean_content)
+                    metrics.document_chars.labels(agent_name).observe(len(clean_content))
                     
                     # Determine if this is the final document
                     is_final = agent_name == "CriticAgent" and "DOCUMENT_READY" in message.content
                     
-                    yield json.dumps(StreamMessage(
-                        type="final" if is_final else "markdown_update",
-                        agent=agent_name,
-                        content=clean_content,
-                        timestamp=datetime.now().isoformat(),
-                        character_count=len(clean_content)
-                    ).model_dump()) + "\n"
+                    if tracker is not None:
+                        patch = tracker.update(clean_content)
+                        if patch:
+                            yield _delta_line(agent_name, patch, tracker.length)
+                        if is_final:
+                            yield _final_line(agent_name, clean_content, delta=True, outcome="completed")
+                        elif snapshot_interval and time.monotonic() - last_snapshot >= snapshot_interval:
+                            last_snapshot = time.monotonic()
+                            yield _snapshot_line(agent_name, clean_content)
+                    elif is_final:
+                        yield _final_line(agent_name, clean_content, delta=False, outcome="completed")
+                    else:
+                        yield _snapshot_line(agent_name, clean_content)
                     
                     if is_final:
-                        yield json.dumps(StreamMessage(
-                            type="progress",
-                            content="✅ Travel plan complete!",
-                            timestamp=datetime.now().isoformat()
-                        ).model_dump()) + "\n"
+                        final_sent = True
+                        outcome = "completed"
+                        yield _PLAN_COMPLETE()
                         break
         
+        for line in flush_deltas():
+            yield line
+        if ledger.agents:
+            yield _usage_line(None, ledger)
+        
+        if final_sent and destinations is not None:
+            destinations.record_itinerary_usage(
+                knowledge is not None, ledger.agent_usage("ItineraryAgent"), trip_duration_days(travel_request)
+            )
+            if knowledge is None:
+                destinations.learn(travel_request, latest_markdown)
+        
         # If we didn't get a final document, send the latest as final
-        if latest_markdown and not latest_markdown.startswith("✅"):
-            yield json.dumps(StreamMessage(
-                type="final",
-                content=latest_markdown,
-                timestamp=datetime.now().isoformat(),
-                character_count=len(latest_markdown)
-            ).model_dump()) + "\n"
+        if latest_markdown and not final_sent:
+            outcome = "partial"
+            yield _final_line(None, latest_markdown, delta=stream_mode == STREAM_MODE_DELTA, outcome=outcome)
+        elif not final_sent:
+            outcome = "empty"
             
+    except PlanDeadlineExceeded as e:
+        error_message = str(e)
+        for line in flush_deltas():
+            yield line
+        if versions:
+            outcome = "deadline"
+            # Out of time: finish with the best document so far instead of failing the plan
+            yield stream_line(
+                "progress", f"⚠️ Plan deadline of {settings.plan_deadline:g}s reached - finishing with the latest document"
+            )
+            if ledger.agents:
+                yield _usage_line(None, ledger)
+            yield _final_line(
+                None, _deadline_document(versions, travel_request), delta=stream_mode == STREAM_MODE_DELTA, outcome=outcome
+            )
+        else:
+            outcome = "error"
+            yield stream_line("error", f"❌ Error generating travel plan: {error_message}")
+        
     except Exception as e:
-        yield json.dumps(StreamMessage(
-            type="error",
-            content=f"❌ Error generating travel plan: {str(e)}",
-            timestamp=datetime.now().isoformat()
-        ).model_dump()) + "\n"
+        error_message = str(e)
+        for line in flush_deltas():
+            yield line
+        if ledger.exceeded and latest_markdown and not final_sent:
+            outcome = "token_cap"
+            # Out of budget: finish with the best document so far instead of failing the plan
+            yield stream_line("progress", f"⚠️ Token cap of {ledger.cap:,} reached - finishing with the latest document")
+            yield _usage_line(None, ledger)
+            yield _final_line(None, latest_markdown, delta=stream_mode == STREAM_MODE_DELTA, outcome=outcome)
+        else:
+            outcome = "error"
+            yield stream_line("error", f"❌ Error generating travel plan: {str(e)}")
         
     finally:
-        if model_client:
+        metrics.plans_in_flight.dec()
+        metrics.plan_seconds.observe(time.perf_counter() - started)
+        metrics.plans.labels(outcome).inc()
+        if outcome == "cancelled":
+            metrics.cancelled_tokens_spent.inc(ledger.total)
+        span.end(error_message if outcome == "error" else None)
+        if owns_client and model_client:
             try:
                 await model_client.close()
             except:
-                pass
\ No newline at end of file
+                pass
+
+async def stream_replan(
+    travel_request: TravelRequest,
+    replan: Replan,
+    model_client=None,
+    stream_mode: str = STREAM_MODE_FULL,
+) -> AsyncGenerator[str, None]:
+    """Stream a re-plan of a previous plan after its request changed, in the same format as a new plan.
+
+    Only the stages whose sections the change invalidates run (see ``prepare_replan``);
+    when nothing changed, the previous plan is sent back as final straight away.
+    """
+    if replan.scope.unchanged:
+        yield stream_line("progress", "✅ Nothing changed - the previous plan still holds")
+        delta = stream_mode == STREAM_MODE_DELTA
+        if delta:
+            # A delta client starts from an empty document
+            yield _snapshot_line(None, replan.document)
+        yield _final_line(None, replan.document, delta=delta, outcome="completed")
+        return
+    async for line in stream_travel_plan(travel_request, model_client, stream_mode, replan=replan):
+        yield line
@@ -0,0 +1,112 @@
+"""
+Startup warm-up: load the agent stack, build the model clients and open their connections in the background
+"""
+import asyncio
+import logging
+import os
+import time
+from importlib import import_module
+from typing import Dict, Optional
+
+from .ai_client import ModelClientPool
+
+logger = logging.getLogger(__name__)
+
+# Imported by the first plan otherwise; autogen and openai dominate the cold start
+AGENT_MODULES = (
+    "app.services.travel_planner",
+    "app.services.agents",
+    "app.services.model_routing",
+    "app.services.token_accounting",
+)
+
+def _import_agent_stack() -> None:
+    for module in AGENT_MODULES:
+        import_module(module)
+
+def _warm_tokenizers(models) -> None:
+    from .token_accounting import count_text_tokens
+
+    for model in models:
+        count_text_tokens("warm-up", model)
+
+def _warm_airports() -> None:
+    from ..utils.airports import get_airport_index
+
+    get_airport_index().warm_up()
+
+class WarmUp:
+    """Runs the startup warm-up steps in order while the server already answers requests.
+
+    The app is live as soon as it listens and ready once the agent stack is imported and
+    the model clients are built; pre-connecting to the model endpoints and the airport
+    and tokenizer warm-ups are best effort and never keep it from becoming ready.
+    """
+
+    def __init__(self, model_clients: ModelClientPool, enabled: bool = True):
+        self._model_clients = model_clients
+        self._task: Optional[asyncio.Task] = None
+        # Disabled, everything loads on first use and there is nothing to wait for
+        self.state = "pending" if enabled else "disabled"
+        self.error: Optional[str] = None
+        self.steps: Dict[str, float] = {}
+        self._started = time.perf_counter()
+
+    @property
+    def ready(self) -> bool:
+        return self.state in ("ready", "disabled")
+
+    def start(self) -> None:
+        """Start the warm-up in the background (unless it is disabled)."""
+        if self._task is None and self.state == "pending":
+            self._started = time.perf_counter()
+            self._task = asyncio.create_task(self._run())
+
+    async def _step(self, name: str, work, required: bool = True) -> None:
+        started = time.perf_counter()
+        try:
+            await work()
+        except asyncio.CancelledError:
+            raise
+        except Exception as error:
+            if required:
+                raise
+            logger.warning("Warm-up step %s failed: %s", name, error)
+        self.steps[name] = round(time.perf_counter() - started, 3)
+
+    async def _run(self) -> None:
+        self.state = "warming"
+        model_clients = self._model_clients
+        try:
+            # Imports hold the GIL for most of their time, but off the loop they do not block accepts
+            await self._step("imports", lambda: asyncio.to_thread(_import_agent_stack))
+            await self._step("model_clients", model_clients.start)
+            await self._step("connections", model_clients.prime, required=False)
+            models = {
+                deployment.model or os.environ.get("AZURE_OPENAI_MODEL_NAME", "gpt-4o")
+                for deployment in model_clients.router.deployments.values()
+            }
+            await self._step("tokenizers", lambda: asyncio.to_thread(_warm_tokenizers, models), required=False)
+            await self._step("airports", lambda: asyncio.to_thread(_warm_airports), required=False)
+        except asyncio.CancelledError:
+            self.state = "cancelled"
+            raise
+        except Exception as error:
+            logger.exception("Warm-up failed")
+            self.state = "failed"
+            self.error = f"{type(error).__name__}: {error}"
+            return
+        self.state = "ready"
+        logger.info("Warm-up finished in %.2fs: %s", time.perf_counter() - self._started, self.steps)
+
+    def snapshot(self) -> Dict[str, object]:
+        return {"state": self.state, "steps": dict(self.steps), "error": self.error}
+
+    async def close(self) -> None:
+        """Stop a warm-up still running at shutdown."""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
@@ -1,10 +1,35 @@
 """
 Utility functions package
 """
-from .content_processing import extract_markdown_content
+from .airports import Airport, AirportIndex, get_airport_index
+from .content_processing import extract_markdown_content, extract_section, replace_placeholder
+from .booking_links import (
+    build_kayak_url,
+    build_skyscanner_url,
+    build_airbnb_url,
+    parse_base_locations,
+    render_flights_section,
+    render_accommodation_section
+)
+from .image_links import add_itinerary_image_links, build_google_images_url
 from .prompt_generation import generate_travel_prompt
+from .travel_document import TravelDocument
 
 __all__ = [
+    "Airport",
+    "AirportIndex",
+    "get_airport_index",
     "extract_markdown_content",
-    "generate_travel_prompt"
+    "extract_section",
+    "replace_placeholder",
+    "build_kayak_url",
+    "build_skyscanner_url",
+    "build_airbnb_url",
+    "parse_base_locations",
+    "render_flights_section",
+    "render_accommodation_section",
+    "add_itinerary_image_links",
+    "build_google_images_url",
+    "generate_travel_prompt",
+    "TravelDocument"
 ]
\ No newline at end of file
@@ -0,0 +1,252 @@
+"""
+Offline airport index over the bundled dataset: IATA lookup, ranked airports per city and fuzzy city matching
+"""
+import gc
+import mmap
+import re
+import unicodedata
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+
+_CODE = re.compile(r"[A-Za-z]{3}")
+_BRACKETED_CODE = re.compile(r"\(([A-Za-z]{3})\)")
+_UPPER_CODE = re.compile(r"\b([A-Z]{3})\b")
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+# Words that do not tell airports apart
+NAME_STOPWORDS = frozenset({"airport", "international", "intl", "regional", "municipal", "field", "the"})
+
+@dataclass(frozen=True)
+class Airport:
+    """One airport (or metropolitan area code) from the bundled dataset; lower ``rank`` is more primary."""
+    iata: str
+    name: str
+    city: str
+    country: str
+    rank: int
+    metro: bool = False
+
+def normalize_place(text: Optional[str]) -> str:
+    """Fold accents, case and punctuation so "São Paulo" and "sao-paulo" compare equal."""
+    folded = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode("ascii")
+    return _NON_ALNUM.sub(" ", folded.casefold()).strip()
+
+def _deletes(word: str) -> Set[str]:
+    return {word[:index] + word[index + 1:] for index in range(len(word))}
+
+def _edit_distance(left: str, right: str, limit: int) -> int:
+    """Optimal string alignment distance, or ``limit + 1`` once it is known to exceed ``limit``."""
+    if abs(len(left) - len(right)) > limit:
+        return limit + 1
+    previous, current = None, list(range(len(right) + 1))
+    for i in range(1, len(left) + 1):
+        before, previous, current = previous, current, [i] + [0] * len(right)
+        for j in range(1, len(right) + 1):
+            cost = left[i - 1] != right[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and left[i - 1] == right[j - 2] and left[i - 2] == right[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+    return current[-1]
+
+class _SortedTable:
+    """A generated tab-separated table, memory-mapped and binary-searched on its first column.
+
+    Lines are found by bisecting byte positions in the mapped file, so opening a table
+    costs one mmap and nothing is parsed until a line is looked up.
+    """
+
+    def __init__(self, path: Path):
+        self._path = path
+        self._data: Optional[mmap.mmap] = None
+        self._start = 0
+
+    def _load(self) -> mmap.mmap:
+        if self._data is None:
+            with open(self._path, "rb") as table_file:
+                self._data = mmap.mmap(table_file.fileno(), 0, access=mmap.ACCESS_READ)
+            # The first line is the column header
+            self._start = self._data.find(b"\n") + 1
+        return self._data
+
+    def find(self, key: str) -> Optional[List[str]]:
+        """The columns of the line whose first column is ``key``, or None."""
+        data = self._load()
+        target = key.encode("utf-8")
+        low, high = self._start, len(data)
+        while low < high:
+            start = data.rfind(b"\n", low, (low + high) // 2) + 1 or low
+            end = data.find(b"\n", start)
+            end = len(data) if end < 0 else end
+            line = data[start:end]
+            first = line.split(b"\t", 1)[0]
+            if first == target:
+                return line.decode("utf-8").split("\t")
+            if first < target:
+                low = end + 1
+            else:
+                high = start
+        return None
+
+    def keys(self) -> Iterator[str]:
+        """Every first column, in order."""
+        data = self._load()
+        for line in data[self._start:].decode("utf-8").splitlines():
+            yield line.split("\t", 1)[0]
+
+    def close(self) -> None:
+        if self._data is not None:
+            self._data.close()
+            self._data = None
+
+class AirportIndex:
+    """Airports from the bundled dataset, memory-mapped and looked up without a build step.
+
+    ``airports.tsv`` (by IATA code), ``airport_cities.tsv`` (city name -> codes, most
+    primary first) and ``airport_words.tsv`` (airport name word -> codes) are generated
+    sorted, so every exact lookup is a binary search of a mapped file. Only the fuzzy
+    index (deletion neighbourhoods of every city name) is built in memory, the first
+    time a place is misspelt.
+    """
+
+    def __init__(self, data_dir: Path = DATA_DIR):
+        self._airports = _SortedTable(data_dir / "airports.tsv")
+        self._cities = _SortedTable(data_dir / "airport_cities.tsv")
+        self._words = _SortedTable(data_dir / "airport_words.tsv")
+        self._countries_path = data_dir / "countries.tsv"
+        self._fuzzy: Optional[Dict[str, List[str]]] = None
+        # Parsed airports by code; bounded by the dataset size
+        self._parsed: Dict[str, Optional[Airport]] = {}
+        self._countries: Optional[Dict[str, str]] = None
+
+    def _build_fuzzy(self) -> Dict[str, List[str]]:
+        if self._fuzzy is None:
+            fuzzy: Dict[str, List[str]] = {}
+            # Hundreds of thousands of small objects: collecting during the build only slows it down
+            collecting = gc.isenabled()
+            gc.disable()
+            try:
+                for city in self._cities.keys():
+                    fuzzy.setdefault(city, []).append(city)
+                    for variant in _deletes(city):
+                        fuzzy.setdefault(variant, []).append(city)
+            finally:
+                if collecting:
+                    gc.enable()
+            self._fuzzy = fuzzy
+        return self._fuzzy
+
+    def warm_up(self) -> None:
+        """Map the tables and build the fuzzy index now instead of on the first lookup."""
+        self.country_code("")
+        self._build_fuzzy()
+
+    # Lookups
+
+    def get(self, code: str) -> Optional[Airport]:
+        """The airport (or metropolitan area) with an IATA code."""
+        key = code.strip().upper()
+        if key in self._parsed:
+            return self._parsed[key]
+        if not _CODE.fullmatch(key):
+            return None
+        columns = self._airports.find(key)
+        airport = None
+        if columns is not None:
+            code, kind, rank, country, city, name = columns
+            airport = Airport(code, name, city, country, int(rank), kind == "M")
+        self._parsed[key] = airport
+        return airport
+
+    def country_code(self, country: Optional[str]) -> Optional[str]:
+        """ISO 3166 code of a country name, alias ("UK", "USA") or code."""
+        if self._countries is None:
+            countries = {}
+            with open(self._countries_path, encoding="utf-8") as countries_file:
+                for line in countries_file:
+                    if line.startswith("#") or not line.strip():
+                        continue
+                    code, names = line.rstrip("\n").split("\t")
+                    for name in [code] + names.split("|"):
+                        countries.setdefault(normalize_place(name), code)
+            self._countries = countries
+        return self._countries.get(normalize_place(country)) if country else None
+
+    def _codes(self, table: _SortedTable, key: str) -> List[str]:
+        columns = table.find(key) if key else None
+        return columns[1].split() if columns else []
+
+    def _ranked(self, codes: Iterable[str], country: Optional[str], limit: int) -> List[Airport]:
+        airports = sorted(filter(None, map(self.get, codes)), key=lambda airport: airport.rank)
+        code = self.country_code(country)
+        if code and any(airport.country == code for airport in airports):
+            airports = [airport for airport in airports if airport.country == code]
+        return airports[:limit]
+
+    def airports_in(self, city: str, country: Optional[str] = None, limit: int = 3) -> List[Airport]:
+        """A city's airports, most primary first (only the country's when it has any)."""
+        return self._ranked(self._codes(self._cities, normalize_place(city)), country, limit)
+
+    def fuzzy_city(self, city: str) -> Optional[str]:
+        """The indexed city name closest to a misspelt one (up to two edits), or None."""
+        query = normalize_place(city)
+        if not query:
+            return None
+        limit = 1 if len(query) <= 5 else 2
+        fuzzy = self._build_fuzzy()
+        candidates = set(fuzzy.get(query, ()))
+        for variant in _deletes(query):
+            candidates.update(fuzzy.get(variant, ()))
+        best = None
+        for candidate in candidates:
+            distance = _edit_distance(query, candidate, limit)
+            if distance <= limit:
+                primary = self.get(self._codes(self._cities, candidate)[0])
+                if best is None or (distance, primary.rank) < best[:2]:
+                    best = (distance, primary.rank, candidate)
+        return best[2] if best else None
+
+    def search(self, place: str, country: Optional[str] = None, limit: int = 3) -> List[Airport]:
+        """Airports for a city or airport name, tolerating misspelt city names."""
+        airports = self.airports_in(place, country, limit)
+        if airports:
+            return airports
+        words = set(normalize_place(place).split()) - NAME_STOPWORDS
+        if words:
+            matches = set.intersection(*(set(self._codes(self._words, word)) for word in words))
+            if matches:
+                return self._ranked(matches, country, limit)
+        city = self.fuzzy_city(place)
+        return self.airports_in(city, country, limit) if city else []
+
+    def resolve(self, airport: str, country: Optional[str] = None) -> Optional[Airport]:
+        """Resolve user input: an IATA code, "Name (LHR)", a city or an airport name."""
+        value = airport.strip()
+        if not value:
+            return None
+        if _CODE.fullmatch(value):
+            known = self.get(value)
+            if known is not None:
+                return known
+        bracketed = _BRACKETED_CODE.search(value)
+        if bracketed and self.get(bracketed.group(1)):
+            return self.get(bracketed.group(1))
+        codes = [code for code in _UPPER_CODE.findall(value) if self.get(code)]
+        if len(codes) == 1:
+            return self.get(codes[0])
+        place, _, place_country = value.partition(",")
+        found = self.search(place, place_country.strip() or country, limit=1)
+        return found[0] if found else None
+
+    def close(self) -> None:
+        for table in (self._airports, self._cities, self._words):
+            table.close()
+
+@lru_cache(maxsize=1)
+def get_airport_index() -> AirportIndex:
+    """The process-wide airport index (nothing is read until the first lookup)."""
+    return AirportIndex()
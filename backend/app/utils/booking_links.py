@@ -0,0 +1,182 @@
+"""
+Deterministic booking link builders and section renderers for flights and accommodation
+"""
+import re
+from dataclasses import replace
+from datetime import datetime
+from typing import List, Optional, Tuple
+from urllib.parse import quote
+
+from ..models.travel import TravelRequest
+from .airports import get_airport_index
+from .content_processing import extract_section, replace_placeholder
+
+FLIGHTS_PLACEHOLDER = "<!-- FLIGHTS_PLACEHOLDER -->"
+ACCOMMODATION_PLACEHOLDER = "<!-- ACCOMMODATION_PLACEHOLDER -->"
+
+MAX_BASE_LOCATIONS = 6
+
+_CODE_PATTERN = re.compile(r"[A-Za-z]{3}")
+_BOLD_PATTERN = re.compile(r"\*\*(.+?)\*\*")
+_LINK_PATTERN = re.compile(r"\[([^\]]+)\]\([^)]*\)")
+_LIST_ITEM_PATTERN = re.compile(r"^(?:[-*+]|\d+[.)])\s+(.*)$")
+_NAME_SEPARATORS = (" - ", " – ", " — ", ":", " (")
+
+def resolve_airport_code(airport: Optional[str], city: str = "", country: str = "") -> Optional[str]:
+    """Resolve a user-supplied airport (or, if none, the city's primary airport) to an IATA code.
+
+    Uses the bundled airport index; a three-letter code it does not know is still taken as given.
+    """
+    index = get_airport_index()
+    if airport and airport.strip():
+        value = airport.strip()
+        found = index.resolve(value, country or None)
+        if found is not None:
+            return found.iata
+        return value.upper() if _CODE_PATTERN.fullmatch(value) else None
+
+    airports = index.search(city, country or None, limit=1) if city and city.strip() else []
+    return airports[0].iata if airports else None
+
+def resolve_airports(travel_request: TravelRequest) -> TravelRequest:
+    """The request with both airports as IATA codes where the index can resolve them.
+
+    An unspecified destination airport becomes the destination city's primary airport;
+    anything unresolvable is left as the user wrote it for the FlightsAgent to work out.
+    """
+    departure = resolve_airport_code(travel_request.departure_airport)
+    destination = resolve_airport_code(
+        travel_request.destination_airport, travel_request.destination_city, travel_request.destination_country
+    )
+    return replace(
+        travel_request,
+        departure_airport=departure or travel_request.departure_airport,
+        destination_airport=destination or travel_request.destination_airport,
+    )
+
+def build_kayak_url(origin: str, destination: str, depart_date: str, return_date: str) -> str:
+    """Build a Kayak round-trip search URL."""
+    return (
+        f"https://www.kayak.co.uk/flights/{origin.upper()}-{destination.upper()}"
+        f"/{depart_date}/{return_date}?sort=bestflight_a"
+    )
+
+def build_skyscanner_url(origin: str, destination: str, depart_date: str, return_date: str) -> str:
+    """Build a Skyscanner round-trip search URL (dates as YYMMDD)."""
+    depart = datetime.strptime(depart_date, "%Y-%m-%d").strftime("%y%m%d")
+    ret = datetime.strptime(return_date, "%Y-%m-%d").strftime("%y%m%d")
+    return (
+        f"https://www.skyscanner.net/transport/flights/{origin.lower()}/{destination.lower()}"
+        f"/{depart}/{ret}/"
+    )
+
+def format_airbnb_destination(destination: str) -> str:
+    """Format a destination for Airbnb: commas become "--" and spaces become "-"."""
+    parts = [part.strip() for part in destination.split(",") if part.strip()]
+    formatted = "--".join(re.sub(r"\s+", "-", part) for part in parts)
+    return quote(formatted, safe="-")
+
+def build_airbnb_url(destination: str, checkin: str, checkout: str, adults: int = 2) -> str:
+    """Build an Airbnb homes search URL."""
+    return (
+        f"https://www.airbnb.co.uk/s/{format_airbnb_destination(destination)}/homes"
+        f"?checkin={checkin}&checkout={checkout}&adults={adults}"
+    )
+
+def _clean_location_name(text: str) -> str:
+    """Reduce a base-location line to the location name it introduces."""
+    bold = _BOLD_PATTERN.search(text)
+    name = bold.group(1) if bold else text
+    name = _LINK_PATTERN.sub(r"\1", name)
+    for separator in _NAME_SEPARATORS:
+        if separator in name:
+            name = name.split(separator, 1)[0]
+    return name.strip(" *_:-–—.").strip()
+
+def parse_base_locations(markdown: str) -> List[str]:
+    """Extract location names from the "Recommended Base Locations" section."""
+    section = extract_section(markdown, "Recommended Base Locations")
+    if not section:
+        return []
+
+    locations = []
+    for line in section.splitlines():
+        # Nested bullets describe a location rather than introduce one
+        if not line.strip() or line.startswith((" ", "\t")):
+            continue
+        stripped = line.strip()
+        if stripped.startswith("#"):
+            candidate = stripped.lstrip("#").strip()
+        else:
+            match = _LIST_ITEM_PATTERN.match(stripped)
+            if not match:
+                continue
+            candidate = match.group(1)
+
+        name = _clean_location_name(candidate)
+        if name and len(name) <= 60 and name.lower() not in (loc.lower() for loc in locations):
+            locations.append(name)
+        if len(locations) >= MAX_BASE_LOCATIONS:
+            break
+
+    return locations
+
+def render_flights_section(travel_request: TravelRequest, origin: str, destination: str) -> str:
+    """Render the Flight Information section."""
+    kayak_url = build_kayak_url(origin, destination, travel_request.depart_date, travel_request.return_date)
+    skyscanner_url = build_skyscanner_url(origin, destination, travel_request.depart_date, travel_request.return_date)
+
+    # Two trailing spaces force a markdown line break between Route and Dates
+    return "\n".join([
+        "## ✈️ Flight Information",
+        "",
+        f"**Route:** {origin.upper()} → {destination.upper()}  ",
+        f"**Dates:** {travel_request.depart_date} to {travel_request.return_date}",
+        "",
+        "### Booking Links:",
+        f"- 🔗 **[Kayak - Compare Prices]({kayak_url})**",
+        f"- 🔗 **[Skyscanner - Flexible Dates]({skyscanner_url})**",
+    ])
+
+def render_accommodation_section(travel_request: TravelRequest, base_locations: List[str]) -> str:
+    """Render the Accommodation Options section for each base location."""
+    city = travel_request.destination_city.strip()
+    country = travel_request.destination_country.strip()
+    locations = base_locations or [city]
+
+    blocks = []
+    for location in locations:
+        if location.lower() in (city.lower(), country.lower()):
+            destination = f"{city}, {country}"
+        else:
+            destination = f"{location}, {city}, {country}"
+        airbnb_url = build_airbnb_url(destination, travel_request.depart_date, travel_request.return_date)
+        blocks.append(f"#### {location}\n- 🔗 **[Browse Airbnb Properties]({airbnb_url})**")
+
+    return "## 🏠 Accommodation Options\n\n### Recommended Areas:\n\n" + "\n\n".join(blocks) + """
+
+### Booking Tips:
+- Book early for better rates and availability
+- Consider proximity to public transportation
+- Read recent reviews for the most accurate information
+- Look for properties with flexible cancellation policies"""
+
+def resolve_flight_route(travel_request: TravelRequest) -> Optional[Tuple[str, str]]:
+    """Return the (origin, destination) IATA pair, or None if either cannot be resolved locally."""
+    origin = resolve_airport_code(travel_request.departure_airport)
+    destination = resolve_airport_code(
+        travel_request.destination_airport, travel_request.destination_city, travel_request.destination_country
+    )
+    if not origin or not destination:
+        return None
+    return origin, destination
+
+def fill_flights_section(markdown: str, travel_request: TravelRequest, route: Tuple[str, str]) -> str:
+    """Replace the flights placeholder with the rendered Flight Information section."""
+    section = render_flights_section(travel_request, *route)
+    return replace_placeholder(markdown, FLIGHTS_PLACEHOLDER, section, before_heading="Travel Tips")
+
+def fill_accommodation_section(markdown: str, travel_request: TravelRequest) -> str:
+    """Replace the accommodation placeholder with the rendered Accommodation Options section."""
+    section = render_accommodation_section(travel_request, parse_base_locations(markdown))
+    return replace_placeholder(markdown, ACCOMMODATION_PLACEHOLDER, section, before_heading="Travel Tips")
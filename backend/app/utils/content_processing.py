@@ -1,22 +1,30 @@
 """
 Content processing utilities for markdown and text manipulation
 """
+from typing import Iterable, Optional, Tuple
+
+from .travel_document import TravelDocument
+
+# Agent completion markers
+COMPLETION_MARKERS = (
+    "ITINERARY_COMPLETE - Ready for ImagesAgent",
+    "IMAGES_COMPLETE - Ready for FlightsAgent",
+    "FLIGHTS_COMPLETE - Ready for AccommodationAgent",
+    "ACCOMMODATION_COMPLETE - Ready for CriticAgent",
+    "REPLAN_READY - Ready for the affected stages",
+    "TIPS_COMPLETE - Ready for CriticAgent",
+    "DAYS_COMPLETE - Ready for CriticAgent",
+    "DOCUMENT_READY"
+)
 
 def extract_markdown_content(raw_content: str) -> str:
     """Extract clean markdown content from agent response."""
     content = raw_content.strip()
     
-    # Remove agent completion markers
-    markers_to_remove = [
-        "ITINERARY_COMPLETE - Ready for ImagesAgent",
-        "IMAGES_COMPLETE - Ready for FlightsAgent", 
-        "FLIGHTS_COMPLETE - Ready for AccommodationAgent",
-        "ACCOMMODATION_COMPLETE - Ready for CriticAgent",
-        "DOCUMENT_READY"
-    ]
-    
-    for marker in markers_to_remove:
-        content = content.replace(marker, "").strip()
+    # Remove agent completion markers (usually at most one is present)
+    for marker in COMPLETION_MARKERS:
+        if marker in content:
+            content = content.replace(marker, "").strip()
     
     # Remove markdown code block markers if present
     if content.startswith('```markdown'):
@@ -28,4 +36,32 @@ def extract_markdown_content(raw_content: str) -> str:
         if content.endswith('```'):
             content = content[:-3].strip()
     
-    return content
\ No newline at end of file
+    return content
+
+def find_section_span(markdown: str, heading: str) -> Optional[Tuple[int, int]]:
+    """Return the (start, end) span of the first ``##`` section whose title contains ``heading``.
+
+    The span covers the heading line and its body, ending at the next ``#``/``##``
+    heading or ``<!-- ... -->`` placeholder line.
+    """
+    return TravelDocument(markdown).section_span(heading)
+
+def extract_section(markdown: str, heading: str) -> Optional[str]:
+    """Return the body of the first ``##`` section whose title contains ``heading``."""
+    return TravelDocument(markdown).section_body(heading)
+
+def replace_section(markdown: str, heading: str, section: str, placeholder: str = "", before_heading: str = "") -> str:
+    """Replace a section (heading included), filling its placeholder or inserting it if absent."""
+    document = TravelDocument(markdown)
+    document.replace_section(heading, section, placeholder, before_heading)
+    return str(document)
+
+def replace_placeholder(markdown: str, placeholder: str, replacement: str, before_heading: str = "") -> str:
+    """Replace a ``<!-- ... -->`` placeholder, inserting the replacement if the placeholder is missing."""
+    document = TravelDocument(markdown)
+    document.replace_placeholder(placeholder, replacement, before_heading)
+    return str(document)
+
+def keep_sections(markdown: str, headings: Iterable[str]) -> str:
+    """Reduce a document to its title, the named ``##`` sections and its placeholder lines."""
+    return TravelDocument(markdown).keep_sections(headings)
@@ -0,0 +1,173 @@
+"""
+Delta tracking for streaming a markdown document as appended text and span patches
+"""
+import time
+from typing import List, Optional, Tuple
+
+from .travel_document import TravelDocument
+
+# (offset, length, replacement): replace ``length`` units at ``offset`` with ``replacement``. Offsets and
+# lengths count UTF-16 code units, like JavaScript string indices, so clients can splice with slice()
+Patch = Tuple[int, int, str]
+
+def utf16_length(text: str) -> int:
+    """Length of ``text`` in UTF-16 code units (emoji outside the BMP count twice)."""
+    if text.isascii():
+        return len(text)
+    return len(text.encode("utf-16-le")) // 2
+
+def apply_patch(document: str, patch: Patch) -> str:
+    """Apply a patch to ``document``, the way a client applies a ``delta`` message."""
+    offset, length, content = patch
+    if document.isascii():
+        return document[:offset] + content + document[offset + length:]
+    units = document.encode("utf-16-le")
+    return (units[:2 * offset] + content.encode("utf-16-le") + units[2 * (offset + length):]).decode("utf-16-le")
+
+def _common_prefix_length(old: str, new: str) -> int:
+    """Length of the shared prefix, found with C-level slice comparisons."""
+    low, high = 0, min(len(old), len(new))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if old[:middle] == new[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+def _common_suffix_length(old: str, new: str, limit: int) -> int:
+    """Length of the shared suffix, capped at ``limit`` so it never overlaps the prefix."""
+    low, high = 0, limit
+    while low < high:
+        middle = (low + high + 1) // 2
+        if old[len(old) - middle:] == new[len(new) - middle:]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+def diff_documents(old: str, new: str) -> Optional[Patch]:
+    """Return the single span patch that turns ``old`` into ``new``, or None if equal."""
+    if old == new:
+        return None
+    prefix = _common_prefix_length(old, new)
+    suffix = _common_suffix_length(old, new, min(len(old), len(new)) - prefix)
+    if old.isascii():
+        return prefix, len(old) - prefix - suffix, new[prefix:len(new) - suffix]
+    return utf16_length(old[:prefix]), utf16_length(old[prefix:len(old) - suffix]), new[prefix:len(new) - suffix]
+
+class DocumentDeltaTracker:
+    """Mirrors the client's copy of the document and produces the patches that keep it in sync.
+
+    Tokens from the agent drafting the first document are appended as they arrive
+    (after dropping an opening code fence); every later document version is sent
+    as a single span patch against what the client already has. The mirror is a
+    ``TravelDocument`` whose section index is updated incrementally as tokens arrive.
+    """
+
+    def __init__(self):
+        self.travel_document = TravelDocument()
+        self._units = 0
+        self._draft_agent: Optional[str] = None
+        self._draft_closed = False
+        self._draft_started = False
+        self._pending = ""
+
+    def append_draft(self, agent: str, text: str) -> Optional[Patch]:
+        """Append streamed tokens of the first draft; tokens from other agents are ignored."""
+        if self._draft_closed:
+            return None
+        if self._draft_agent is None:
+            self._draft_agent = agent
+        elif agent != self._draft_agent:
+            return None
+
+        if not self._draft_started:
+            text = self._strip_opening_fence(text)
+            if not text:
+                return None
+
+        offset = self._units
+        self.travel_document.append(text)
+        self._units += utf16_length(text)
+        return offset, 0, text
+
+    def _strip_opening_fence(self, text: str) -> str:
+        """Hold back leading text until it is clear whether it opens a ``` fence."""
+        self._pending += text
+        head = self._pending.lstrip()
+        if not head:
+            return ""
+        if head.startswith("`"):
+            if "\n" not in head:
+                # Still inside a possible "```markdown" line
+                if len(head) < 3 or head.startswith("```"):
+                    return ""
+            elif head.startswith("```"):
+                head = head.split("\n", 1)[1].lstrip()
+                if not head:
+                    return ""
+        self._draft_started = True
+        self._pending = ""
+        return head
+
+    def update(self, document: str) -> Optional[Patch]:
+        """Replace the document with a new version, returning the patch for the client."""
+        self._draft_closed = True
+        patch = diff_documents(self.document, document)
+        self.travel_document = TravelDocument(document)
+        self._units = utf16_length(document)
+        return patch
+
+    @property
+    def document(self) -> str:
+        return str(self.travel_document)
+
+    @property
+    def length(self) -> int:
+        """Document length in UTF-16 code units, the unit of patch offsets."""
+        return self._units
+
+class PatchCoalescer:
+    """Merges patches that continue one another (streamed tokens) into one, so each frame carries more text.
+
+    A pending patch is released once it is ``window`` seconds old or holds ``max_chars``
+    characters, when the next patch does not continue it, or on ``flush``. Each patch
+    is kept with the document length after it, for the frame's ``character_count``.
+    """
+
+    def __init__(self, window: float, max_chars: int):
+        self._window = window
+        self._max_chars = max_chars
+        self._pending: Optional[Patch] = None
+        self._end = 0
+        self._length = 0
+        self._started = 0.0
+
+    def add(self, patch: Patch, length: int) -> List[Tuple[Patch, int]]:
+        """Take a patch and the document length after it; returns the patches ready to send."""
+        ready = []
+        if self._pending is not None:
+            offset, replaced, content = self._pending
+            if patch[0] == self._end:
+                # Starts where the pending one ends: replace both spans at once
+                self._pending = (offset, replaced + patch[1], content + patch[2])
+                self._end += utf16_length(patch[2])
+            else:
+                ready.append((self._pending, self._length))
+                self._pending = None
+        if self._pending is None:
+            self._pending = patch
+            self._end = patch[0] + utf16_length(patch[2])
+            self._started = time.monotonic()
+        self._length = length
+        if len(self._pending[2]) >= self._max_chars or time.monotonic() - self._started >= self._window:
+            ready.extend(self.flush())
+        return ready
+
+    def flush(self) -> List[Tuple[Patch, int]]:
+        """Release the pending patch, if any."""
+        if self._pending is None:
+            return []
+        pending, self._pending = self._pending, None
+        return [(pending, self._length)]
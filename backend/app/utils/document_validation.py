@@ -0,0 +1,129 @@
+"""
+Rule-based checks of the finished travel document against its earlier versions, with local repairs
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Sequence, Tuple
+
+from .travel_document import TravelDocument
+
+# Links added by the pipeline that later stages must preserve
+TRACKED_LINK_MARKERS = ("tbm=isch", "kayak.", "skyscanner.", "airbnb.")
+
+_DAY_HEADING = re.compile(r"^###\s*Day\s+(\d+)\b", re.MULTILINE)
+_FENCE = re.compile(r"^\s*```", re.MULTILINE)
+_LINK_MARKUP = re.compile(r"\[[^\]\n]*\]\([^)\s]+\)")
+_HEADING_DECORATION = re.compile(r"^[#\W_]+")
+
+@dataclass
+class ValidationReport:
+    """Outcome of validating a document: the (repaired) document, repairs made and remaining issues."""
+    document: str
+    issues: List[str] = field(default_factory=list)
+    repairs: List[str] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.issues
+
+def _is_tracked(url: str) -> bool:
+    return any(marker in url for marker in TRACKED_LINK_MARKERS)
+
+def _section_name(block: str) -> str:
+    """Heading text of a ``##`` block without its emoji, usable with ``TravelDocument.find``."""
+    return _HEADING_DECORATION.sub("", block.split("\n", 1)[0]).strip()
+
+def _reference_links(previous: Sequence[TravelDocument]) -> Dict[str, Tuple[str, str]]:
+    """Tracked link URL -> (link text, section name), taken from the newest version containing it."""
+    links: Dict[str, Tuple[str, str]] = {}
+    for version in reversed(previous):
+        for block in version.blocks:
+            if not block.startswith("##"):
+                continue
+            for text, url in TravelDocument(block).links():
+                if _is_tracked(url):
+                    links.setdefault(url, (text, _section_name(block)))
+    return links
+
+def _link_text(document: str, text: str, url: str) -> str:
+    """Turn the first occurrence of ``text`` outside any link back into a link to ``url``; unchanged if there is none."""
+    links = [match.span() for match in _LINK_MARKUP.finditer(document)]
+    for match in re.finditer(re.escape(text), document):
+        start, end = match.span()
+        if any(link_start < end and start < link_end for link_start, link_end in links):
+            continue
+        return document[:start] + f"[{text}]({url})" + document[end:]
+    return document
+
+def _restore_sections(document: TravelDocument, reference: TravelDocument, report: ValidationReport) -> None:
+    """Put back ``##`` sections of the previous version that the document lost."""
+    for block in reference.blocks:
+        if not block.startswith("## "):
+            continue
+        name = _section_name(block)
+        if not name or document.find(name) is not None:
+            continue
+        document.replace_section(name, block, before_heading="Travel Tips")
+        report.repairs.append(f"restored section '{name}'")
+
+def _restore_links(document: TravelDocument, previous: Sequence[TravelDocument], report: ValidationReport) -> None:
+    """Re-link text whose tracked link was dropped, section by section."""
+    current = str(document)
+    dropped = {url: source for url, source in _reference_links(previous).items() if url not in current}
+    for url, (text, section_name) in dropped.items():
+        section = document.section(section_name)
+        if section is not None:
+            relinked = _link_text(section, text, url)
+            if relinked != section:
+                document.replace_section(section_name, relinked)
+                report.repairs.append(f"restored link '{text}'")
+                continue
+        report.issues.append(f"dropped link '{text}' ({url})")
+
+def _check_days(document: TravelDocument, previous: Sequence[TravelDocument], expected_days: int, report: ValidationReport) -> None:
+    days = {int(day) for day in _DAY_HEADING.findall(str(document))}
+    expected = set(range(1, expected_days + 1)) if expected_days else set()
+    for version in previous:
+        expected.update(int(day) for day in _DAY_HEADING.findall(str(version)))
+    missing = sorted(expected - days)
+    if missing:
+        report.issues.append("missing days: " + ", ".join(str(day) for day in missing))
+
+def _check_truncation(text: str, previous: Sequence[TravelDocument], report: ValidationReport) -> None:
+    if len(_FENCE.findall(text)) % 2:
+        report.issues.append("truncated: unclosed code block")
+    last_line = text.rstrip().rsplit("\n", 1)[-1]
+    if last_line.count("[") > last_line.count("]") or last_line.count("(") > last_line.count(")") \
+            or last_line.count("**") % 2:
+        report.issues.append("truncated: last line ends mid-markup")
+    if previous and len(text) < 0.6 * len(previous[-1]):
+        report.issues.append(f"truncated: {len(text)} characters, previous version had {len(previous[-1])}")
+
+def validate_document(document: str, previous: Sequence[str] = (), expected_days: int = 0) -> ValidationReport:
+    """Check a finished document for leftover placeholders, dropped links, missing days and truncation.
+
+    ``previous`` are earlier versions of the document (oldest first). Sections and
+    tracked links (Google Images, Kayak, Skyscanner, Airbnb) the document lost are
+    restored from them; everything else that fails is reported in ``issues``.
+    """
+    versions = [TravelDocument(version) for version in previous if version]
+    indexed = TravelDocument(document)
+    report = ValidationReport(document)
+
+    if not document.lstrip().startswith("# "):
+        report.issues.append("document does not start with a '# ' title")
+
+    _check_truncation(document, versions, report)
+    truncated = any(issue.startswith("truncated") for issue in report.issues)
+    if versions and not truncated:
+        # Sections lost mid-document come back from the last version; a cut-off tail is left to the critic
+        _restore_sections(indexed, versions[-1], report)
+    _restore_links(indexed, versions, report)
+
+    placeholders = indexed.placeholders
+    if placeholders or "PLACEHOLDER" in str(indexed):
+        report.issues.append("placeholders remain: " + ", ".join(placeholders or ["PLACEHOLDER"]))
+    _check_days(indexed, versions, expected_days, report)
+
+    report.document = str(indexed)
+    return report
@@ -0,0 +1,156 @@
+"""
+Local landmark extraction and Google Images linking for the Day-by-Day Itinerary section
+"""
+import re
+from typing import List, Optional, Set, Tuple
+from urllib.parse import quote_plus
+
+from .content_processing import find_section_span
+
+ITINERARY_HEADING = "Day-by-Day Itinerary"
+
+# Articles, prepositions and conjunctions: trimmed from both ends of a candidate span
+FUNCTION_WORDS = frozenset("""
+a an the and or of in on at to for from with by via into near around
+""".split())
+
+# Verbs, times of day and sequencing words that open activity text ("Visit Senso-ji"): trimmed from the start
+LEADING_WORDS = FUNCTION_WORDS | frozenset("""
+morning afternoon evening night day days today tonight arrival departure return
+visit explore enjoy take head check grab stroll wander discover relax start end finish continue
+try see experience spend book catch shop shopping optional free time local
+then after before later next final last first
+""".split())
+
+# Words that never make a landmark on their own; a candidate made only of these is dropped,
+# but they stay part of a longer name ("Tokyo Station", "Blue Bottle Cafe")
+STOP_WORDS = LEADING_WORDS | frozenset("""
+hotel hostel ryokan airbnb accommodation lunch dinner breakfast brunch snack coffee cafe meal food
+train bus taxi metro subway tram ferry flight airport station transfer walk walking tour tours
+""".split())
+
+# Capitalized (or accented capital) word, allowing hyphens, apostrophes and inner dots ("Senso-ji", "Île");
+# a dot followed by a space ends the word, and the sentence, unless it closes a title or initials
+# ("St. Paul's", "U.S. Embassy")
+_ABBREVIATION = r"(?:(?:St|Ste|Mt|Ft)\.|(?:[A-Z]\.){2,})(?=\s)"
+_WORD = rf"(?:{_ABBREVIATION}|[A-ZÀ-ÖØ-Þ](?:[\w'’-]|\.(?=\w))*)"
+_CONNECTOR = r"(?:of|the|de|la|le|del|da|di|du|no|van|von)"
+_PROPER_NOUN_PATTERN = re.compile(rf"{_WORD}(?:\s+(?:{_CONNECTOR}\s+)*{_WORD})*")
+# Segments that must not be rewritten: existing links, bare URLs and inline code
+_PROTECTED_PATTERN = re.compile(r"\[[^\]]*\]\([^)]*\)|https?://\S+|`[^`]*`")
+_BOLD_PATTERN = re.compile(r"\*\*(.+?)\*\*")
+_BULLET_PATTERN = re.compile(r"^(\s*(?:[-*+]|\d+[.)])\s+)(.*)$")
+
+def build_google_images_url(location: str) -> str:
+    """Build a Google Images search URL: spaces become + and commas become %2C."""
+    query = quote_plus(location.strip(), safe="'-.")
+    return f"https://www.google.com/search?q={query}&tbm=isch"
+
+def _trim_span(words: List[str]) -> List[str]:
+    """Drop leading verbs and articles, and trailing connectors, from a candidate span."""
+    while words and words[0].lower().strip(".") in LEADING_WORDS:
+        words = words[1:]
+    while words and words[-1].lower().strip(".") in FUNCTION_WORDS:
+        words = words[:-1]
+    return words
+
+def _clean_candidate(text: str) -> Optional[str]:
+    """Normalize a candidate place name, returning None when it is generic."""
+    words = _trim_span(text.replace("’", "'").split())
+    if not words or all(word.lower().strip(".") in STOP_WORDS for word in words):
+        return None
+    name = " ".join(words).strip(" .,;:!?")
+    if len(name) < 3 or not any(char.isupper() for char in name):
+        return None
+    return name
+
+def _proper_noun_spans(text: str, at_line_start: bool) -> List[Tuple[int, int, str]]:
+    """Find capitalized multi-word spans (and mid-sentence single words) in plain text."""
+    spans = []
+    for match in _PROPER_NOUN_PATTERN.finditer(text):
+        raw = match.group(0).rstrip(".")
+        words = raw.split()
+        # A single capitalized word at the start of a bullet or sentence is usually a verb
+        preceding = text[:match.start()].rstrip()
+        sentence_start = (at_line_start and not preceding) or preceding.endswith((".", "!", "?", ":"))
+        if sentence_start and words and words[0].lower() in LEADING_WORDS:
+            words = words[1:]
+        name = _clean_candidate(" ".join(words))
+        if not name:
+            continue
+        if len(name.split()) == 1 and sentence_start:
+            continue
+        start = match.start() + raw.find(name)
+        spans.append((start, start + len(name), name))
+    return spans
+
+def _link_plain_text(text: str, seen: Set[str], at_line_start: bool) -> str:
+    """Link bold spans first, then proper-noun spans, skipping names already linked."""
+    output = []
+    position = 0
+
+    for match in _BOLD_PATTERN.finditer(text):
+        output.append(_link_proper_nouns(text[position:match.start()], seen, at_line_start and position == 0))
+        inner = match.group(1)
+        name = _clean_candidate(inner)
+        if name and name.lower() not in seen and "](" not in inner:
+            seen.add(name.lower())
+            start = inner.find(name)
+            inner = f"{inner[:start]}[{name}]({build_google_images_url(name)}){inner[start + len(name):]}"
+        output.append(f"**{inner}**")
+        position = match.end()
+
+    output.append(_link_proper_nouns(text[position:], seen, at_line_start and position == 0))
+    return "".join(output)
+
+def _link_proper_nouns(text: str, seen: Set[str], at_line_start: bool) -> str:
+    """Wrap proper-noun spans of unbolded text in Google Images links."""
+    output = []
+    position = 0
+    for start, end, name in _proper_noun_spans(text, at_line_start):
+        if name.lower() in seen:
+            continue
+        seen.add(name.lower())
+        output.append(text[position:start])
+        output.append(f"[{name}]({build_google_images_url(name)})")
+        position = end
+    output.append(text[position:])
+    return "".join(output)
+
+def link_activity_line(line: str, seen: Set[str]) -> str:
+    """Add Google Images links to the place names in a single activity bullet."""
+    bullet = _BULLET_PATTERN.match(line)
+    if not bullet:
+        return line
+
+    prefix, body = bullet.groups()
+    output = [prefix]
+    position = 0
+    for protected in _PROTECTED_PATTERN.finditer(body):
+        output.append(_link_plain_text(body[position:protected.start()], seen, position == 0))
+        output.append(protected.group(0))
+        position = protected.end()
+    output.append(_link_plain_text(body[position:], seen, position == 0))
+    return "".join(output)
+
+def link_day_entries(text: str) -> str:
+    """Add Google Images links to the activity bullets of ``### Day`` entries."""
+    seen: Set[str] = set()
+    lines = []
+    for line in text.split("\n"):
+        # Each day links its own landmarks, even when a place recurs across days
+        if line.lstrip().startswith("### "):
+            seen = set()
+            lines.append(line)
+            continue
+        lines.append(link_activity_line(line, seen))
+    return "\n".join(lines)
+
+def add_itinerary_image_links(markdown: str) -> str:
+    """Rewrite the Day-by-Day Itinerary section with Google Images links in one pass."""
+    span = find_section_span(markdown, ITINERARY_HEADING)
+    if span is None:
+        return markdown
+
+    start, end = span
+    return markdown[:start] + link_day_entries(markdown[start:end]) + markdown[end:]
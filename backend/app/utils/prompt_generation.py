@@ -4,13 +4,19 @@ Prompt generation utilities for AI agents
 from datetime import datetime
 from ..models.travel import TravelRequest
 
+def trip_duration_days(request: TravelRequest) -> int:
+    """Trip duration in days, as stated in the travel prompt."""
+    depart_dt = datetime.strptime(request.depart_date, "%Y-%m-%d")
+    return_dt = datetime.strptime(request.return_date, "%Y-%m-%d")
+    return (return_dt - depart_dt).days
+
 def generate_travel_prompt(request: TravelRequest) -> str:
     """Generate a natural travel request prompt from structured input."""
     
     # Calculate trip duration
     depart_dt = datetime.strptime(request.depart_date, "%Y-%m-%d")
     return_dt = datetime.strptime(request.return_date, "%Y-%m-%d")
-    duration = (return_dt - depart_dt).days
+    duration = trip_duration_days(request)
     
     # Format dates nicely for the prompt
     depart_formatted = depart_dt.strftime("%B %d, %Y")
@@ -0,0 +1,222 @@
+"""
+Section-indexed travel plan document: parse once, splice sections in place, render losslessly
+"""
+import re
+from bisect import bisect_right
+from functools import lru_cache
+from itertools import accumulate
+from typing import Iterable, List, Optional, Tuple
+
+# A block starts at a ``#``/``##`` heading or a ``<!-- ... -->`` placeholder line
+_BOUNDARY = re.compile(r"^(?:##?\s|<!--)", re.MULTILINE)
+_SECTION_HEADING = re.compile(r"##\s")
+_PLACEHOLDER_LINE = re.compile(r"<!--.*-->\s*$")
+_LINK = re.compile(r"\[([^\]\n]*)\]\(([^)\s]+)\)")
+
+def _split_blocks(text: str) -> List[str]:
+    """Split text at block boundaries; the first block may be a heading-less preamble."""
+    starts = [match.start() for match in _BOUNDARY.finditer(text)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    return [text[start:end] for start, end in zip(starts, starts[1:] + [len(text)])]
+
+@lru_cache(maxsize=1024)
+def _block_links(block: str) -> Tuple[Tuple[str, str], ...]:
+    return tuple(_LINK.findall(block))
+
+def _heading_line(block: str) -> str:
+    newline = block.find("\n")
+    return block if newline < 0 else block[:newline]
+
+class TravelDocument:
+    """A markdown travel plan held as a list of blocks with a section index.
+
+    Blocks are the document split at ``#``/``##`` headings and ``<!-- ... -->``
+    placeholder lines (``###`` day headings stay inside their section), the same
+    boundaries ``find_section_span`` always used. Joining the blocks gives back the
+    exact input, so parsing and rendering is lossless. Replacing a section only
+    touches that section's text; offsets are derived from block lengths on demand.
+    ``append`` extends the document as streamed text arrives, rescanning only the
+    last line and the new text.
+    """
+
+    def __init__(self, markdown: str = ""):
+        self._blocks: List[str] = _split_blocks(markdown) if markdown else []
+        self._length = len(markdown)
+        self._text: Optional[str] = markdown
+
+    # Rendering
+
+    def __str__(self) -> str:
+        if self._text is None:
+            self._text = "".join(self._blocks)
+        return self._text
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, TravelDocument):
+            return str(self) == str(other)
+        return NotImplemented
+
+    def _changed(self) -> None:
+        self._text = None
+        self._length = sum(len(block) for block in self._blocks)
+
+    # Index
+
+    @property
+    def blocks(self) -> Tuple[str, ...]:
+        return tuple(self._blocks)
+
+    @property
+    def title(self) -> str:
+        """Everything ahead of the first ``##`` section (normally the ``#`` title)."""
+        parts = []
+        for block in self._blocks:
+            if _SECTION_HEADING.match(block):
+                break
+            parts.append(block)
+        return "".join(parts).strip()
+
+    @property
+    def headings(self) -> List[str]:
+        """Heading lines of the ``##`` sections, in document order."""
+        return [_heading_line(block).strip() for block in self._blocks if _SECTION_HEADING.match(block)]
+
+    @property
+    def placeholders(self) -> List[str]:
+        """Placeholder lines (``<!-- ... -->``) still in the document."""
+        return [
+            _heading_line(block).strip() for block in self._blocks
+            if block.startswith("<!--") and _PLACEHOLDER_LINE.match(_heading_line(block))
+        ]
+
+    def links(self, heading: Optional[str] = None) -> List[Tuple[str, str]]:
+        """(text, url) of every markdown link, or only those of one section."""
+        if heading is not None:
+            index = self.find(heading)
+            return list(_block_links(self._blocks[index])) if index is not None else []
+        return [link for block in self._blocks for link in _block_links(block)]
+
+    def find(self, heading: str) -> Optional[int]:
+        """Block index of the first ``##`` section whose heading line contains ``heading`` (case-insensitive)."""
+        needle = heading.lower()
+        for index, block in enumerate(self._blocks):
+            if _SECTION_HEADING.match(block) and needle in _heading_line(block).lower():
+                return index
+        return None
+
+    def offset(self, index: int) -> int:
+        """Character offset of a block."""
+        return sum(len(block) for block in self._blocks[:index])
+
+    def block_at(self, offset: int) -> int:
+        """Index of the block containing a character offset."""
+        ends = list(accumulate(len(block) for block in self._blocks))
+        return min(bisect_right(ends, offset), len(self._blocks) - 1)
+
+    def section_span(self, heading: str) -> Optional[Tuple[int, int]]:
+        """(start, end) character span of a section, heading line included."""
+        index = self.find(heading)
+        if index is None:
+            return None
+        start = self.offset(index)
+        return start, start + len(self._blocks[index])
+
+    def section(self, heading: str) -> Optional[str]:
+        """A section's text, heading line included."""
+        index = self.find(heading)
+        return self._blocks[index] if index is not None else None
+
+    def section_body(self, heading: str) -> Optional[str]:
+        """A section's text without its heading line."""
+        section = self.section(heading)
+        if section is None:
+            return None
+        return section.split("\n", 1)[1].strip() if "\n" in section else ""
+
+    # Editing
+
+    def splice(self, index: int, count: int, text: str) -> None:
+        """Replace ``count`` blocks starting at ``index`` with ``text`` (re-indexed).
+
+        Text that does not start a block joins the previous one, and a following block
+        joins the text when it no longer starts on a line of its own.
+        """
+        start, end = index, index + count
+        if start > 0 and not _BOUNDARY.match(text):
+            start -= 1
+            text = self._blocks[start] + text
+        if end < len(self._blocks) and text and not text.endswith("\n"):
+            text += self._blocks[end]
+            end += 1
+        self._blocks[start:end] = _split_blocks(text) if text else []
+        self._changed()
+
+    def replace_section(self, heading: str, section: str, placeholder: str = "", before_heading: str = "") -> None:
+        """Replace a section (heading included), filling its placeholder or inserting it if absent."""
+        index = self.find(heading)
+        if index is None:
+            self.replace_placeholder(placeholder, section, before_heading)
+            return
+        following = any(block for block in self._blocks[index + 1:])
+        self.splice(index, 1, section.strip() + ("\n\n" if following else ""))
+
+    def replace_placeholder(self, placeholder: str, replacement: str, before_heading: str = "") -> None:
+        """Replace a ``<!-- ... -->`` placeholder, inserting the replacement if the placeholder is missing."""
+        if placeholder:
+            for index, block in enumerate(self._blocks):
+                if placeholder in block:
+                    self.splice(index, 1, block.replace(placeholder, replacement.strip(), 1))
+                    return
+
+        # Fall back to inserting ahead of the given section, or appending at the end
+        if before_heading:
+            index = self.find(before_heading)
+            if index is not None:
+                self.splice(index, 0, replacement.strip() + "\n\n")
+                return
+
+        if not self._blocks:
+            self.splice(0, 0, replacement.strip())
+            return
+        # Only the last block changes: it loses its trailing whitespace and gains the replacement
+        last = len(self._blocks) - 1
+        self.splice(last, 1, self._blocks[last].rstrip() + "\n\n" + replacement.strip())
+
+    def keep_sections(self, headings: Iterable[str]) -> str:
+        """Render only the title, the named ``##`` sections and the placeholder lines."""
+        parts = [self.title]
+        for heading in headings:
+            section = self.section(heading)
+            if section is not None:
+                parts.append(section.strip())
+        parts.extend(self.placeholders)
+        return "\n\n".join(part.strip() for part in parts if part.strip())
+
+    # Incremental parsing
+
+    def append(self, text: str) -> None:
+        """Extend the document with streamed text, updating the index incrementally.
+
+        Only the last (possibly partial) line of the document can turn into a new
+        boundary, so it is rescanned together with ``text``; earlier blocks are untouched.
+        """
+        if not text:
+            return
+        if not self._blocks:
+            self._blocks = _split_blocks(text)
+        else:
+            last = self._blocks[-1]
+            line_start = last.rfind("\n") + 1
+            pieces = _split_blocks(last[line_start:] + text)
+            if line_start and _BOUNDARY.match(pieces[0]):
+                self._blocks[-1] = last[:line_start]
+                self._blocks.extend(pieces)
+            else:
+                self._blocks[-1] = last[:line_start] + pieces[0]
+                self._blocks.extend(pieces[1:])
+        self._length += len(text)
+        self._text = None
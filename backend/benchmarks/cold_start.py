@@ -0,0 +1,117 @@
+"""
+Cold start of main.py: time until the server answers, is ready and has served its first plan
+
+Each run starts ``python main.py`` on a free local port with the fake model client and
+polls until ``/health`` answers (listening), ``/health/ready`` returns 200 (agent stack
+loaded, model clients built) and a first plan has streamed to completion. Runs alternate
+between the background warm-up (SERVER_WARMUP=true) and loading everything on first use.
+
+Usage:
+    python -m benchmarks.cold_start [--runs N] [--warmup on off] [--profile instant]
+                                    [--env KEY=VALUE ...] [--output results.json]
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.common import BACKEND_DIR, summarize_ms, write_report  # noqa: E402
+from benchmarks.load import _free_port, build_request, run_plan  # noqa: E402
+
+async def _wait_for(client: httpx.AsyncClient, url: str, started: float, timeout: float) -> float:
+    """Seconds from ``started`` until ``url`` returns 200."""
+    while True:
+        try:
+            if (await client.get(url)).status_code == 200:
+                return time.perf_counter() - started
+        except httpx.TransportError:
+            pass
+        if time.perf_counter() - started > timeout:
+            raise RuntimeError(f"{url} did not answer within {timeout}s")
+        await asyncio.sleep(0.01)
+
+async def measure(base_url: str, started: float, timeout: float) -> dict:
+    async with httpx.AsyncClient(timeout=None) as client:
+        live = await _wait_for(client, f"{base_url}/health", started, timeout)
+        ready = await _wait_for(client, f"{base_url}/health/ready", started, timeout)
+        plan = await run_plan(client, f"{base_url}/generate-travel-plan", build_request(0, 3, "full"))
+        first_plan = time.perf_counter() - started
+    return {"live": live, "ready": ready, "first_plan": first_plan, "first_plan_latency": plan["latency"],
+            "ok": plan["ok"]}
+
+def run_once(env: dict, timeout: float) -> dict:
+    port = _free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "main.py"],
+        cwd=BACKEND_DIR,
+        env={**os.environ, **env, "SERVER_HOST": "127.0.0.1", "SERVER_PORT": str(port)},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        return asyncio.run(measure(f"http://127.0.0.1:{port}", started, timeout))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+def import_seconds(module: str) -> float:
+    """Import time of ``module`` in a fresh interpreter."""
+    code = f"import time; started = time.perf_counter(); import {module}; print(time.perf_counter() - started)"
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    ).stdout
+    return float(output.strip())
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5, help="Server starts per warm-up setting")
+    parser.add_argument("--warmup", nargs="+", default=["on", "off"], choices=("on", "off"))
+    parser.add_argument("--profile", default="instant", help="Fake model latency profile")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Give up on a start after this many seconds")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Extra environment for the started servers")
+    parser.add_argument("--output", help="Write the JSON results to this file as well")
+    args = parser.parse_args()
+
+    env = {
+        "MODEL_CLIENT": "fake",
+        "FAKE_MODEL_PROFILE": args.profile,
+        "PLAN_CACHE_ENABLED": "false",
+        "DESTINATION_CACHE_ENABLED": "false",
+    }
+    env.update(item.split("=", 1) for item in args.env)
+
+    imports = {module: [] for module in ("app.api", "app.services.travel_planner")}
+    for _ in range(args.runs):
+        for module, seconds in imports.items():
+            seconds.append(import_seconds(module))
+
+    runs = {}
+    for warmup in args.warmup:
+        results = [run_once({**env, "SERVER_WARMUP": str(warmup == "on").lower()}, args.timeout)
+                   for _ in range(args.runs)]
+        runs[warmup] = {
+            "runs": len(results),
+            "failed": sum(not result["ok"] for result in results),
+            **{f"{key}_ms": summarize_ms([result[key] for result in results])
+               for key in ("live", "ready", "first_plan", "first_plan_latency")},
+        }
+
+    write_report({
+        "benchmark": "cold_start",
+        "config": {"runs": args.runs, "profile": args.profile, "server_env": env},
+        "import_ms": {module: summarize_ms(seconds) for module, seconds in imports.items()},
+        "warmup": runs,
+    }, args.output)
+    return 0 if all(run["failed"] == 0 for run in runs.values()) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,50 @@
+"""
+Shared helpers for the benchmark scripts: percentiles, run metadata and JSON reports
+"""
+import json
+import math
+import statistics
+import subprocess
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional, Sequence
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+def percentile(values: Sequence[float], fraction: float) -> Optional[float]:
+    """Linearly interpolated percentile (``fraction`` in 0..1) of the values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower, upper = math.floor(position), math.ceil(position)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+def summarize_ms(seconds: Sequence[float]) -> Optional[dict]:
+    """Summarize durations in seconds as milliseconds: mean, p50, p95, p99 and max."""
+    if not seconds:
+        return None
+    return {
+        "mean": round(statistics.mean(seconds) * 1000, 3),
+        "p50": round(percentile(seconds, 0.50) * 1000, 3),
+        "p95": round(percentile(seconds, 0.95) * 1000, 3),
+        "p99": round(percentile(seconds, 0.99) * 1000, 3),
+        "max": round(max(seconds) * 1000, 3),
+    }
+
+def git_commit() -> Optional[str]:
+    """Short hash of the checked-out commit, so results can be compared across commits."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def write_report(report: dict, output: Optional[str]) -> None:
+    """Stamp the report with the commit and time, print it and optionally write it to a file."""
+    report = {**report, "commit": git_commit(), "timestamp": datetime.now(timezone.utc).isoformat()}
+    text = json.dumps(report, indent=2)
+    print(text)
+    if output:
+        Path(output).write_text(text + "\n", encoding="utf-8")
@@ -0,0 +1,108 @@
+"""
+Benchmark the local Google Images linker against recorded ImagesAgent output
+
+Each recording is a pair of documents in the recordings directory:
+- ``<name>.before.md``: the ItineraryAgent document handed to ImagesAgent
+- ``<name>.after.md``: the document ImagesAgent returned
+An optional ``<name>.json`` sidecar with ``latency_seconds`` records how long the LLM turn took.
+
+Usage:
+    python -m benchmarks.image_linker [recordings_dir] [--repeat N] [--output results.json]
+"""
+import argparse
+import json
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.utils.content_processing import extract_markdown_content  # noqa: E402
+from app.utils.image_links import add_itinerary_image_links  # noqa: E402
+
+RECORDINGS_DIR = Path(__file__).resolve().parent / "recordings"
+_IMAGE_LINK_PATTERN = re.compile(r"\]\((https://www\.google\.com/search\?[^)]*tbm=isch[^)]*)\)")
+
+def _normalize(name: str) -> str:
+    """Compare link targets loosely: case, punctuation and spacing are ignored."""
+    return re.sub(r"[^a-z0-9]+", " ", name.lower()).strip()
+
+def image_link_targets(markdown: str) -> set:
+    """Return the normalized search terms of all Google Images links in a document."""
+    targets = set()
+    for url in _IMAGE_LINK_PATTERN.findall(markdown):
+        query = parse_qs(urlparse(url).query).get("q", [""])[0]
+        if query:
+            targets.add(_normalize(query))
+    return targets
+
+def benchmark_recording(before_path: Path, repeat: int) -> dict:
+    """Time the local linker on one recording and score it against the LLM links."""
+    name = before_path.name[:-len(".before.md")]
+    before = extract_markdown_content(before_path.read_text(encoding="utf-8"))
+    after = extract_markdown_content(before_path.with_name(f"{name}.after.md").read_text(encoding="utf-8"))
+
+    timings = []
+    linked = before
+    for _ in range(repeat):
+        started = time.perf_counter()
+        linked = add_itinerary_image_links(before)
+        timings.append(time.perf_counter() - started)
+
+    expected = image_link_targets(after) - image_link_targets(before)
+    produced = image_link_targets(linked) - image_link_targets(before)
+    matched = expected & produced
+
+    result = {
+        "recording": name,
+        "document_chars": len(before),
+        "local_median_ms": round(statistics.median(timings) * 1000, 4),
+        "llm_links": len(expected),
+        "local_links": len(produced),
+        "recall": round(len(matched) / len(expected), 4) if expected else None,
+        "precision": round(len(matched) / len(produced), 4) if produced else None,
+        "missed": sorted(expected - produced),
+        "extra": sorted(produced - expected),
+    }
+
+    sidecar = before_path.with_name(f"{name}.json")
+    if sidecar.exists():
+        latency = json.loads(sidecar.read_text(encoding="utf-8")).get("latency_seconds")
+        if latency:
+            result["llm_latency_ms"] = round(latency * 1000, 1)
+            result["speedup"] = round(latency * 1000 / max(result["local_median_ms"], 1e-6))
+    return result
+
+def main() -> int:
+    """Run the benchmark over every recording and print JSON results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("recordings", nargs="?", default=str(RECORDINGS_DIR))
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--output", help="Write the JSON results to this file as well")
+    args = parser.parse_args()
+
+    recordings = sorted(Path(args.recordings).glob("*.before.md"))
+    if not recordings:
+        print(f"No recordings found in {args.recordings}", file=sys.stderr)
+        return 1
+
+    results = [benchmark_recording(path, args.repeat) for path in recordings]
+    recalls = [result["recall"] for result in results if result["recall"] is not None]
+    report = {
+        "benchmark": "image_linker",
+        "recordings": results,
+        "mean_recall": round(statistics.mean(recalls), 4) if recalls else None,
+        "total_local_median_ms": round(sum(result["local_median_ms"] for result in results), 4),
+    }
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+"""
+Load-test /generate-travel-plan with concurrent streaming clients
+
+By default a server is started on a free local port with the fake model client
+(MODEL_CLIENT=fake) and the plan cache disabled, so no Azure calls are made.
+Pass --url to drive an already running server instead.
+
+Usage:
+    python -m benchmarks.load [--concurrency N] [--requests N] [--profile fast]
+                              [--recording recordings/tokyo_3day.agents.json]
+                              [--stream-mode full|delta] [--workers N] [--env KEY=VALUE ...]
+                              [--url http://host:port] [--output results.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Optional
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.common import BACKEND_DIR, summarize_ms, write_report  # noqa: E402
+
+DESTINATIONS = [
+    ("Tokyo", "Japan"), ("Paris", "France"), ("London", "United Kingdom"), ("New York", "USA"),
+    ("Rome", "Italy"), ("Bangkok", "Thailand"), ("Lisbon", "Portugal"), ("Mexico City", "Mexico"),
+]
+
+def build_request(index: int, days: int, stream_mode: str) -> dict:
+    """A distinct travel request per index, so runs exercise generation rather than caches."""
+    city, country = DESTINATIONS[index % len(DESTINATIONS)]
+    depart = date(2026, 1, 1) + timedelta(days=index)
+    return {
+        "destination_city": city,
+        "destination_country": country,
+        "depart_date": depart.isoformat(),
+        "return_date": (depart + timedelta(days=days)).isoformat(),
+        "priority": "all",
+        "budget_level": "moderate",
+        "departure_airport": "LHR",
+        "stream_mode": stream_mode,
+    }
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_server(port: int, env_overrides: dict, workers: int = 1) -> subprocess.Popen:
+    """Run the API in a child process so its memory can be measured on its own."""
+    env = {**os.environ, **env_overrides}
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.api:create_app", "--factory",
+         "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+
+async def wait_until_ready(client: httpx.AsyncClient, base_url: str, timeout: float = 30.0) -> None:
+    """Wait for readiness, so the startup warm-up is not part of the measurement."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if (await client.get(f"{base_url}/health/ready")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"Server at {base_url} did not become ready")
+        await asyncio.sleep(0.1)
+
+def peak_rss_mb(pid: int) -> Optional[float]:
+    """Peak resident set size of a process (Linux VmHWM), or None where unavailable."""
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+async def run_plan(client: httpx.AsyncClient, url: str, payload: dict) -> dict:
+    """Stream one plan, timing the first byte and the end of the stream."""
+    started = time.perf_counter()
+    first_byte = None
+    received = bytearray()
+    async with client.stream("POST", url, json=payload) as response:
+        async for chunk in response.aiter_bytes():
+            if first_byte is None and chunk:
+                first_byte = time.perf_counter() - started
+            received.extend(chunk)
+        status = response.status_code
+    elapsed = time.perf_counter() - started
+
+    types = set()
+    for line in received.decode("utf-8", errors="replace").splitlines():
+        try:
+            types.add(json.loads(line).get("type"))
+        except (ValueError, AttributeError):
+            pass
+    ok = status == 200 and "final" in types and "error" not in types
+    return {"ok": ok, "status": status, "ttfb": first_byte, "latency": elapsed, "bytes": len(received)}
+
+async def run_load(base_url: str, concurrency: int, total: int, days: int, stream_mode: str) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    url = f"{base_url}/generate-travel-plan"
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(timeout=None, limits=limits) as client:
+        await wait_until_ready(client, base_url)
+
+        async def one(index: int) -> dict:
+            async with semaphore:
+                try:
+                    return await run_plan(client, url, build_request(index, days, stream_mode))
+                except httpx.HTTPError as error:
+                    return {"ok": False, "status": None, "error": str(error)}
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(one(index) for index in range(total)))
+        wall = time.perf_counter() - started
+
+    succeeded = [result for result in results if result["ok"]]
+    stream_bytes = [result["bytes"] for result in succeeded]
+    return {
+        "requests": total,
+        "succeeded": len(succeeded),
+        "failed": total - len(succeeded),
+        "wall_seconds": round(wall, 3),
+        "throughput_plans_per_second": round(len(succeeded) / wall, 3) if wall else None,
+        "ttfb_ms": summarize_ms([result["ttfb"] for result in succeeded if result["ttfb"] is not None]),
+        "latency_ms": summarize_ms([result["latency"] for result in succeeded]),
+        "stream_bytes": {
+            "total": sum(stream_bytes),
+            "mean": round(sum(stream_bytes) / len(stream_bytes)) if stream_bytes else None,
+        },
+    }
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--days", type=int, default=3, help="Trip length of each request")
+    parser.add_argument("--profile", default="fast", help="Fake model latency profile")
+    parser.add_argument("--recording", help="JSON file of recorded per-agent responses")
+    parser.add_argument("--stream-mode", default="full", choices=("full", "delta"))
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes of the started server")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Extra environment for the started server")
+    parser.add_argument("--url", help="Benchmark a running server instead of starting one")
+    parser.add_argument("--output", help="Write the JSON results to this file as well")
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.url.rstrip("/") if args.url else None
+    env = {"MODEL_CLIENT": "fake", "FAKE_MODEL_PROFILE": args.profile, "PLAN_CACHE_ENABLED": "false"}
+    if args.recording:
+        env["FAKE_MODEL_RECORDING"] = str(Path(args.recording).resolve())
+    env.update(item.split("=", 1) for item in args.env)
+
+    if base_url is None:
+        port = _free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        server = start_server(port, env, args.workers)
+
+    try:
+        results = asyncio.run(run_load(base_url, args.concurrency, args.requests, args.days, args.stream_mode))
+        rss = peak_rss_mb(server.pid) if server else None
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+
+    write_report({
+        "benchmark": "load",
+        "config": {
+            "url": args.url,
+            "concurrency": args.concurrency,
+            "days": args.days,
+            "stream_mode": args.stream_mode,
+            "workers": args.workers if server else None,
+            "server_env": env if server else None,
+        },
+        **results,
+        "server_peak_rss_mb": rss,
+    }, args.output)
+    return 0 if results["failed"] == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""
+Micro-benchmarks for the per-message hot paths: content extraction, prompt generation and stream encoding
+(the original model_dump path next to the fast encoder, plus compressed wire sizes), and per-plan team setup
+
+Usage:
+    python -m benchmarks.micro [--document recordings/tokyo_3day.before.md] [--repeat N] [--output results.json]
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.models.request import StreamMessage  # noqa: E402
+from app.models.travel import TravelRequest  # noqa: E402
+from app.services.agents import create_travel_team  # noqa: E402
+from app.services.fake_model_client import FakeChatCompletionClient  # noqa: E402
+from app.services.stream_encoding import (  # noqa: E402
+    StreamFormat, constant_frame, encode_stream, stream_line, supported_encodings
+)
+from app.utils.airports import AirportIndex  # noqa: E402
+from app.utils.booking_links import resolve_airports  # noqa: E402
+from app.utils.content_processing import extract_markdown_content  # noqa: E402
+from app.utils.document_delta import diff_documents  # noqa: E402
+from app.utils.prompt_generation import generate_travel_prompt  # noqa: E402
+from app.utils.travel_document import TravelDocument  # noqa: E402
+from benchmarks.common import write_report  # noqa: E402
+
+DEFAULT_DOCUMENT = Path(__file__).resolve().parent / "recordings" / "tokyo_3day.before.md"
+
+def time_per_call(function: Callable[[], object], repeat: int, min_seconds: float = 0.05) -> dict:
+    """Median and best time per call in microseconds, over ``repeat`` batches of calls."""
+    calls = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(calls):
+            function()
+        if time.perf_counter() - started >= min_seconds / 10 or calls >= 1_000_000:
+            break
+        calls *= 2
+
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(calls):
+            function()
+        samples.append((time.perf_counter() - started) / calls)
+    return {
+        "calls_per_batch": calls,
+        "median_us": round(statistics.median(samples) * 1e6, 3),
+        "best_us": round(min(samples) * 1e6, 3),
+    }
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--document", default=str(DEFAULT_DOCUMENT))
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--output", help="Write the JSON results to this file as well")
+    args = parser.parse_args()
+
+    document = extract_markdown_content(Path(args.document).read_text(encoding="utf-8"))
+    agent_output = f"```markdown\n{document}\n```\n\nITINERARY_COMPLETE - Ready for ImagesAgent"
+    edited = document.replace("## 💡", "## ✈️ Flight Information\n\n- Booking links\n\n## 💡", 1)
+    request = TravelRequest(
+        destination_city="Tokyo",
+        destination_country="Japan",
+        depart_date="2026-06-01",
+        return_date="2026-06-04",
+        priority="food",
+        budget_level="moderate",
+        departure_airport="LHR",
+        destination_airport=None,
+        additional_preferences="Vegetarian friendly",
+    )
+
+    def encode_markdown_update():
+        return json.dumps(StreamMessage(
+            type="markdown_update",
+            agent="ItineraryAgent",
+            content=document,
+            timestamp=datetime.now().isoformat(),
+            character_count=len(document)
+        ).model_dump()) + "\n"
+
+    def encode_progress():
+        return json.dumps(StreamMessage(
+            type="progress",
+            agent="ItineraryAgent",
+            content="🔄 ItineraryAgent is working...",
+            timestamp=datetime.now().isoformat()
+        ).model_dump()) + "\n"
+
+    progress_frame = constant_frame("progress", "🔄 ItineraryAgent is working...", "ItineraryAgent")
+    markdown_lines = [stream_line("markdown_update", document, "ItineraryAgent", character_count=len(document))] * 5
+
+    async def lines():
+        for line in markdown_lines:
+            yield line
+
+    def wire_bytes(encoding):
+        async def collect():
+            return sum([len(chunk) async for chunk in encode_stream(lines(), StreamFormat(content_encoding=encoding))])
+        return asyncio.run(collect())
+
+    model_client = FakeChatCompletionClient()
+    indexed = TravelDocument(document)
+    tips_section = indexed.section("Travel Tips") or "## 💡 Travel Tips\n"
+    airports = AirportIndex()
+    # Lookups are timed warm; opening the index (the cold-start cost) is timed on its own
+    airports.warm_up()
+
+    def open_airport_index():
+        index = AirportIndex()
+        index.get("LHR")
+        index.close()
+
+    cases = {
+        "extract_markdown_content": lambda: extract_markdown_content(agent_output),
+        "generate_travel_prompt": lambda: generate_travel_prompt(request),
+        "encode_markdown_update": encode_markdown_update,
+        "encode_progress": encode_progress,
+        "stream_line_markdown_update": lambda: stream_line(
+            "markdown_update", document, "ItineraryAgent", character_count=len(document)
+        ),
+        "constant_frame_progress": progress_frame,
+        "diff_documents": lambda: diff_documents(document, edited),
+        "travel_document_parse": lambda: TravelDocument(document),
+        "travel_document_replace_section": lambda: indexed.replace_section("Travel Tips", tips_section),
+        "create_travel_team": lambda: create_travel_team(model_client, request),
+        "airport_index_open": open_airport_index,
+        "airport_get": lambda: airports.get("LHR"),
+        "airport_city_lookup": lambda: airports.airports_in("Tokyo", "Japan"),
+        "airport_fuzzy_lookup": lambda: airports.search("Barcelonna", "Spain"),
+        "resolve_airports": lambda: resolve_airports(request),
+    }
+    results = {name: time_per_call(function, args.repeat) for name, function in cases.items()}
+
+    write_report({
+        "benchmark": "micro",
+        "document_chars": len(document),
+        "results": results,
+        # Five successive markdown_update events of the same document, as sent on the wire
+        "wire_bytes": {encoding or "identity": wire_bytes(encoding) for encoding in (None, *supported_encodings())},
+    }, args.output)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""
+Throughput scaling with the number of server worker processes, against the fake model client
+
+For each worker count a server is started with a fresh shared store (SQLite WAL) and
+the same load is replayed; the report shows plans per second and the speedup over
+the first (normally single-worker) run.
+
+Usage:
+    python -m benchmarks.workers [--workers 1 2 4] [--concurrency N] [--requests N]
+                                 [--profile instant] [--stream-mode full|delta]
+                                 [--env KEY=VALUE ...] [--output results.json]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.common import write_report  # noqa: E402
+from benchmarks.load import _free_port, run_load, start_server  # noqa: E402
+
+def run_with_workers(workers: int, env: dict, args) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        port = _free_port()
+        server = start_server(
+            port, {**env, "SHARED_STORE_PATH": os.path.join(directory, "shared.sqlite3")}, workers
+        )
+        try:
+            return asyncio.run(
+                run_load(f"http://127.0.0.1:{port}", args.concurrency, args.requests, args.days, args.stream_mode)
+            )
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=128)
+    parser.add_argument("--days", type=int, default=3, help="Trip length of each request")
+    parser.add_argument("--profile", default="instant", help="Fake model latency profile")
+    parser.add_argument("--stream-mode", default="full", choices=("full", "delta"))
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Extra environment for the started servers")
+    parser.add_argument("--output", help="Write the JSON results to this file as well")
+    args = parser.parse_args()
+
+    # Admission is per worker, so lift the per-process limit out of the way of the measurement
+    env = {
+        "MODEL_CLIENT": "fake",
+        "FAKE_MODEL_PROFILE": args.profile,
+        "PLAN_CACHE_ENABLED": "false",
+        "SCHEDULER_MAX_CONCURRENT_PLANS": str(args.concurrency),
+        "SCHEDULER_MAX_QUEUE": str(args.requests),
+    }
+    env.update(item.split("=", 1) for item in args.env)
+
+    runs = []
+    for workers in args.workers:
+        results = run_with_workers(workers, env, args)
+        runs.append({"workers": workers, **results})
+
+    baseline = runs[0]["throughput_plans_per_second"] if runs else None
+    for run in runs:
+        throughput = run["throughput_plans_per_second"]
+        run["speedup"] = round(throughput / baseline, 2) if baseline and throughput else None
+
+    write_report({
+        "benchmark": "workers",
+        "config": {
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "days": args.days,
+            "stream_mode": args.stream_mode,
+            "cpu_count": os.cpu_count(),
+            "server_env": env,
+        },
+        "runs": runs,
+    }, args.output)
+    return 0 if all(run["failed"] == 0 for run in runs) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
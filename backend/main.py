@@ -1,13 +1,36 @@
 """
 Main entry point for the Travel Planner API
 """
+import logging
+import os
+
 import uvicorn
-from app.api import create_app
+from app.config import get_settings
+
+# Used when several workers run without SHARED_STORE_PATH, so they never keep separate state
+DEFAULT_SHARED_STORE_PATH = "travel_planner_state.sqlite3"
 
 def main():
-    """Run the FastAPI application"""
-    app = create_app()
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    """Run the FastAPI application in SERVER_WORKERS processes.
+
+    On SIGTERM each worker stops accepting connections and lets in-flight streams
+    finish for up to SERVER_DRAIN_TIMEOUT seconds before shutting down.
+    """
+    settings = get_settings()
+    if settings.server_workers > 1 and not settings.shared_store_path:
+        # Workers are spawned processes that read their settings from this environment
+        os.environ["SHARED_STORE_PATH"] = DEFAULT_SHARED_STORE_PATH
+        logging.getLogger(__name__).warning(
+            "SHARED_STORE_PATH not set; %d workers will share %s", settings.server_workers, DEFAULT_SHARED_STORE_PATH
+        )
+    uvicorn.run(
+        "app.api:create_app",
+        factory=True,
+        host=settings.server_host,
+        port=settings.server_port,
+        workers=settings.server_workers,
+        timeout_graceful_shutdown=settings.server_drain_timeout,
+    )
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,117 @@
+"""
+Prewarm the destination knowledge cache by planning a short trip to each top destination
+
+Plans run against the configured model client and their documents are stored in the
+cache's SQLite tier (DESTINATION_CACHE_DB_PATH, or SHARED_STORE_PATH), where the
+servers find them. Destinations the cache already knows are skipped.
+
+Usage:
+    python prewarm.py [--destinations-file FILE] [--priorities all food ...] [--days 3]
+                      [--concurrency 2]
+
+A destinations file has one "City, Country" per line; blank lines and # comments are ignored.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from datetime import date, timedelta
+from typing import List, Tuple
+
+from app.models.travel import TravelRequest
+from app.services.ai_client import create_model_router
+from app.services.destination_knowledge import DestinationKnowledgeCache
+from app.services.travel_planner import stream_travel_plan
+
+TOP_DESTINATIONS = (
+    ("Tokyo", "Japan"),
+    ("Kyoto", "Japan"),
+    ("Paris", "France"),
+    ("London", "United Kingdom"),
+    ("New York", "United States"),
+    ("Rome", "Italy"),
+    ("Barcelona", "Spain"),
+    ("Amsterdam", "Netherlands"),
+    ("Lisbon", "Portugal"),
+    ("Istanbul", "Turkey"),
+    ("Bangkok", "Thailand"),
+    ("Singapore", "Singapore"),
+    ("Seoul", "South Korea"),
+    ("Dubai", "United Arab Emirates"),
+    ("Sydney", "Australia"),
+    ("Bali", "Indonesia"),
+    ("Prague", "Czech Republic"),
+    ("Vienna", "Austria"),
+    ("Berlin", "Germany"),
+    ("Reykjavik", "Iceland"),
+)
+
+def read_destinations(path: str) -> List[Tuple[str, str]]:
+    destinations = []
+    with open(path, encoding="utf-8") as lines:
+        for line in lines:
+            line = line.split("#", 1)[0].strip()
+            if line:
+                city, _, country = line.partition(",")
+                destinations.append((city.strip(), country.strip()))
+    return destinations
+
+async def prewarm(destinations: List[Tuple[str, str]], priorities: List[str], days: int, concurrency: int) -> dict:
+    cache = DestinationKnowledgeCache()
+    if not cache.persistent:
+        raise SystemExit("Set DESTINATION_CACHE_DB_PATH or SHARED_STORE_PATH so the servers can read what is prewarmed")
+
+    depart = date.today() + timedelta(days=30)
+    requests = [
+        TravelRequest(
+            destination_city=city,
+            destination_country=country,
+            depart_date=depart.isoformat(),
+            return_date=(depart + timedelta(days=days)).isoformat(),
+            priority=priority,
+            budget_level="moderate",
+        )
+        for city, country in destinations
+        for priority in priorities
+    ]
+    model_client = create_model_router()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    results = {"learned": [], "skipped": [], "failed": []}
+
+    async def plan(travel_request: TravelRequest) -> None:
+        label = f"{travel_request.destination_city}, {travel_request.destination_country} [{travel_request.priority}]"
+        if cache.contains(travel_request):
+            results["skipped"].append(label)
+            return
+        async with semaphore:
+            started = time.perf_counter()
+            async for _ in stream_travel_plan(travel_request, model_client, destinations=cache):
+                pass
+            known = cache.contains(travel_request)
+            results["learned" if known else "failed"].append(label)
+            print(f"{label}: {'learned' if known else 'no knowledge'} in {time.perf_counter() - started:.1f}s",
+                  file=sys.stderr)
+
+    try:
+        await asyncio.gather(*(plan(travel_request) for travel_request in requests))
+    finally:
+        await model_client.close()
+        cache.close()
+    return {name: len(labels) for name, labels in results.items()} | {"failed_destinations": results["failed"]}
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--destinations-file", help="one 'City, Country' per line (default: built-in top destinations)")
+    parser.add_argument("--priorities", nargs="+", default=["all"], help="priority focuses to prewarm per destination")
+    parser.add_argument("--days", type=int, default=3, help="trip length of the prewarming plans")
+    parser.add_argument("--concurrency", type=int, default=2, help="plans generated at the same time")
+    args = parser.parse_args()
+
+    destinations = read_destinations(args.destinations_file) if args.destinations_file else list(TOP_DESTINATIONS)
+    summary = asyncio.run(prewarm(destinations, args.priorities, max(1, args.days), args.concurrency))
+    print(json.dumps(summary, indent=2))
+    return 1 if summary["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+import asyncio
+import json
+from dataclasses import replace
+
+from app.config import Settings
+from app.services.batch import BatchCheckpoints, BatchRunner, batch_id_for, parse_batch
+from app.services.stream_encoding import stream_line
+
+REQUEST = {"destination_city": "Tokyo", "destination_country": "Japan", "depart_date": "2026-06-01",
+           "return_date": "2026-06-03", "priority": "food", "budget_level": "moderate"}
+
+BODY = "\n".join([
+    json.dumps(dict(REQUEST, id="a")),
+    json.dumps(dict(REQUEST, id="b", budget_level="luxury")),
+    json.dumps(dict(REQUEST, id="dup")),
+    json.dumps(dict(REQUEST, id="late", destination_city="Paris", destination_country="France")),
+    "not json {",
+]) + "\n"
+
+
+def _planner(calls: list, failing=(), deadline=()):
+    def plan(travel_request):
+        async def producer():
+            city, budget = travel_request.destination_city, travel_request.budget_level
+            calls.append((city, budget))
+            if city in failing:
+                yield stream_line("error", f"❌ {city} failed")
+                return
+            outcome = "deadline" if city in deadline else "completed"
+            yield stream_line("final", f"# {city} {budget}", outcome=outcome)
+        return producer()
+    return plan
+
+
+def _run(checkpoints: BatchCheckpoints, plan) -> list:
+    async def main():
+        runner = BatchRunner(batch_id_for(BODY), parse_batch(BODY, 10), plan, checkpoints, parallelism=2)
+        records = [json.loads(record) async for record in runner.run()]
+        await checkpoints.flush()
+        return records
+    return asyncio.run(main())
+
+
+def _items(records: list) -> dict:
+    return {record["id"] or record["line"]: (record["status"], record.get("resumed")) for record in records
+            if record["type"] == "item"}
+
+
+def test_rerun_resumes_completed_items_from_checkpoints(tmp_path):
+    settings = replace(Settings(), batch_db_path=str(tmp_path / "batch.sqlite3"))
+
+    checkpoints = BatchCheckpoints(settings)
+    calls = []
+    first = _run(checkpoints, _planner(calls, failing=("Paris",)))
+    checkpoints.close()
+    assert sorted(calls) == [("Paris", "moderate"), ("Tokyo", "luxury"), ("Tokyo", "moderate")]
+    assert _items(first) == {
+        "a": ("completed", False), "b": ("completed", False), "dup": ("completed", False),
+        "late": ("failed", None), 5: ("failed", None),
+    }
+    assert first[-1]["type"] == "summary" and first[-1]["failed"] == 2
+
+    # A new process with the same database plans only the item that failed
+    checkpoints = BatchCheckpoints(settings)
+    calls = []
+    second = _run(checkpoints, _planner(calls))
+    assert calls == [("Paris", "moderate")]
+    assert second[0]["resumed"] == 3 and second[0]["plans"] == 1
+    assert _items(second) == {
+        "a": ("completed", True), "b": ("completed", True), "dup": ("completed", True),
+        "late": ("completed", False), 5: ("failed", None),
+    }
+    resumed = next(record for record in second if record.get("id") == "b")
+    assert resumed["document"] == "# Tokyo luxury"
+    assert checkpoints.summary(batch_id_for(BODY)) == {"completed": 3}
+    checkpoints.close()
+
+
+def test_degraded_items_run_again():
+    checkpoints = BatchCheckpoints(replace(Settings(), batch_db_path=None, shared_store_path=None))
+    assert not checkpoints.persistent
+
+    calls = []
+    first = _run(checkpoints, _planner(calls, deadline=("Paris",)))
+    assert _items(first)["late"] == ("degraded", False)
+
+    calls = []
+    _run(checkpoints, _planner(calls))
+    assert calls == [("Paris", "moderate")]
@@ -0,0 +1,81 @@
+import pytest
+
+from app.services.chunked_itinerary import clean_day_block, split_day_ranges, stitch_itinerary
+
+DAY_4 = """### Day 4: Asakusa and the Sumida River
+**Morning (9:00-12:00)**
+- Senso-ji Temple before the crowds
+
+**Afternoon (12:00-17:00)**
+- Walk the Nakamise shopping street
+
+**Evening (17:00-21:00)**
+- Dinner cruise on the Sumida River"""
+
+SKELETON = """# Tokyo Travel Plan
+
+## 📋 Overview
+Six days in Tokyo.
+
+## 📅 Day-by-Day Itinerary
+
+### Day 1: Shinjuku
+### Day 2: Harajuku
+### Day 3: Ueno
+
+## 💡 Tips
+- Get a Suica card
+"""
+
+
+@pytest.mark.parametrize("sign_off", [
+    "ITINERARY_COMPLETE - Ready for ImagesAgent",
+    "I hope you enjoy these days in Tokyo!",
+    "Enjoy your trip!",
+    "Let me know if you'd like any changes.",
+    "This completes Days 4-4 of the plan.",
+    "---",
+])
+def test_clean_day_block_drops_sign_offs(sign_off):
+    output = f"Here are the days you asked for:\n\n{DAY_4}\n\n{sign_off}\n"
+    assert clean_day_block(output) == DAY_4
+
+
+@pytest.mark.parametrize("last", [
+    "**Evening:** Sunset drinks at the Asahi Sky Room.",
+    "Evening: sunset drinks at the Asahi Sky Room.",
+    "End the night with a stroll across the Azuma Bridge to see the Skytree lit up.",
+    "Enjoy monjayaki on Tsukishima's Monja Street before heading back.",
+])
+def test_clean_day_block_keeps_day_content(last):
+    block = f"{DAY_4}\n\n{last}"
+    assert clean_day_block(f"```markdown\n{block}\n```") == block
+
+
+def test_clean_day_block_stops_at_next_section():
+    output = f"{DAY_4}\n\n## 💡 Tips\n- Carry cash"
+    assert clean_day_block(output) == DAY_4
+    assert clean_day_block("No days here.") == ""
+
+
+def test_split_day_ranges():
+    assert split_day_ranges(7, 3) == [(1, 3), (4, 6), (7, 7)]
+    assert split_day_ranges(2, 0) == [(1, 1), (2, 2)]
+
+
+def test_stitch_itinerary_orders_days_and_keeps_missing_headings():
+    blocks = [
+        "### Day 3: Ueno\n- Ueno Park",
+        "### Day 1: Shinjuku\n- Gyoen garden\n\n### Day 3: Ueno again\n- Ameyoko",
+    ]
+    document = stitch_itinerary(SKELETON, blocks, 3)
+
+    assert document.startswith("# Tokyo Travel Plan\n\n## 📋 Overview")
+    assert "### Day 1: Shinjuku\n- Gyoen garden\n\n### Day 2: Harajuku\n\n### Day 3: Ueno\n- Ueno Park" in document
+    assert "Ueno again" not in document
+    assert document.rstrip().endswith("## 💡 Tips\n- Get a Suica card")
+
+
+def test_stitch_itinerary_appends_section_without_one():
+    document = stitch_itinerary("# Plan\n\n## 📋 Overview\nShort trip.", ["### Day 1: Arrival\n- Check in"], 2)
+    assert document.endswith("## 📅 Day-by-Day Itinerary\n\n### Day 1: Arrival\n- Check in\n\n### Day 2\n\n")
@@ -0,0 +1,80 @@
+import pytest
+
+from app.utils.document_delta import (
+    DocumentDeltaTracker,
+    PatchCoalescer,
+    apply_patch,
+    diff_documents,
+    utf16_length,
+)
+
+PAIRS = [
+    ("", "# Plan\n"),
+    ("# Plan\n", ""),
+    ("abc", "abc"),
+    ("Day 1: Shinjuku", "Day 1: Shibuya"),
+    ("## 📅 Day-by-Day Itinerary\n- Ueno", "## 📅 Day-by-Day Itinerary\n- Ueno Park"),
+    ("## 📋 Overview\n## 📅 Days\nold", "## 📋 Overview\n## 🗺️ Bases\n## 📅 Days\nnew"),
+    ("🌟🌟🌟", "🌟🌟"),
+    ("a😀b", "a😁b"),
+    ("Café 🍜 ramen", "Café 🍣 sushi 🍜 ramen"),
+]
+
+
+@pytest.mark.parametrize("old,new", PAIRS)
+def test_diff_round_trips(old, new):
+    patch = diff_documents(old, new)
+    if old == new:
+        assert patch is None
+    else:
+        assert apply_patch(old, patch) == new
+
+
+def test_offsets_count_utf16_code_units():
+    offset, length, content = diff_documents("## 📅 Day 1\n", "## 📅 Day 2\n")
+    # Same splice as JavaScript: "## 📅 Day ".length is 10
+    assert (offset, length, content) == (10, 1, "2")
+    assert utf16_length("## 📅 Day ") == 10
+
+
+def test_tracker_patches_rebuild_the_document():
+    tracker = DocumentDeltaTracker()
+    client = ""
+    for token in ["```markdown\n", "# 🌟 Tokyo", " Plan\n", "## 📅 Days\n", "- Ueno"]:
+        patch = tracker.append_draft("ItineraryAgent", token)
+        if patch:
+            client = apply_patch(client, patch)
+    assert client == tracker.document == "# 🌟 Tokyo Plan\n## 📅 Days\n- Ueno"
+    assert tracker.length == utf16_length(client)
+
+    final = "# 🌟 Tokyo Plan\n## 📅 Days\n- [Ueno Park](https://example.com)\n"
+    client = apply_patch(client, tracker.update(final))
+    assert client == final
+    assert tracker.append_draft("ItineraryAgent", "late token") is None
+
+
+def test_coalescer_merges_continuing_patches():
+    coalescer = PatchCoalescer(window=60, max_chars=1024)
+    document = ""
+    sent = []
+    for token in ["# 🌟", " Tokyo", "\n## 📅", " Days"]:
+        patch = (utf16_length(document), 0, token)
+        document += token
+        sent.extend(coalescer.add(patch, utf16_length(document)))
+    assert sent == []
+    assert coalescer.flush() == [((0, 0, "# 🌟 Tokyo\n## 📅 Days"), utf16_length(document))]
+    assert coalescer.flush() == []
+
+
+def test_coalescer_releases_a_patch_that_is_not_continued():
+    coalescer = PatchCoalescer(window=60, max_chars=1024)
+    assert coalescer.add((0, 0, "😀ab"), 4) == []
+    # Starts elsewhere: the pending patch goes out first
+    assert coalescer.add((0, 1, "x"), 4) == [((0, 0, "😀ab"), 4)]
+    assert coalescer.flush() == [((0, 1, "x"), 4)]
+
+
+def test_coalescer_flushes_at_max_chars():
+    coalescer = PatchCoalescer(window=60, max_chars=4)
+    assert coalescer.add((0, 0, "ab"), 2) == []
+    assert coalescer.add((2, 0, "cd"), 4) == [((0, 0, "abcd"), 4)]
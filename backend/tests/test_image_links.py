@@ -0,0 +1,45 @@
+from app.utils.image_links import add_itinerary_image_links, build_google_images_url, link_activity_line
+
+
+def _link(name: str) -> str:
+    return f"[{name}]({build_google_images_url(name)})"
+
+
+def test_sentence_end_stops_a_place_name():
+    line = link_activity_line("- Take the JR Yamanote Line to Harajuku. Try crepes on Takeshita Street", set())
+    assert f"to {_link('Harajuku')}. Try crepes" in line
+    assert _link("Takeshita Street") in line
+
+
+def test_sequence_word_after_a_sentence_is_not_linked():
+    line = link_activity_line("- Walk along the Seine. Then visit Notre-Dame Cathedral", set())
+    assert line == f"- Walk along the {_link('Seine')}. Then visit {_link('Notre-Dame Cathedral')}"
+
+
+def test_abbreviations_keep_their_dot():
+    line = link_activity_line("- Visit St. Paul's Cathedral and the U.S. Embassy", set())
+    assert _link("St. Paul's Cathedral") in line
+    assert _link("U.S. Embassy") in line
+
+
+def test_accented_capitals_start_a_name():
+    line = link_activity_line("- Visit Notre-Dame on the Île de la Cité", set())
+    assert _link("Île de la Cité") in line
+
+
+def test_generic_words_are_not_linked_alone():
+    assert link_activity_line("- Check into your hotel and grab Breakfast", set()) == (
+        "- Check into your hotel and grab Breakfast"
+    )
+
+
+def test_only_the_itinerary_section_is_linked():
+    document = (
+        "# Plan\n\n## 🗺️ Recommended Base Locations\n- Stay near Tokyo Station\n\n"
+        "## 📅 Day-by-Day Itinerary\n\n### Day 1\n- Stroll around Ueno Park\n\n"
+        "## 💡 Travel Tips & Practical Information\n- Get a Suica Card\n"
+    )
+    linked = add_itinerary_image_links(document)
+    assert _link("Ueno Park") in linked
+    assert "- Stay near Tokyo Station" in linked
+    assert "- Get a Suica Card" in linked
@@ -0,0 +1,105 @@
+import asyncio
+import json
+from dataclasses import replace
+
+from app.config import Settings
+from app.models.travel import TravelRequest
+from app.services.plan_cache import PlanCache, canonical_request_key
+from app.services.stream_encoding import stream_line
+
+REQUEST = TravelRequest("Tokyo", "Japan", "2025-06-01", "2025-06-04", "food", "moderate", "LHR", None)
+
+
+def _settings(**overrides) -> Settings:
+    return replace(Settings(), **overrides)
+
+
+def _plan(calls: list, release: asyncio.Event):
+    async def producer():
+        calls.append(1)
+        yield stream_line("progress", "working")
+        await release.wait()
+        yield stream_line("final", "# Plan", outcome="completed")
+    return producer
+
+
+async def _collect(stream) -> list:
+    return [json.loads(line)["type"] async for line in stream]
+
+
+def test_identical_requests_share_one_generation():
+    async def main():
+        cache = PlanCache(_settings())
+        calls, release = [], asyncio.Event()
+        first = asyncio.ensure_future(_collect(cache.stream(REQUEST, _plan(calls, release))))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(_collect(cache.stream(REQUEST, _plan(calls, release))))
+        await asyncio.sleep(0)
+        assert cache.has(REQUEST)
+        release.set()
+        assert await first == await second == ["progress", "final"]
+        assert len(calls) == 1
+        assert cache.snapshot()["joined"] == 1
+
+        replay = await _collect(cache.stream(REQUEST, _plan(calls, release)))
+        assert replay == ["progress", "final"]
+        assert len(calls) == 1
+        assert cache.snapshot()["memory_hits"] == 1
+        await cache.close()
+
+    asyncio.run(main())
+
+
+def test_failed_generation_ends_every_follower_with_an_error():
+    async def main():
+        cache = PlanCache(_settings())
+        release = asyncio.Event()
+
+        async def producer():
+            yield stream_line("progress", "working")
+            await release.wait()
+            raise RuntimeError("model unavailable")
+
+        first = asyncio.ensure_future(_collect(cache.stream(REQUEST, producer)))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(_collect(cache.stream(REQUEST, producer)))
+        await asyncio.sleep(0)
+        release.set()
+        assert await first == await second == ["progress", "error"]
+        # Nothing is cached, so the next request generates again
+        assert not cache.has(REQUEST)
+        assert cache.snapshot()["stores"] == 0
+        await cache.close()
+
+    asyncio.run(main())
+
+
+def test_plans_that_ended_early_are_not_cached():
+    async def main():
+        cache = PlanCache(_settings())
+
+        async def producer():
+            yield stream_line("final", "# Partial plan", outcome="deadline")
+
+        assert await _collect(cache.stream(REQUEST, producer)) == ["final"]
+        assert not cache.has(REQUEST)
+        await cache.close()
+
+    asyncio.run(main())
+
+
+def test_disk_hits_are_shared_and_read_once(tmp_path):
+    async def main():
+        settings = _settings(plan_cache_db_path=str(tmp_path / "cache.sqlite3"))
+        writer = PlanCache(settings)
+        writer.put(canonical_request_key(REQUEST), [stream_line("final", "# Plan", outcome="completed")])
+        await writer.close()
+
+        reader = PlanCache(settings)
+        assert reader.has(REQUEST)
+        assert await _collect(reader.stream(REQUEST, _plan([], asyncio.Event()))) == ["final"]
+        stats = reader.snapshot()
+        assert (stats["disk_hits"], stats["memory_hits"], stats["misses"]) == (1, 0, 0)
+        await reader.close()
+
+    asyncio.run(main())
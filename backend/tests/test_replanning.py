@@ -0,0 +1,97 @@
+from dataclasses import replace
+
+import pytest
+
+from app.models.travel import TravelRequest
+from app.services.replanning import ReplanError, prepare_replan, replace_day
+from app.utils.booking_links import ACCOMMODATION_PLACEHOLDER, FLIGHTS_PLACEHOLDER
+
+REQUEST = TravelRequest("Tokyo", "Japan", "2026-06-01", "2026-06-04", "food", "moderate", "LHR", None)
+
+DOCUMENT = """# Tokyo Travel Plan
+
+## 📋 Trip Overview
+- **Destination:** Tokyo, Japan
+- **Dates:** 2026-06-01 to 2026-06-04
+- **Budget:** Moderate
+
+## 📅 Day-by-Day Itinerary
+
+### Day 1: Shinjuku
+**Morning (9:00-12:00)**
+- Shinjuku Gyoen
+
+### Day 2: Tsukiji and Ginza
+**Morning (9:00-12:00)**
+- Tsukiji Outer Market
+
+### Day 3: Asakusa
+**Evening (17:00-21:00)**
+- Dinner cruise on the Sumida River
+
+## ✈️ Flight Information
+- [LHR to HND](https://www.kayak.com/flights/LHR-HND/2026-06-01/2026-06-04)
+
+## 🏨 Accommodation Options
+- [Hotels in Shinjuku](https://www.airbnb.com/s/Shinjuku)
+
+## 💡 Travel Tips
+- Get a Suica card
+"""
+
+
+def test_replace_day_keeps_surrounding_entries():
+    document = replace_day(DOCUMENT, 2, "### Day 2: Sushi\n- Sushi-making class\n")
+
+    assert "### Day 1: Shinjuku\n**Morning (9:00-12:00)**\n- Shinjuku Gyoen\n\n### Day 2: Sushi\n- Sushi-making class\n\n### Day 3" in document
+    assert "Tsukiji" not in document
+    assert replace_day(DOCUMENT, 7, "### Day 7") == DOCUMENT
+    assert replace_day("# Plan\n\nNo itinerary.", 1, "### Day 1") == "# Plan\n\nNo itinerary."
+
+
+def test_replace_day_last_entry_keeps_blank_line_before_next_section():
+    document = replace_day(DOCUMENT, 3, "### Day 3: Ueno\n- Ueno Park")
+    assert "### Day 3: Ueno\n- Ueno Park\n\n## ✈️ Flight Information" in document
+
+
+def test_prepare_replan_unchanged():
+    replan = prepare_replan(DOCUMENT, REQUEST, REQUEST)
+    assert replan.scope.unchanged
+    assert replan.document == DOCUMENT.strip()
+
+
+def test_prepare_replan_new_dates_clears_bookings_and_rewrites_overview():
+    moved = replace(REQUEST, depart_date="2026-06-02", return_date="2026-06-05")
+    replan = prepare_replan(DOCUMENT, REQUEST, moved)
+
+    assert replan.scope.sections == ["Trip Overview", "Flight Information", "Accommodation Options"]
+    assert "- **Dates:** 2026-06-02 to 2026-06-05" in replan.document
+    assert FLIGHTS_PLACEHOLDER in replan.document and ACCOMMODATION_PLACEHOLDER in replan.document
+    assert "kayak" not in replan.document and "airbnb" not in replan.document
+    assert "- Get a Suica card" in replan.document
+    assert "- Tsukiji Outer Market" in replan.document
+
+
+def test_prepare_replan_day_edit_keeps_only_the_heading():
+    replan = prepare_replan(DOCUMENT, REQUEST, REQUEST, {"2": "Add a sushi-making class", 3: "  "})
+
+    assert replan.scope.days == (2,)
+    assert replan.day_edits == {2: "Add a sushi-making class"}
+    assert replan.previous_days[2].startswith("### Day 2: Tsukiji and Ginza\n")
+    assert "### Day 2: Tsukiji and Ginza\n\n### Day 3: Asakusa" in replan.document
+    assert "Tsukiji Outer Market" not in replan.document
+
+
+def test_prepare_replan_rejects_days_outside_the_trip():
+    with pytest.raises(ReplanError):
+        prepare_replan(DOCUMENT, REQUEST, REQUEST, {9: "Day trip to Nikko"})
+
+
+@pytest.mark.parametrize("updated,document,reason", [
+    (replace(REQUEST, destination_city="Osaka"), DOCUMENT, "the destination changed"),
+    (replace(REQUEST, return_date="2026-06-06"), DOCUMENT, "the trip length changed from 3 to 5 days"),
+    (REQUEST, DOCUMENT.replace("### Day 3: Asakusa", "Day three"), "the previous plan has no complete itinerary"),
+])
+def test_prepare_replan_from_scratch(updated, document, reason):
+    replan = prepare_replan(document, REQUEST, updated)
+    assert replan.scope.full_reason == reason
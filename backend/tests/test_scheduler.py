@@ -0,0 +1,102 @@
+import asyncio
+import json
+from dataclasses import replace
+
+import pytest
+
+from app.config import Settings
+from app.services.scheduler import PRIORITY_BATCH, PRIORITY_INTERACTIVE, PlanScheduler, SchedulerFull
+from app.services.stream_encoding import stream_line
+
+
+def _scheduler(**overrides) -> PlanScheduler:
+    settings = replace(
+        Settings(), scheduler_max_concurrent_plans=2, scheduler_max_queue=2, scheduler_estimated_plan_seconds=30.0
+    )
+    return PlanScheduler(replace(settings, **overrides))
+
+
+def _plan(started: list, release: asyncio.Event, name: str):
+    async def producer():
+        started.append(name)
+        await release.wait()
+        yield stream_line("final", name)
+    return producer
+
+
+async def _drain(stream) -> list:
+    return [json.loads(line)["type"] async for line in stream]
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_full_queue_rejects_with_retry_after():
+    async def main():
+        scheduler = _scheduler()
+        started, release = [], asyncio.Event()
+        runs = [
+            asyncio.ensure_future(_drain(scheduler.stream(_plan(started, release, str(index)))))
+            for index in range(4)
+        ]
+        await _settle()
+        # Two running, two waiting: the queue is full
+        assert started == ["0", "1"]
+        with pytest.raises(SchedulerFull) as full:
+            scheduler.check_capacity()
+        # Three plans ahead of a retry, two slots of 30s each
+        assert full.value.retry_after == pytest.approx(45.0)
+        assert scheduler.snapshot()["rejected"] == 1
+
+        release.set()
+        results = await asyncio.gather(*runs)
+        assert results[0] == ["final"]
+        assert results[3] == ["queued", "final"]
+        scheduler.check_capacity()
+        scheduler.close()
+
+    asyncio.run(main())
+
+
+def test_token_budget_holds_plans_back():
+    async def main():
+        scheduler = _scheduler(scheduler_tokens_per_minute=30000, scheduler_estimated_tokens_per_plan=20000)
+        started, release = [], asyncio.Event()
+        release.set()
+        assert await _drain(scheduler.stream(_plan(started, release, "first"))) == ["final"]
+        # The bucket has 10000 tokens left; the next plan waits for the refill
+        assert scheduler.estimate_retry_after() == pytest.approx(20.0, abs=0.5)
+        scheduler.close()
+
+    asyncio.run(main())
+
+
+def test_batch_plans_keep_to_their_lane():
+    async def main():
+        scheduler = _scheduler(scheduler_batch_share=0.5)
+        started, release = [], asyncio.Event()
+        batch = [
+            asyncio.ensure_future(_drain(scheduler.stream(_plan(started, release, f"b{index}"), PRIORITY_BATCH)))
+            for index in range(5)
+        ]
+        await _settle()
+        # Only one of the two slots goes to batch plans, and waiting batch plans do not fill the queue
+        assert started == ["b0"]
+        scheduler.check_capacity()
+
+        interactive = asyncio.ensure_future(
+            _drain(scheduler.stream(_plan(started, release, "i0"), PRIORITY_INTERACTIVE))
+        )
+        await _settle()
+        assert started == ["b0", "i0"]
+        assert scheduler.snapshot()["batch_active"] == 1
+
+        release.set()
+        await asyncio.gather(interactive, *batch)
+        assert sorted(started) == ["b0", "b1", "b2", "b3", "b4", "i0"]
+        assert scheduler.snapshot()["active"] == 0
+        scheduler.close()
+
+    asyncio.run(main())
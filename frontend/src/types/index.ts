@@ -11,11 +11,18 @@ export interface TravelRequest {
 }
 
 export interface StreamMessage {
-  type: 'progress' | 'markdown_update' | 'final' | 'error';
+  type: 'progress' | 'queued' | 'markdown_update' | 'delta' | 'usage' | 'final' | 'error';
   agent?: string;
   content: string;
   timestamp: string;
   character_count?: number;
+  // delta: replace `length` UTF-16 code units at `offset` (JavaScript string indices) with `content`
+  offset?: number;
+  length?: number;
+  sequence?: number;
+  usage?: Record<string, unknown>;
+  // final: 'completed', or why the plan ended early
+  outcome?: 'completed' | 'partial' | 'deadline' | 'token_cap';
 }
 
 export interface AgentActivity {